@@ -1,33 +1,36 @@
 import os
+import hmac
 import logging
-from flask import Flask, render_template, flash, redirect, url_for, request
-from bot.telegram_bot import start_bot, run_bot as run_telegram_bot
-from services.scheduler import start_scheduler
-from models import db, User, Game, Subscription, PriceRecord, Store
+from flask import Flask, Response, render_template, flash, redirect, url_for, request, abort, send_file, jsonify
+from sqlalchemy import inspect, text
+import bot.telegram_bot as telegram_bot
+from bot.telegram_bot import start_bot, run_bot as run_telegram_bot, get_webhook_secret
+from services.scheduler import start_scheduler, trigger_price_check, is_leader_replica
+from services.sweep_report import get_sweep_runs, request_profile, profile_requested, profile_path
+from services.config import ADMIN_TOKEN, TRACEMALLOC_FRAMES, DATABASE_URL
+from services import memory, logging_setup
+from services.metrics import registry as metrics_registry
+from services.readiness import readiness
+from services.stats_index import stats_index
+from models import db, User, Game, Subscription, PriceRecord, Store, SweepRun
+from data.data_manager import move_deal_alerts_setting
 import threading
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Trace allocations from startup when requested, so snapshots cover the whole process
+if TRACEMALLOC_FRAMES > 0:
+    memory.start_tracing(TRACEMALLOC_FRAMES)
+
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "default-secret-key")
 
 # Configure database
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///gamebot.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db.init_app(app)
 
-# Create database tables
-with app.app_context():
-    try:
-        db.create_all()
-        logger.info("Database tables created successfully")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {e}")
-
 # Home route
 @app.route('/')
 def home():
@@ -57,6 +60,136 @@ def settings():
                           telegram_token=masked_token,
                           bot_status="active" if telegram_token else "inactive")
 
+# Telegram webhook route
+@app.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    secret = get_webhook_secret()
+    if not secret:
+        # Webhook mode is not configured
+        abort(404)
+
+    received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(received, secret):
+        logger.warning("Rejected webhook request with invalid secret token")
+        abort(403)
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400)
+
+    bot_thread = telegram_bot.active_bot_thread
+    if not bot_thread or not bot_thread.feed_update(data):
+        return "Bot is not running", 503
+
+    return "", 200
+
+# Liveness route: the web server is up and answering
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok', 'uptime_seconds': readiness.report()['uptime_seconds']})
+
+# Readiness route: 200 once the database, scheduler and bot are up, 503 until then
+@app.route('/readyz')
+def readyz():
+    report = readiness.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+# Prometheus metrics route
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def require_admin_token():
+    """Abort unless the request carries ADMIN_TOKEN (header X-Admin-Token or a token parameter)"""
+    if not ADMIN_TOKEN:
+        # Admin endpoints are disabled
+        abort(404)
+    supplied = request.headers.get('X-Admin-Token') or request.values.get('token', '')
+    if not hmac.compare_digest(supplied, ADMIN_TOKEN):
+        logger.warning(f"Rejected admin request to {request.path} with invalid token")
+        abort(403)
+
+# Sweep reports route
+@app.route('/sweeps')
+def sweeps():
+    return render_template('sweeps.html',
+                          runs=get_sweep_runs(),
+                          profile_pending=profile_requested(),
+                          admin_enabled=bool(ADMIN_TOKEN))
+
+# Stats dashboard route: totals and top games from the in-memory stats index
+@app.route('/stats')
+def stats():
+    return render_template('stats.html',
+                          stats=stats_index.snapshot(),
+                          loaded=stats_index.loaded,
+                          top_subscribed=stats_index.top_subscribed(),
+                          top_discounted=stats_index.top_discounted())
+
+# Profile the next sweep
+@app.route('/sweeps/profile', methods=['POST'])
+def profile_sweep():
+    require_admin_token()
+    if not is_leader_replica():
+        flash('Этот экземпляр не лидер: проверки цен запускает и профилирует реплика-лидер.', 'warning')
+        return redirect(url_for('sweeps'))
+    request_profile()
+    if request.form.get('run_now'):
+        trigger_price_check()
+        flash('Проверка цен запущена под профилировщиком.', 'success')
+    else:
+        flash('Следующая проверка цен будет запущена под профилировщиком.', 'success')
+    return redirect(url_for('sweeps'))
+
+# Download a saved sweep profile
+@app.route('/sweeps/<int:run_id>/profile')
+def download_sweep_profile(run_id):
+    require_admin_token()
+    run = db.session.get(SweepRun, run_id)
+    if not run or not run.profile_file:
+        abort(404)
+    path = profile_path(run.profile_file)
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=run.profile_file)
+
+# Memory report route
+@app.route('/admin/memory')
+def admin_memory():
+    require_admin_token()
+    limit = request.args.get('limit', 30, type=int)
+    return jsonify(memory.memory_report(limit))
+
+# tracemalloc control route
+@app.route('/admin/memory/tracemalloc', methods=['POST'])
+def admin_tracemalloc():
+    require_admin_token()
+    action = request.values.get('action')
+    if action == 'start':
+        memory.start_tracing(request.values.get('frames', 1, type=int))
+    elif action == 'stop':
+        memory.stop_tracing()
+    elif action == 'snapshot':
+        if not memory.take_snapshot(request.values.get('label', 'manual')):
+            return jsonify({'error': 'tracemalloc is not tracing'}), 409
+    else:
+        abort(400)
+    return jsonify({'ok': True, 'diff': memory.snapshot_diff(request.values.get('limit', 25, type=int))})
+
+# Log level route: GET shows the levels, POST changes one (level, optional logger)
+@app.route('/admin/logging', methods=['GET', 'POST'])
+def admin_logging():
+    require_admin_token()
+    if request.method == 'POST':
+        level = request.values.get('level')
+        if not level:
+            abort(400)
+        try:
+            logging_setup.set_level(level, request.values.get('logger') or None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(logging_setup.get_levels())
+
 # Restart bot route
 @app.route('/restart_bot')
 def restart_bot():
@@ -81,6 +214,8 @@ def restart_bot():
 
 # Start the bot in a separate thread
 def run_bot():
+    if not os.environ.get("TELEGRAM_TOKEN"):
+        readiness.mark_disabled('bot', 'TELEGRAM_TOKEN is not set')
     try:
         logger.info("Starting Telegram bot...")
         # Initialize the bot with app context
@@ -92,6 +227,7 @@ def run_bot():
             run_telegram_bot(bot_app, app)
     except Exception as e:
         logger.error(f"Error starting Telegram bot: {e}")
+        readiness.mark_failed('bot', e)
 
 # Start the price tracker scheduler in a separate thread
 def run_scheduler():
@@ -102,13 +238,77 @@ def run_scheduler():
     except Exception as e:
         logger.error(f"Error starting price tracker scheduler: {e}")
 
-# Start the bot and scheduler when the app starts
-bot_thread = threading.Thread(target=run_bot)
-bot_thread.daemon = True
-bot_thread.start()
+# Columns added to existing tables: create_all only creates missing tables
+_ADDED_COLUMNS = [
+    ('sweep_runs', 'median_game_seconds', 'FLOAT NOT NULL DEFAULT 0'),
+    ('users', 'deal_alerts', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+]
+
+# Data to fill in once a column has been added
+_COLUMN_BACKFILLS = {
+    ('users', 'deal_alerts'): move_deal_alerts_setting,
+}
+
+def _upgrade_schema():
+    """Add the columns and indexes declared since an existing table was created"""
+    inspector = inspect(db.engine)
+    for table, column, definition in _ADDED_COLUMNS:
+        if column not in {existing['name'] for existing in inspector.get_columns(table)}:
+            with db.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            logger.info(f"Added column {table}.{column}")
+            backfill = _COLUMN_BACKFILLS.get((table, column))
+            if backfill is not None:
+                logger.info(f"Filled in {table}.{column} for {backfill()} rows")
+
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                # The same as CREATE INDEX IF NOT EXISTS, in case another replica got there first
+                index.create(db.engine, checkfirst=True)
+                logger.info(f"Added index {index.name} on {table.name}")
 
-scheduler_thread = threading.Thread(target=run_scheduler)
-scheduler_thread.daemon = True
-scheduler_thread.start()
+def init_database():
+    """Create database tables"""
+    with app.app_context():
+        try:
+            db.create_all()
+            _upgrade_schema()
+            logger.info("Database tables created successfully")
+            readiness.mark_ready('database')
+        except Exception as e:
+            logger.error(f"Error creating database tables: {e}")
+            readiness.mark_failed('database', e)
+
+bot_thread = None
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_services():
+    """
+    Start everything besides the web server: database tables, Telegram bot and scheduler
+
+    Importing this module has no side effects; the entry point calls this once
+    (further calls do nothing). It returns within a second or so: the bot and
+    the scheduler run in their own threads, and the first price check and cache
+    warm-up run as scheduler jobs, reporting progress on /readyz.
+    """
+    global bot_thread, _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+
+    for component in ('database', 'bot', 'scheduler'):
+        readiness.register(component)
+
+    init_database()
+
+    # Building the bot application and starting the scheduler are quick, but run
+    # them off the caller's thread so a slow step cannot hold up the web server
+    bot_thread = threading.Thread(target=run_bot, name='bot-startup', daemon=True)
+    bot_thread.start()
+    threading.Thread(target=run_scheduler, name='scheduler-startup', daemon=True).start()
 
-logger.info("App initialized successfully")
\ No newline at end of file
+    logger.info("App initialized successfully")
@@ -0,0 +1,53 @@
+"""
+Compare benchmark results across commits
+
+    python -m benchmarks.compare benchmarks/results/abc1234-*.json benchmarks/results/def5678-*.json
+
+The first file is the baseline; every other file is shown with the relative
+change of its throughput and latency percentiles per scenario.
+"""
+import sys
+import json
+from typing import Any, Dict, List
+
+METRICS = ('throughput', 'p50', 'p90', 'p99')
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+def _change(baseline: float, value: float) -> str:
+    if not baseline:
+        return ''
+    return f"{(value - baseline) / baseline * 100:+.0f}%"
+
+def compare(paths: List[str]) -> None:
+    runs = [load(path) for path in paths]
+    baseline = runs[0]
+
+    for run in runs:
+        meta = run['meta']
+        print(f"{meta['commit']}{' (dirty)' if meta.get('dirty') else ''}  {meta['timestamp']}")
+    print()
+
+    print(f"{'scenario':<24}{'run':<12}" + ''.join(f"{metric:>20}" for metric in METRICS))
+    for name, base_stats in baseline['scenarios'].items():
+        for index, run in enumerate(runs):
+            stats = run['scenarios'].get(name)
+            if stats is None:
+                continue
+            cells = []
+            for metric in METRICS:
+                value = stats[metric]
+                shown = f"{value:.1f}/s" if metric == 'throughput' else f"{value * 1000:.1f}ms"
+                if index:
+                    shown += f" {_change(base_stats[metric], value):>6}"
+                cells.append(f"{shown:>20}")
+            label = name if index == 0 else ''
+            print(f"{label:<24}{run['meta']['commit']:<12}" + ''.join(cells))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    compare(sys.argv[1:])
@@ -0,0 +1,138 @@
+"""
+Local stand-in for the CheapShark API
+
+Serves a deterministic synthetic catalogue: game N is titled "Benchmark Game N"
+and has deals in a few stores whose prices are derived from N, so the seeding
+code can predict them. Every response can be delayed and a share of requests
+can fail, to exercise the app under slow or flaky upstream conditions.
+"""
+import json
+import random
+import asyncio
+from typing import Any, Dict, List
+from aiohttp import web
+
+# Stores every game has a deal in
+STORE_IDS = ('1', '7', '25')
+
+def game_title(game_id: int) -> str:
+    return f"Benchmark Game {game_id}"
+
+def game_deals(game_id: int) -> List[Dict[str, Any]]:
+    """Current deals of a game, in CheapShark's format"""
+    retail = 10.0 + game_id % 50
+    deals = []
+    for index, store_id in enumerate(STORE_IDS):
+        savings = 15 + (game_id * 7 + index * 13) % 70
+        deals.append({
+            'storeID': store_id,
+            'dealID': f"deal-{game_id}-{store_id}",
+            'price': f"{retail * (100 - savings) / 100:.2f}",
+            'retailPrice': f"{retail:.2f}",
+            'savings': f"{savings:.6f}"
+        })
+    return deals
+
+def _game_summary(game_id: int) -> Dict[str, Any]:
+    cheapest = min(float(deal['price']) for deal in game_deals(game_id))
+    return {
+        'gameID': str(game_id),
+        'external': game_title(game_id),
+        'thumb': f"https://example.com/thumb/{game_id}.jpg",
+        'cheapest': f"{cheapest:.2f}"
+    }
+
+def _game_info(game_id: int) -> Dict[str, Any]:
+    return {
+        'info': {'title': game_title(game_id), 'thumb': f"https://example.com/thumb/{game_id}.jpg"},
+        'deals': game_deals(game_id)
+    }
+
+class FakeCheapShark:
+    """aiohttp application implementing the CheapShark endpoints the app uses
+
+    Args:
+        games: Number of games in the catalogue (IDs 1..games)
+        latency_ms: Delay added to every response
+        error_rate: Share of requests answered with HTTP 500
+        seed: Random seed for the injected errors
+    """
+
+    def __init__(self, games: int, latency_ms: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.games = games
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/1.0/games', self.games_endpoint)
+        app.router.add_get('/api/1.0/deals', self.deals_endpoint)
+        return app
+
+    async def _delay_or_fail(self) -> bool:
+        """Apply the configured latency; True if this request should fail"""
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def _known(self, raw_id: str) -> bool:
+        return raw_id.isdigit() and 1 <= int(raw_id) <= self.games
+
+    async def games_endpoint(self, request: web.Request) -> web.Response:
+        if await self._delay_or_fail():
+            return web.Response(status=500, text='injected error')
+
+        query = request.query
+        if 'id' in query:
+            if not self._known(query['id']):
+                return web.json_response([])
+            return web.json_response(_game_info(int(query['id'])))
+
+        if 'ids' in query:
+            ids = [raw_id for raw_id in query['ids'].split(',') if self._known(raw_id)]
+            return web.json_response({raw_id: _game_info(int(raw_id)) for raw_id in ids})
+
+        title = query.get('title', '').casefold()
+        limit = int(query.get('limit', 60))
+        # Titles only differ by number; a numeric term matches games whose ID starts with it
+        number = ''.join(ch for ch in title if ch.isdigit())
+        matches = []
+        for game_id in range(1, self.games + 1):
+            if number and not str(game_id).startswith(number):
+                continue
+            if not number and title and title not in game_title(game_id).casefold():
+                continue
+            matches.append(_game_summary(game_id))
+            if len(matches) >= limit:
+                break
+        return web.json_response(matches)
+
+    async def deals_endpoint(self, request: web.Request) -> web.Response:
+        if await self._delay_or_fail():
+            return web.Response(status=500, text='injected error')
+
+        page_size = int(request.query.get('pageSize', 60))
+        page_number = int(request.query.get('pageNumber', 0))
+        first = page_number * page_size + 1
+        deals = []
+        for game_id in range(first, min(first + page_size, self.games + 1)):
+            deal = game_deals(game_id)[0]
+            deals.append({
+                'gameID': str(game_id),
+                'dealID': deal['dealID'],
+                'title': game_title(game_id),
+                'storeID': deal['storeID'],
+                'salePrice': deal['price'],
+                'normalPrice': deal['retailPrice'],
+                'savings': deal['savings'],
+                'dealRating': '8.0',
+                'thumb': f"https://example.com/thumb/{game_id}.jpg"
+            })
+        return web.Response(text=json.dumps(deals), content_type='application/json')
@@ -0,0 +1,117 @@
+"""
+Local stand-in for an SMTP server
+
+Speaks enough SMTP (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT) for smtplib to send through it without STARTTLS. It can add latency to
+every accepted message, drop connections at random and end sessions after a
+number of messages, to exercise reconnects, or reject every message after
+DATA with a 550. Attempted and accepted messages, connections and logins
+are counted.
+"""
+import time
+import random
+import threading
+import socketserver
+from collections import Counter
+from typing import Tuple
+
+class FakeSMTP(socketserver.ThreadingTCPServer):
+    """Threaded SMTP server on a free local port
+
+    Args:
+        latency_ms: Delay before a message is accepted
+        disconnect_rate: Share of MAIL commands answered by dropping the connection
+        messages_per_session: Messages after which the session is closed with 421 (0 for no limit)
+        reject_data: Answer every message's DATA with a 550 rejection
+        seed: Random seed
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency_ms: float = 0.0, disconnect_rate: float = 0.0,
+                 messages_per_session: int = 0, reject_data: bool = False, seed: int = 1):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.latency = latency_ms / 1000.0
+        self.disconnect_rate = disconnect_rate
+        self.messages_per_session = messages_per_session
+        self.reject_data = reject_data
+        self.random = random.Random(seed)
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server_address[0], self.server_address[1]
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def should_disconnect(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.disconnect_rate
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name='fake-smtp', daemon=True).start()
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    server: FakeSMTP
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        self.server.count('connections')
+        self.reply("220 fake-smtp ESMTP ready")
+        sent = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n")
+                self.reply("250 SMTPUTF8" if verb == 'EHLO' else "250 fake-smtp")
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self.server.count('logins')
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == 'MAIL':
+                self.server.count('attempts')
+                if self.server.should_disconnect():
+                    self.server.count('dropped')
+                    return
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if self.server.reject_data:
+                    self.server.count('rejected')
+                    self.reply("550 5.7.1 Message rejected")
+                    continue
+                sent += 1
+                self.server.count('messages')
+                self.reply("250 OK queued")
+                if self.server.messages_per_session and sent >= self.server.messages_per_session:
+                    self.reply("421 Too many messages in this session")
+                    return
+            elif verb in ('RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
@@ -0,0 +1,73 @@
+"""
+Local stand-in for the Telegram Bot API
+
+Accepts every method the bot calls and answers with minimal valid objects, so
+python-telegram-bot can run unmodified against it (TELEGRAM_API_BASE_URL).
+Sent messages are counted per method.
+"""
+import time
+import asyncio
+import itertools
+from collections import Counter
+from typing import Any, Dict
+from aiohttp import web
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'}
+
+class FakeTelegram:
+    """aiohttp application implementing the Bot API methods the bot uses
+
+    Args:
+        latency_ms: Delay added to every response
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.method_endpoint)
+        return app
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params.get('chat_id') or 1)
+        message = {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        return message
+
+    async def method_endpoint(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if method == 'getMe':
+            result: Any = BOT_USER
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self._message(params)
+        elif method == 'sendPhoto':
+            result = self._message(params)
+            result['photo'] = [{
+                'file_id': f"photo-{result['message_id']}",
+                'file_unique_id': f"unique-{result['message_id']}",
+                'width': 800,
+                'height': 400
+            }]
+        else:
+            # setWebhook, deleteWebhook, answerCallbackQuery, answerInlineQuery, ...
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
@@ -0,0 +1,149 @@
+"""
+Leader election with several local processes
+
+    python -m benchmarks.leader_demo --processes 3 --lease 3 --renew 1
+
+Starts the given number of processes competing for one lease in a temporary
+SQLite database, then kills the leader (SIGKILL, so its lease has to expire)
+and stops the next one gracefully (SIGTERM, so it releases its lease). Prints
+each failover time and checks that no two processes were ever leader at once.
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+def child(db_path: str, lease: float, renew: float) -> None:
+    """Compete for the lease and print every leadership change with a timestamp"""
+    from flask import Flask
+    from models import db
+    from services.leader import LeaderElector
+
+    app = Flask('leader_demo')
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+
+    def report(is_leader: bool) -> None:
+        print(f"{time.time():.3f} {'leader' if is_leader else 'follower'}", flush=True)
+
+    elector = LeaderElector(app, 'demo', lease_seconds=lease, renew_seconds=renew, on_change=report)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    elector.start()
+    stop.wait()
+    elector.stop()
+
+class Competitor:
+    """A child process and the leadership intervals it reported"""
+
+    def __init__(self, index: int, db_path: str, lease: float, renew: float):
+        self.index = index
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.leader_demo', '--child', db_path, str(lease), str(renew)],
+            stdout=subprocess.PIPE, text=True
+        )
+        self.intervals: List[List[Optional[float]]] = []
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        for line in self.process.stdout:
+            timestamp, state = line.split()
+            if state == 'leader':
+                self.intervals.append([float(timestamp), None])
+            elif self.intervals and self.intervals[-1][1] is None:
+                self.intervals[-1][1] = float(timestamp)
+
+    @property
+    def is_leader(self) -> bool:
+        return bool(self.intervals) and self.intervals[-1][1] is None and self.process.poll() is None
+
+    def end(self, at: float) -> None:
+        """Close the open interval of a killed process (it cannot report losing the lease)"""
+        if self.intervals and self.intervals[-1][1] is None:
+            self.intervals[-1][1] = at
+
+def wait_for_leader(competitors: List[Competitor], exclude: Optional[Competitor] = None,
+                    timeout: float = 60.0) -> Tuple[Competitor, float]:
+    started = time.time()
+    while time.time() - started < timeout:
+        for competitor in competitors:
+            if competitor is not exclude and competitor.is_leader:
+                return competitor, competitor.intervals[-1][0]
+        time.sleep(0.05)
+    raise RuntimeError("No leader elected")
+
+def overlaps(competitors: List[Competitor]) -> int:
+    """Number of pairs of leadership intervals from different processes that overlap"""
+    now = time.time()
+    intervals = [(start, end or now, competitor.index)
+                 for competitor in competitors for start, end in competitor.intervals]
+    intervals.sort()
+    count = 0
+    for i, (start, end, index) in enumerate(intervals):
+        for other_start, _, other_index in intervals[i + 1:]:
+            if other_start >= end:
+                break
+            if other_index != index:
+                count += 1
+    return count
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, float]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=3, help='competing processes (at least 3)')
+    parser.add_argument('--lease', type=float, default=3.0, help='lease duration in seconds')
+    parser.add_argument('--renew', type=float, default=1.0, help='seconds between renewals')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'leader.db')
+        from flask import Flask
+        from models import db
+        app = Flask('leader_demo')
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+
+        competitors = [Competitor(index, db_path, args.lease, args.renew) for index in range(max(3, args.processes))]
+        try:
+            leader, _ = wait_for_leader(competitors)
+            print(f"process {leader.index} is leader")
+
+            killed_at = time.time()
+            leader.process.kill()
+            leader.process.wait()
+            leader.end(killed_at)
+            successor, elected_at = wait_for_leader(competitors, exclude=leader)
+            kill_failover = elected_at - killed_at
+            print(f"killed {leader.index}; {successor.index} took over after {kill_failover:.2f}s "
+                  f"(bound: lease {args.lease:.1f}s + renew {args.renew:.1f}s)")
+
+            stopped_at = time.time()
+            successor.process.terminate()
+            successor.process.wait()
+            third, elected_at = wait_for_leader(competitors, exclude=successor)
+            stop_failover = elected_at - stopped_at
+            print(f"stopped {successor.index}; {third.index} took over after {stop_failover:.2f}s")
+        finally:
+            for competitor in competitors:
+                if competitor.process.poll() is None:
+                    competitor.process.terminate()
+                    competitor.process.wait()
+
+        overlapping = overlaps(competitors)
+        print(f"overlapping leadership intervals: {overlapping}")
+        return {'kill_failover': kill_failover, 'stop_failover': stop_failover, 'overlaps': overlapping}
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        child(sys.argv[2], float(sys.argv[3]), float(sys.argv[4]))
+    else:
+        result = main()
+        sys.exit(1 if result['overlaps'] else 0)
@@ -0,0 +1,417 @@
+"""
+End-to-end benchmark of the price sweep, notification fan-out and bot handlers
+
+Starts local stand-ins for CheapShark, the Telegram Bot API and an SMTP server,
+seeds a fresh SQLite database and runs the real code paths against them:
+
+    python -m benchmarks.run --users 2000 --games 500 --subscriptions 10000 --api-latency-ms 50
+
+Results (throughput and latency percentiles per scenario) are printed and
+written as JSON tagged with the current commit; compare runs with
+benchmarks/compare.py.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_cheapshark import FakeCheapShark
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.fake_smtp import FakeSMTP
+
+logger = logging.getLogger('benchmarks')
+
+BOT_TOKEN = '123456:benchmark'
+
+def summarize(samples: Sequence[float], elapsed: float, operations: Optional[int] = None) -> Dict[str, float]:
+    """
+    Throughput and latency percentiles of a scenario
+
+    Args:
+        samples: Per-operation latencies in seconds
+        elapsed: Wall-clock duration of the scenario
+        operations: Operations completed, if not one per sample
+
+    Returns:
+        Dictionary with count, seconds, throughput (per second), mean, p50, p90, p99 and max
+    """
+    ordered = sorted(samples)
+    count = operations if operations is not None else len(ordered)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+    return {
+        'count': count,
+        'seconds': elapsed,
+        'throughput': count / elapsed if elapsed else 0.0,
+        'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+        'p50': percentile(0.50),
+        'p90': percentile(0.90),
+        'p99': percentile(0.99),
+        'max': ordered[-1] if ordered else 0.0
+    }
+
+class FakeServers(threading.Thread):
+    """Runs the fake CheapShark and Telegram servers on an event loop of their own"""
+
+    def __init__(self, cheapshark: FakeCheapShark, telegram: FakeTelegram):
+        super().__init__(daemon=True)
+        self.cheapshark = cheapshark
+        self.telegram = telegram
+        self.cheapshark_url = None
+        self.telegram_url = None
+        self._ready = threading.Event()
+
+    async def _serve(self, app: web.Application) -> str:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    def run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.cheapshark_url = loop.run_until_complete(self._serve(self.cheapshark.app()))
+        self.telegram_url = loop.run_until_complete(self._serve(self.telegram.app()))
+        self._ready.set()
+        loop.run_forever()
+
+    def start_and_wait(self) -> None:
+        self.start()
+        self._ready.wait()
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'username': f"user{user_id}"}
+
+def command_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """Update JSON of a private message, with a command entity if it starts with /"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': _user(user_id),
+        'text': text
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+def callback_update(update_id: int, user_id: int, data: str) -> Dict[str, Any]:
+    """Update JSON of an inline button press"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'button'
+            }
+        }
+    }
+
+def inline_update(update_id: int, user_id: int, query: str) -> Dict[str, Any]:
+    """Update JSON of an inline query"""
+    return {
+        'update_id': update_id,
+        'inline_query': {'id': str(update_id), 'from': _user(user_id), 'query': query, 'offset': ''}
+    }
+
+class Benchmark:
+    """Seeds the database and runs the scenarios"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.results: Dict[str, Dict[str, float]] = {}
+        self.price_drops: Dict[str, Dict[str, Any]] = {}
+        self._update_ids = iter(range(1, 10 ** 9))
+
+    def setup(self, db_path: str) -> None:
+        # Imported here: the app reads its endpoints from the environment at import time
+        from flask import Flask
+        from models import db
+        from benchmarks.seed import seed_database
+        from services.catalogue_index import load_catalogue_index
+        from services.recommendations import rebuild_recommendations
+
+        self.flask_app = Flask('benchmarks')
+        self.flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+        self.flask_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        db.init_app(self.flask_app)
+
+        with self.flask_app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            counts = seed_database(self.args.users, self.args.games, self.args.subscriptions,
+                                   self.args.drop_rate, self.args.seed)
+            logger.warning(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+            load_catalogue_index()
+            rebuild_recommendations()
+
+    def run_sweep(self) -> None:
+        """check_price_updates over every subscribed game, then the notification fan-out"""
+        from services.price_tracker import check_price_updates, send_price_drop_notifications
+        from services.sweep_report import SweepReport
+
+        async def sweep() -> None:
+            report = SweepReport()
+            token = report.activate()
+            started = time.perf_counter()
+            try:
+                self.price_drops = await check_price_updates()
+            finally:
+                report.deactivate(token)
+            elapsed = time.perf_counter() - started
+            per_game = [sum(phases.values()) for phases in report.games.values()]
+            self.results['sweep'] = summarize(per_game, elapsed)
+            self.results['sweep']['price_drops'] = len(self.price_drops)
+
+            report = SweepReport()
+            token = report.activate()
+            started = time.perf_counter()
+            try:
+                await send_price_drop_notifications(self.price_drops)
+            finally:
+                report.deactivate(token)
+            elapsed = time.perf_counter() - started
+            messages = sum(len(info['users']) for info in self.price_drops.values())
+            per_game = [phases.get('send_message', 0.0) for phases in report.games.values()]
+            self.results['notify'] = summarize(per_game, elapsed, messages)
+
+        with self.flask_app.app_context():
+            asyncio.run(sweep())
+
+    def run_deals_refresh(self) -> None:
+        """Rebuild the /discounts snapshot from the deals endpoint"""
+        from services.price_tracker import refresh_deals_snapshot
+
+        samples = []
+        started = time.perf_counter()
+        for _ in range(self.args.repeat):
+            call_started = time.perf_counter()
+            asyncio.run(refresh_deals_snapshot())
+            samples.append(time.perf_counter() - call_started)
+        self.results['deals_refresh'] = summarize(samples, time.perf_counter() - started)
+
+    def run_email(self, smtp: FakeSMTP) -> None:
+        """Price drop emails through the pooled, rate-limited sender"""
+        from concurrent.futures import ThreadPoolExecutor
+        from services.notification_service import SMTPConnectionPool, EmailSender, build_price_drop_email
+
+        host, port = smtp.address
+        pool = SMTPConnectionPool(host, port, username='bench@example.com', password='benchmark', starttls=False,
+                                  size=self.args.smtp_connections, max_messages=self.args.smtp_session_messages)
+        sender = EmailSender(pool, rate_per_minute=self.args.smtp_rate_per_minute)
+        price_info = {'Steam': {'current': '$4.99', 'original': '$19.99', 'discount_percent': 75}}
+        messages = [build_price_drop_email(f"user{index}@example.com", f"Benchmark Game {index % self.args.games + 1}",
+                                           price_info, 'bench@example.com')
+                    for index in range(self.args.emails)]
+
+        def timed_send(message) -> Tuple[bool, float]:
+            call_started = time.perf_counter()
+            sent = sender.send(message)
+            return sent, time.perf_counter() - call_started
+
+        # As many concurrent senders as send_batch uses (one per pooled connection)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            outcomes = list(executor.map(timed_send, messages))
+        elapsed = time.perf_counter() - started
+        sender.close()
+
+        sent = sum(1 for ok, _ in outcomes if ok)
+        self.results['email'] = summarize([seconds for _, seconds in outcomes], elapsed, sent)
+        self.results['email'].update({
+            'failed': len(messages) - sent,
+            'per_minute': sent / elapsed * 60 if elapsed else 0.0,
+            'connections_opened': pool.connections_opened,
+            'server_connections': smtp.counts['connections'],
+            'server_drops': smtp.counts['dropped']
+        })
+
+    def start_bot(self) -> None:
+        from bot.telegram_bot import start_bot, BotThread
+
+        self.application = start_bot(self.flask_app)
+        if self.application is None:
+            raise RuntimeError("Bot application could not be created")
+        # Webhook mode: no polling, updates are fed directly as the webhook endpoint does
+        self.bot_thread = BotThread(self.application, self.flask_app,
+                                    webhook_url='http://127.0.0.1/benchmark-hook', secret_token='benchmark')
+        self.bot_thread.start()
+        deadline = time.monotonic() + 30
+        while not self.application.running:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Bot did not start")
+            time.sleep(0.05)
+
+    def run_updates(self, name: str, make_update: Callable[[int, int, int], Dict[str, Any]]) -> None:
+        """
+        Feed a batch of updates from many chats at once and wait for all of them
+
+        Args:
+            name: Scenario name
+            make_update: Builds update JSON from (update_id, user_id, index)
+        """
+        processor = self.application.update_processor
+        processor.reset_latency_stats()
+        count = self.args.updates
+        target = processor.processed + count
+
+        started = time.perf_counter()
+        for index in range(count):
+            user_id = index % self.args.users + 1
+            self.bot_thread.feed_update(make_update(next(self._update_ids), user_id, index))
+
+        deadline = time.monotonic() + self.args.timeout
+        while processor.processed < target:
+            if time.monotonic() > deadline:
+                logger.error(f"{name}: timed out with {target - processor.processed} updates pending")
+                break
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+
+        stats = processor.latency_stats()
+        self.results[name] = {
+            'count': stats['count'],
+            'seconds': elapsed,
+            'throughput': stats['count'] / elapsed if elapsed else 0.0,
+            'p50': stats['p50'],
+            'p90': stats['p90'],
+            'p99': stats['p99'],
+            'max': stats['max']
+        }
+
+    def run_handlers(self) -> None:
+        games = self.args.games
+        self.start_bot()
+        self.run_updates('handler_search', lambda uid, user, i: command_update(uid, user, f"/search Benchmark Game {i % games + 1}"))
+        self.run_updates('handler_details', lambda uid, user, i: callback_update(uid, user, f"details_{i % games + 1}"))
+        self.run_updates('handler_discounts', lambda uid, user, i: command_update(uid, user, '/discounts'))
+        self.run_updates('handler_discounts_page', lambda uid, user, i: callback_update(uid, user, f"discounts_{i % 5}"))
+        self.run_updates('handler_mysubs', lambda uid, user, i: command_update(uid, user, '/mysubs'))
+        self.run_updates('handler_subscribe', lambda uid, user, i: command_update(uid, user, f"/subscribe {(i * 7) % games + 1}"))
+        self.run_updates('handler_history', lambda uid, user, i: command_update(uid, user, f"/history {i % games + 1}"))
+        self.run_updates('handler_inline', lambda uid, user, i: inline_update(uid, user, f"Benchmark Game {i % games + 1}"))
+
+def git_revision() -> Dict[str, Any]:
+    """Current commit and whether the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': 'unknown', 'dirty': False}
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'scenario':<24}{'count':>8}{'seconds':>10}{'per sec':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<24}{stats['count']:>8}{stats['seconds']:>10.2f}{stats['throughput']:>10.1f}"
+              f"{stats['p50'] * 1000:>10.1f}{stats['p90'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='users to seed')
+    parser.add_argument('--games', type=int, default=300, help='games in the catalogue')
+    parser.add_argument('--subscriptions', type=int, default=5000, help='subscriptions to seed')
+    parser.add_argument('--drop-rate', type=float, default=0.3, help='share of games with a price drop')
+    parser.add_argument('--api-latency-ms', type=float, default=20.0, help='fake CheapShark response delay')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='share of failed CheapShark requests')
+    parser.add_argument('--telegram-latency-ms', type=float, default=10.0, help='fake Telegram response delay')
+    parser.add_argument('--updates', type=int, default=500, help='updates per handler scenario')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of the deals refresh scenario')
+    parser.add_argument('--timeout', type=float, default=300.0, help='seconds to wait for a handler scenario')
+    parser.add_argument('--emails', type=int, default=2000, help='emails sent in the email scenario')
+    parser.add_argument('--smtp-connections', type=int, default=4, help='pooled SMTP connections')
+    parser.add_argument('--smtp-rate-per-minute', type=float, default=6000.0, help='sender rate limit (0 for none)')
+    parser.add_argument('--smtp-latency-ms', type=float, default=5.0, help='fake SMTP delay per message')
+    parser.add_argument('--smtp-disconnect-rate', type=float, default=0.01, help='share of messages where the fake SMTP server drops the connection')
+    parser.add_argument('--smtp-session-messages', type=int, default=100, help='messages per SMTP connection before it is replaced')
+    parser.add_argument('--scenarios', default='sweep,deals,handlers,email', help='comma-separated: sweep, deals, handlers, email')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    parser.add_argument('--output', help='results JSON path (default: benchmarks/results/<commit>-<time>.json)')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+
+    servers = FakeServers(
+        FakeCheapShark(args.games, args.api_latency_ms, args.api_error_rate, args.seed),
+        FakeTelegram(args.telegram_latency_ms)
+    )
+    servers.start_and_wait()
+    smtp = FakeSMTP(args.smtp_latency_ms, args.smtp_disconnect_rate, seed=args.seed)
+    smtp.start()
+
+    os.environ['CHEAPSHARK_API_URL'] = f"{servers.cheapshark_url}/api/1.0"
+    os.environ['TELEGRAM_API_BASE_URL'] = f"{servers.telegram_url}/bot"
+    os.environ['TELEGRAM_API_FILE_URL'] = f"{servers.telegram_url}/file/bot"
+    os.environ['TELEGRAM_TOKEN'] = BOT_TOKEN
+    os.environ.pop('TELEGRAM_WEBHOOK_URL', None)
+
+    # Imported once the environment is set, like the app modules in Benchmark.setup
+    from services.logging_setup import configure_logging
+    configure_logging(os.getenv('LOG_LEVEL', 'WARNING'))
+
+    scenarios = {name.strip() for name in args.scenarios.split(',')}
+    benchmark = Benchmark(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        benchmark.setup(os.path.join(tmp, 'benchmark.db'))
+        if 'sweep' in scenarios:
+            benchmark.run_sweep()
+        if 'deals' in scenarios or 'handlers' in scenarios:
+            benchmark.run_deals_refresh()
+        if 'handlers' in scenarios:
+            benchmark.run_handlers()
+        if 'email' in scenarios:
+            benchmark.run_email(smtp)
+
+    output = {
+        'meta': {
+            **git_revision(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': vars(args),
+            'upstream_requests': servers.cheapshark.requests,
+            'upstream_errors': servers.cheapshark.errors,
+            'telegram_calls': dict(servers.telegram.calls),
+            'smtp': dict(smtp.counts)
+        },
+        'scenarios': benchmark.results
+    }
+
+    print_results(benchmark.results)
+    path = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"{output['meta']['commit']}-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {path}")
+    return output
+
+if __name__ == '__main__':
+    main()
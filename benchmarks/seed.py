@@ -0,0 +1,80 @@
+"""
+Seed a benchmark database with synthetic users, games, subscriptions and price history
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+from models import db, User, Game, Subscription, PriceRecord
+from services.config import SUPPORTED_STORES
+from benchmarks.fake_cheapshark import game_title, game_deals
+
+def seed_database(users: int, games: int, subscriptions: int, drop_rate: float, seed: int = 1) -> Dict[str, int]:
+    """
+    Fill an empty database (needs an app context)
+
+    Subscriptions are skewed towards low game IDs (a few popular games and a
+    long tail), like real tracking lists. Every game gets one earlier price
+    record per store: for a drop_rate share of the games it is above the price
+    the fake API serves, so the sweep reports a price drop for them.
+
+    Args:
+        users: Number of users
+        games: Number of games, matching the fake API catalogue
+        subscriptions: Number of subscriptions (capped at users * games)
+        drop_rate: Share of games that will show a price drop
+        seed: Random seed
+
+    Returns:
+        Number of rows inserted per table
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    earlier = now - timedelta(days=1)
+
+    db.session.bulk_insert_mappings(User, [
+        {'id': user_id, 'username': f"user{user_id}", 'first_name': 'Bench', 'created_at': now, 'settings': '{}'}
+        for user_id in range(1, users + 1)
+    ])
+
+    game_rows = []
+    price_rows = []
+    for game_id in range(1, games + 1):
+        deals = game_deals(game_id)
+        game_rows.append({
+            'id': str(game_id),
+            'title': game_title(game_id),
+            'thumbnail': f"https://example.com/thumb/{game_id}.jpg",
+            'details': json.dumps({'cheapest_price': min(deal['price'] for deal in deals)}),
+            'created_at': now,
+            'updated_at': now
+        })
+        factor = 1.25 if rng.random() < drop_rate else 1.0
+        for deal in deals:
+            price_rows.append({
+                'game_id': str(game_id),
+                'store_id': SUPPORTED_STORES[deal['storeID']],
+                'price': round(float(deal['price']) * factor, 2),
+                'discount_percent': int(float(deal['savings'])),
+                'recorded_at': earlier
+            })
+    db.session.bulk_insert_mappings(Game, game_rows)
+    db.session.bulk_insert_mappings(PriceRecord, price_rows)
+
+    subscriptions = min(subscriptions, users * games)
+    pairs = set()
+    while len(pairs) < subscriptions:
+        user_id = rng.randint(1, users)
+        # Pareto-distributed game popularity
+        game_id = min(games, int(rng.paretovariate(1.2)))
+        if len(pairs) > subscriptions * 0.8:
+            # Fill the rest uniformly so the loop ends even when popular games are saturated
+            game_id = rng.randint(1, games)
+        pairs.add((user_id, str(game_id)))
+    db.session.bulk_insert_mappings(Subscription, [
+        {'user_id': user_id, 'game_id': game_id, 'created_at': now, 'updated_at': now}
+        for user_id, game_id in pairs
+    ])
+
+    db.session.commit()
+    return {'users': users, 'games': games, 'subscriptions': len(pairs), 'price_records': len(price_rows)}
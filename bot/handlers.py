@@ -1,14 +1,26 @@
+import math
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
+)
 from telegram.ext import ContextTypes, MessageHandler, filters
-from services.game_service import search_game, get_game_details, get_similar_games, get_price_history
+from services.game_service import get_game_details
 from services.price_tracker import get_current_discounts
-from data.data_manager import add_subscription, remove_subscription, get_user_subscriptions, update_user_info
-from flask import current_app
+from services.deals_snapshot import get_deals_snapshot
+from services.catalogue_index import search_catalogue, catalogue_index, ensure_catalogue_loaded
+from services.similarity import get_similar_games
+from services.recommendations import co_subscription_index
+from services.stats_index import stats_index
+from services.chart_renderer import legend
+from services.price_charts import chart_series, chart_key, render_chart, get_chart_file_id, remember_chart_file_id
+from services.metrics import CACHE_REQUESTS
+from data.data_manager import (
+    add_subscription_async, remove_subscription_async, get_user_subscriptions_async, update_user_info_async,
+    get_game_titles_async, get_price_records_async, get_price_stats_async, get_user_filters_async,
+    update_user_filters_async, ALL_STORES
+)
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Command handlers
@@ -17,17 +29,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
 
     # Сохранение информации о пользователе в базу данных
-    with current_app.app_context():
-        try:
-            update_user_info(
-                user_id=user.id,
-                username=user.username,
-                first_name=user.first_name,
-                last_name=user.last_name
-            )
-            logger.info(f"Данные пользователя сохранены в базу данных: {user.id}")
-        except Exception as e:
-            logger.error(f"Ошибка сохранения данных пользователя: {e}")
+    try:
+        await update_user_info_async(
+            user_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+        logger.info(f"Данные пользователя сохранены в базу данных: {user.id}")
+    except Exception as e:
+        logger.error(f"Ошибка сохранения данных пользователя: {e}")
 
     # Создаем клавиатуру с кнопками
     reply_markup = ReplyKeyboardMarkup([
@@ -63,7 +74,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "• /discounts - Текущие скидки\n"
         "• /filter price <цена> - Фильтр по цене\n"
         "• /filter discount <процент> - Фильтр по скидке\n"
-        "• /filter clear - Сбросить фильтры\n\n"
+        "• /filter alerts on|off - Уведомления о скидках по фильтрам\n"
+        "• /filter clear - Сбросить фильтры\n"
+        "• /top - Топ игр\n"
+        "• /stats - Статистика\n\n"
         "📋 Подписки:\n"
         "• /subscribe <id> - Подписаться на игру\n"
         "• /unsubscribe <id> - Отписаться от игры\n"
@@ -89,7 +103,8 @@ async def search_games(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text(f"Ищу: {query}...")
 
     try:
-        results = await search_game(query)
+        # Сначала ищет в локальном каталоге, API вызывается только при промахе
+        results = await search_catalogue(query)
 
         if not results:
             await update.message.reply_text(f"Не найдено игр по запросу '{query}'. Попробуйте другой поисковый запрос.")
@@ -135,19 +150,18 @@ async def subscribe_game(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text(f"Игра с ID {game_id} не найдена. Пожалуйста, проверьте ID и попробуйте снова.")
             return
 
-        # Добавляет подписку в контексте приложения
-        with current_app.app_context():
-            # Получает миниатюру, если доступна
-            thumbnail = game_details.get('thumbnail', None)
-            success = add_subscription(user_id, game_id, game_details.get('name', 'Unknown Game'), thumbnail)
+        # Получает миниатюру, если доступна
+        thumbnail = game_details.get('thumbnail', None)
+        # Добавляет подписку (запрос к БД выполняется в отдельном пуле потоков)
+        success = await add_subscription_async(user_id, game_id, game_details.get('name', 'Unknown Game'), thumbnail)
 
-            if success:
-                await update.message.reply_text(
-                    f"✅ Вы подписались на уведомления о цене для игры {game_details.get('name')}.\n"
-                    f"Я уведомлю вас, когда цена снизится!"
-                )
-            else:
-                await update.message.reply_text(f"Вы уже подписаны на эту игру.")
+        if success:
+            await update.message.reply_text(
+                f"✅ Вы подписались на уведомления о цене для игры {game_details.get('name')}.\n"
+                f"Я уведомлю вас, когда цена снизится!"
+            )
+        else:
+            await update.message.reply_text(f"Вы уже подписаны на эту игру.")
 
     except Exception as e:
         logger.error(f"Ошибка в subscribe_game: {e}")
@@ -163,14 +177,13 @@ async def unsubscribe_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     user_id = update.effective_user.id
 
     try:
-        # Удаляет подписку в контексте приложения
-        with current_app.app_context():
-            success, game_name = remove_subscription(user_id, game_id)
+        # Удаляет подписку в пуле потоков БД
+        success, game_name = await remove_subscription_async(user_id, game_id)
 
-            if success:
-                await update.message.reply_text(f"✅ Вы отписались от уведомлений о цене для игры {game_name}.")
-            else:
-                await update.message.reply_text("Вы не подписаны на эту игру.")
+        if success:
+            await update.message.reply_text(f"✅ Вы отписались от уведомлений о цене для игры {game_name}.")
+        else:
+            await update.message.reply_text("Вы не подписаны на эту игру.")
 
     except Exception as e:
         logger.error(f"Ошибка в unsubscribe_game: {e}")
@@ -181,82 +194,133 @@ async def list_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = update.effective_user.id
 
     try:
-        # Получает подписки в контексте приложения
-        with current_app.app_context():
-            subscriptions = get_user_subscriptions(user_id)
-
-            if not subscriptions:
-                await update.message.reply_text(
-                    "У вас пока нет подписок на игры.\n"
-                    "Используйте /search для поиска игр и подписки на них!"
-                )
-                return
+        # Получает подписки в пуле потоков БД
+        subscriptions = await get_user_subscriptions_async(user_id)
 
-            reply_text = "🎮 Ваши подписки на игры:\n\n"
-            keyboard = []
+        if not subscriptions:
+            await update.message.reply_text(
+                "У вас пока нет подписок на игры.\n"
+                "Используйте /search для поиска игр и подписки на них!"
+            )
+            return
 
-            for game_id, game_info in subscriptions.items():
-                game_name = game_info.get('name', 'Unknown Game')
-                reply_text += f"• {game_name} (ID: {game_id})\n"
+        reply_text = "🎮 Ваши подписки на игры:\n\n"
+        keyboard = []
 
-                # Добавляет кнопку для отписки
-                keyboard.append([
-                    InlineKeyboardButton(f"Отписаться от {game_name}", callback_data=f"unsub_{game_id}")
-                ])
+        for game_id, game_info in subscriptions.items():
+            game_name = game_info.get('name', 'Unknown Game')
+            reply_text += f"• {game_name} (ID: {game_id})\n"
 
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(reply_text, reply_markup=reply_markup, parse_mode='Markdown')
+            # Добавляет кнопку для отписки
+            keyboard.append([
+                InlineKeyboardButton(f"Отписаться от {game_name}", callback_data=f"unsub_{game_id}")
+            ])
+
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await update.message.reply_text(reply_text, reply_markup=reply_markup, parse_mode='Markdown')
 
     except Exception as e:
         logger.error(f"Ошибка в list_subscriptions: {e}")
         await update.message.reply_text("Извините, произошла ошибка при получении ваших подписок. Пожалуйста, попробуйте позже.")
 
-async def check_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показывает текущие скидки на игры."""
-    progress_msg = await update.message.reply_text("🔍 Ищу лучшие предложения для вас...")
+# Количество скидок на одной странице /discounts
+DISCOUNTS_PAGE_SIZE = 10
 
-    try:
-        max_price = context.user_data.get('max_price')
-        min_discount = context.user_data.get('min_discount')
+async def _get_filters(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> dict:
+    """Возвращает фильтры пользователя.
+
+    Фильтры хранятся в базе; после первого чтения они кешируются в context.user_data.
+    """
+    if 'filters' not in context.user_data:
+        context.user_data['filters'] = await get_user_filters_async(user_id)
+    return context.user_data['filters']
+
+async def _render_discounts(context: ContextTypes.DEFAULT_TYPE, user_id: int, page: int = 0):
+    """Формирует страницу скидок с учетом фильтров пользователя.
 
+    Возвращает кортеж (текст, клавиатура) или None, если подходящих скидок нет.
+    """
+    filters = await _get_filters(context, user_id)
+    max_price = filters['max_price']
+    min_discount = filters['min_discount']
+
+    snapshot = get_deals_snapshot()
+    CACHE_REQUESTS.inc(cache='deals_snapshot', result='hit' if snapshot is not None else 'miss')
+    if snapshot is not None:
+        # Отвечаем из локального снимка скидок, без запроса к API
+        discounts, total = snapshot.query(
+            max_price=max_price,
+            min_discount=min_discount,
+            offset=page * DISCOUNTS_PAGE_SIZE,
+            limit=DISCOUNTS_PAGE_SIZE
+        )
+    else:
+        # Снимок еще не загружен, запрашиваем скидки напрямую
         discounts = await get_current_discounts(
             max_price=max_price,
             min_discount=min_discount
         )
+        discounts = discounts[:DISCOUNTS_PAGE_SIZE]
+        total = len(discounts)
+        page = 0
+
+    if not discounts:
+        return None
+
+    total_pages = (total + DISCOUNTS_PAGE_SIZE - 1) // DISCOUNTS_PAGE_SIZE
+    reply_text = "🌟 ЛУЧШИЕ ПРЕДЛОЖЕНИЯ СЕГОДНЯ 🌟\n\n"
+    if total_pages > 1:
+        reply_text += f"Страница {page + 1} из {total_pages} (всего предложений: {total})\n\n"
+    keyboard = []
+
+    for game in discounts:
+        game_id = game.get('id')
+        game_name = game.get('name')
+        discount = game.get('discount_percent', 0)
+        current_price = game.get('price_current', 'Неизвестно')
+        original_price = game.get('price_original', 'Неизвестно')
+        store = game.get('store', 'Неизвестный магазин')
+
+        # Добавляем звездочки для больших скидок
+        discount_stars = "⭐️" * (discount // 25) if discount >= 25 else ""
+
+        reply_text += (
+            f"〔 {game_name} 〕{discount_stars}\n"
+            f"┌ 💰 Сейчас: {current_price}\n"
+            f"├ 📈 Было: {original_price}\n"
+            f"├ 🔥 Скидка: -{discount}%\n"
+            f"└ 🏪 Магазин: {store}\n\n"
+        )
 
-        if not discounts:
-            await progress_msg.edit_text("😔 Сейчас нет интересных скидок.\n\n💡 Включите уведомления (/mysubs), чтобы не пропустить выгодные предложения!")
-            return
+        # Добавляет кнопку для подписки
+        keyboard.append([
+            InlineKeyboardButton(f"Подписаться на {game_name}", callback_data=f"sub_{game_id}"),
+            InlineKeyboardButton(f"Подробности", callback_data=f"details_{game_id}")
+        ])
 
-        reply_text = "🌟 ЛУЧШИЕ ПРЕДЛОЖЕНИЯ СЕГОДНЯ 🌟\n\n"
-        keyboard = []
+    # Кнопки для перехода между страницами
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"discounts_{page - 1}"))
+    if page + 1 < total_pages:
+        navigation.append(InlineKeyboardButton("Далее ➡️", callback_data=f"discounts_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
 
-        for game in discounts[:10]:
-            game_id = game.get('id')
-            game_name = game.get('name')
-            discount = game.get('discount_percent', 0)
-            current_price = game.get('price_current', 'Неизвестно')
-            original_price = game.get('price_original', 'Неизвестно')
-            store = game.get('store', 'Неизвестный магазин')
-
-            # Добавляем звездочки для больших скидок
-            discount_stars = "⭐️" * (discount // 25) if discount >= 25 else ""
-
-            reply_text += (
-                f"〔 {game_name} 〕{discount_stars}\n"
-                f"┌ 💰 Сейчас: {current_price}\n"
-                f"├ 📈 Было: {original_price}\n"
-                f"├ 🔥 Скидка: -{discount}%\n"
-                f"└ 🏪 Магазин: {store}\n\n"
-            )
+    return reply_text, InlineKeyboardMarkup(keyboard)
 
-            # Добавляет кнопку для подписки
-            keyboard.append([
-                InlineKeyboardButton(f"Подписаться на {game_name}", callback_data=f"sub_{game_id}"),
-                InlineKeyboardButton(f"Подробности", callback_data=f"details_{game_id}")
-            ])
+async def check_discounts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показывает текущие скидки на игры."""
+    progress_msg = await update.message.reply_text("🔍 Ищу лучшие предложения для вас...")
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    try:
+        result = await _render_discounts(context, update.effective_user.id)
+
+        if not result:
+            await progress_msg.edit_text("😔 Сейчас нет интересных скидок.\n\n💡 Включите уведомления (/mysubs), чтобы не пропустить выгодные предложения!")
+            return
+
+        reply_text, reply_markup = result
         await progress_msg.edit_text(reply_text, reply_markup=reply_markup, parse_mode='Markdown')
 
     except Exception as e:
@@ -282,32 +346,43 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 await query.edit_message_text(text=f"Игра с ID {game_id} не найдена. Пожалуйста, попробуйте другую игру.")
                 return
 
-            # Добавляет подписку в контексте приложения
-            with current_app.app_context():
-                # Получает миниатюру, если доступна
-                thumbnail = game_details.get('thumbnail', None)
-                success = add_subscription(user_id, game_id, game_details.get('name', 'Неизвестная игра'), thumbnail)
-
-                if success:
-                    await query.edit_message_text(
-                        text=f"✅ Вы подписались на уведомления о цене для игры {game_details.get('name')}.\n"
-                             f"Я уведомлю вас, когда цена снизится!"
-                    )
-                else:
-                    await query.edit_message_text(text=f"Вы уже подписаны на эту игру.")
+            # Получает миниатюру, если доступна
+            thumbnail = game_details.get('thumbnail', None)
+            # Добавляет подписку (запрос к БД выполняется в отдельном пуле потоков)
+            success = await add_subscription_async(user_id, game_id, game_details.get('name', 'Неизвестная игра'), thumbnail)
+
+            if success:
+                await query.edit_message_text(
+                    text=f"✅ Вы подписались на уведомления о цене для игры {game_details.get('name')}.\n"
+                         f"Я уведомлю вас, когда цена снизится!"
+                )
+            else:
+                await query.edit_message_text(text=f"Вы уже подписаны на эту игру.")
 
         elif data.startswith('unsub_'):
             game_id = data[6:]
             user_id = update.effective_user.id
 
-            # Удаляет подписку в контексте приложения
-            with current_app.app_context():
-                success, game_name = remove_subscription(user_id, game_id)
+            # Удаляет подписку в пуле потоков БД
+            success, game_name = await remove_subscription_async(user_id, game_id)
 
-                if success:
-                    await query.edit_message_text(text=f"✅ Вы отписались от уведомлений о цене для игры {game_name}.")
-                else:
-                    await query.edit_message_text(text="Вы не подписаны на эту игру.")
+            if success:
+                await query.edit_message_text(text=f"✅ Вы отписались от уведомлений о цене для игры {game_name}.")
+            else:
+                await query.edit_message_text(text="Вы не подписаны на эту игру.")
+
+        elif data.startswith('discounts_'):
+            page = int(data[10:])
+
+            # Показывает другую страницу скидок
+            result = await _render_discounts(context, update.effective_user.id, page)
+
+            if not result:
+                await query.edit_message_text(text="😔 Сейчас нет интересных скидок.")
+                return
+
+            reply_text, reply_markup = result
+            await query.edit_message_text(text=reply_text, reply_markup=reply_markup, parse_mode='Markdown')
 
         elif data.startswith('details_'):
             game_id = data[8:]
@@ -345,8 +420,30 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 else:
                     details_text += f"🏪 {store_name}: {current_price}\n"
 
+            # Статистика по сохраненным ценам
+            stats = (await get_price_stats_async(game_id)).get(ALL_STORES)
+            if stats and stats.get('all_time_low') is not None:
+                details_text += f"\n📉 Исторический минимум: ${stats['all_time_low']:.2f} ({stats['all_time_low_at']:%d.%m.%Y})\n"
+                if stats.get('avg_30d') is not None:
+                    details_text += f"📊 Средняя цена за 30 дней: ${stats['avg_30d']:.2f}\n"
+                if stats.get('avg_90d') is not None:
+                    details_text += f"📊 Средняя цена за 90 дней: ${stats['avg_90d']:.2f}\n"
+                if stats.get('last_sale_at'):
+                    details_text += f"🏷️ Последняя распродажа: {stats['last_sale_at']:%d.%m.%Y}\n"
+
             # Добавляет кнопку для подписки
             keyboard = [[InlineKeyboardButton(f"Подписаться на {game_name}", callback_data=f"sub_{game_id}")]]
+
+            # Игры, которые чаще всего отслеживают вместе с этой
+            recommended = co_subscription_index.recommend(game_id, limit=3)
+            if recommended:
+                titles = await get_game_titles_async([other_id for other_id, _ in recommended])
+                details_text += "\n👥 Вместе с этой игрой отслеживают:\n"
+                for other_id, _ in recommended:
+                    other_name = titles.get(other_id, other_id)
+                    details_text += f"• {other_name}\n"
+                    keyboard.append([InlineKeyboardButton(f"Подробнее о {other_name}", callback_data=f"details_{other_id}")])
+
             reply_markup = InlineKeyboardMarkup(keyboard)
 
             await query.edit_message_text(text=details_text, reply_markup=reply_markup, parse_mode='Markdown')
@@ -355,6 +452,45 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         logger.error(f"Ошибка в button_handler: {e}")
         await query.edit_message_text(text="Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже.")
 
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Подсказывает игры по мере ввода в инлайн-режиме (@bot название)."""
+    query = update.inline_query.query
+
+    if not query.strip():
+        await update.inline_query.answer([], cache_time=300)
+        return
+
+    try:
+        # Подсказки берутся из локального префиксного индекса, без запросов к API
+        await ensure_catalogue_loaded()
+        games = catalogue_index.autocomplete(query, limit=20)
+
+        results = []
+        for game in games:
+            game_id = game['id']
+            game_name = game['name']
+            price = game.get('cheapest_price')
+            description = f"Лучшая цена: ${price}" if price else f"ID: {game_id}"
+
+            keyboard = [[
+                InlineKeyboardButton("Подписаться", callback_data=f"sub_{game_id}"),
+                InlineKeyboardButton("Подробности", callback_data=f"details_{game_id}")
+            ]]
+
+            results.append(InlineQueryResultArticle(
+                id=game_id,
+                title=game_name,
+                description=description,
+                thumbnail_url=game.get('thumbnail'),
+                input_message_content=InputTextMessageContent(f"🎮 {game_name} (ID: {game_id})"),
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            ))
+
+        await update.inline_query.answer(results, cache_time=60)
+
+    except Exception as e:
+        logger.error(f"Ошибка в inline_query: {e}")
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Логирует ошибки, вызванные обновлениями."""
     logger.error(f"Обновление {update} вызвало ошибку {context.error}")
@@ -365,48 +501,89 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 async def handle_filters(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обрабатывает фильтры по цене и скидке"""
+    """Обрабатывает фильтры по цене и скидке и уведомления о подходящих скидках"""
     if not context.args or len(context.args) < 1:
         await update.message.reply_text(
             "Используйте:\n"
             "/filter price <макс_цена> - Установить максимальную цену\n"
             "/filter discount <процент> - Установить минимальную скидку\n"
+            "/filter alerts on|off - Уведомления о новых скидках по фильтрам\n"
             "/filter clear - Сбросить фильтры"
         )
         return
 
+    user_id = update.effective_user.id
     filter_type = context.args[0].lower()
 
     if filter_type == "clear":
-        context.user_data.clear()
-        await update.message.reply_text("✅ Все фильтры сброшены")
+        filters = await update_user_filters_async(user_id, max_price=None, min_discount=None, deal_alerts=False)
+        if filters is None:
+            await update.message.reply_text("Извините, не удалось сохранить фильтры. Пожалуйста, попробуйте позже.")
+            return
+        context.user_data['filters'] = filters
+        await update.message.reply_text("✅ Все фильтры сброшены, уведомления о скидках выключены")
         return
 
     if len(context.args) < 2:
         await update.message.reply_text("Пожалуйста, укажите значение для фильтра")
         return
 
+    if filter_type == "alerts":
+        state = context.args[1].lower()
+        if state not in ("on", "off"):
+            await update.message.reply_text("Используйте /filter alerts on или /filter alerts off")
+            return
+        current = await _get_filters(context, user_id)
+        if state == "on" and current['max_price'] is None and current['min_discount'] is None:
+            await update.message.reply_text(
+                "Сначала задайте хотя бы один фильтр: /filter price <цена> или /filter discount <процент>"
+            )
+            return
+        filters = await update_user_filters_async(user_id, deal_alerts=(state == "on"))
+        if filters is None:
+            await update.message.reply_text("Извините, не удалось сохранить фильтры. Пожалуйста, попробуйте позже.")
+            return
+        context.user_data['filters'] = filters
+        if filters['deal_alerts']:
+            await update.message.reply_text("🔔 Уведомления включены: я напишу, когда появятся новые скидки по вашим фильтрам")
+        else:
+            await update.message.reply_text("🔕 Уведомления о новых скидках выключены")
+        return
+
     try:
         value = float(context.args[1])
+        # float() also accepts 'nan' and 'inf'
+        if not math.isfinite(value):
+            raise ValueError(value)
         if filter_type == "price":
             if value <= 0:
                 await update.message.reply_text("Цена должна быть больше 0")
                 return
-            context.user_data['max_price'] = value
-            await update.message.reply_text(f"✅ Установлен фильтр по цене: до ${value:.2f}")
+            changes = {'max_price': value}
+            reply = f"✅ Установлен фильтр по цене: до ${value:.2f}"
 
         elif filter_type == "discount":
             if not 0 <= value <= 100:
                 await update.message.reply_text("Скидка должна быть от 0 до 100%")
                 return
-            context.user_data['min_discount'] = value
-            await update.message.reply_text(f"✅ Установлен фильтр по скидке: от {value}%")
+            changes = {'min_discount': value}
+            reply = f"✅ Установлен фильтр по скидке: от {value}%"
 
         else:
-            await update.message.reply_text("Неизвестный тип фильтра. Используйте 'price' или 'discount'")
+            await update.message.reply_text("Неизвестный тип фильтра. Используйте 'price', 'discount' или 'alerts'")
+            return
 
     except ValueError:
         await update.message.reply_text("Пожалуйста, укажите числовое значение")
+        return
+
+    filters = await update_user_filters_async(user_id, **changes)
+    if filters is None:
+        await update.message.reply_text("Извините, не удалось сохранить фильтры. Пожалуйста, попробуйте позже.")
+        return
+    context.user_data['filters'] = filters
+    await update.message.reply_text(reply)
+
 async def similar_games(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает похожие игры."""
     if not context.args:
@@ -426,6 +603,7 @@ async def similar_games(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         reply_text = "🎮 Похожие игры:\n\n"
         keyboard = []
 
+        # Соседи посчитаны заранее пакетной задачей, здесь только чтение индекса
         for game in similar:
             game_id = game.get('id')
             game_name = game.get('name')
@@ -444,7 +622,7 @@ async def similar_games(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text("Извините, произошла ошибка при поиске похожих игр.")
 
 async def price_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показывает историю цен игры."""
+    """Показывает график истории цен игры."""
     if not context.args:
         await update.message.reply_text("Пожалуйста, укажите ID игры для просмотра истории цен. Пример: /history 12345")
         return
@@ -453,23 +631,34 @@ async def price_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     await update.message.reply_text("Получаю историю цен...")
 
     try:
-        history = await get_price_history(game_id)
-        game_details = await get_game_details(game_id)
+        # История строится по ценам, сохраненным при проверках
+        records = await get_price_records_async(game_id)
 
-        if not history or not game_details:
-            await update.message.reply_text("Не удалось получить историю цен.")
+        if not records:
+            await update.message.reply_text("История цен для этой игры пока не собрана. Подпишитесь на игру, чтобы начать ее отслеживать.")
             return
 
-        game_name = game_details.get('name', 'Неизвестная игра')
-        reply_text = f"📊 История цен для {game_name}:\n\n"
-
-        for i in range(len(history['dates'])):
-            date = history['dates'][i]
-            price = history['prices'][i]
-            store = history['stores'][i]
-            reply_text += f"📅 {date}\n💰 ${price} ({store})\n\n"
+        titles = await get_game_titles_async([game_id])
+        game_name = titles.get(game_id, 'Неизвестная игра')
+
+        series = chart_series(records)
+        caption = f"📊 История цен для {game_name}\n\n"
+        for legend_line, (store, points) in zip(legend(list(series)), series.items()):
+            current_price = points[-1][1]
+            lowest_price = min(price for _, price in points)
+            caption += f"{legend_line}: сейчас ${current_price:.2f}, минимум ${lowest_price:.2f}\n"
+
+        # Один и тот же график отправляется повторно по file_id без перерисовки
+        key = chart_key(series)
+        file_id = get_chart_file_id(key)
+        if file_id:
+            await update.message.reply_photo(photo=file_id, caption=caption)
+            return
 
-        await update.message.reply_text(reply_text)
+        png = await render_chart(key, series)
+        message = await update.message.reply_photo(photo=png, caption=caption)
+        if message.photo:
+            remember_chart_file_id(key, message.photo[-1].file_id)
 
     except Exception as e:
         logger.error(f"Ошибка в price_history: {e}")
@@ -490,22 +679,77 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif text == '❓ Помощь':
         await help_command(update, context)
     elif text == '🎮 Топ игр':
-        await show_top_games(update, context) # Placeholder function
+        await show_top_games(update, context)
     elif text == '⚙️ Настройки':
         await show_settings(update, context) # Placeholder function
     elif text == '📊 Статистика':
-        await show_stats(update, context) # Placeholder function
+        await show_stats(update, context)
     elif text == '🏷️ Фильтры цен':
-        await show_price_filters(update, context) # Placeholder function
+        await show_price_filters(update, context)
+    else:
+        # Любой другой текст считаем поисковым запросом
+        context.args = text.split()
+        await search_games(update, context)
+
+async def show_top_games(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показывает самые отслеживаемые игры и игры с самыми большими скидками."""
+    if not stats_index.loaded:
+        await update.message.reply_text("Топ игр еще собирается. Пожалуйста, попробуйте через минуту.")
+        return
+
+    # Рейтинги поддерживаются в памяти при каждой подписке и записи цены, запросов к БД здесь нет
+    top_subscribed = stats_index.top_subscribed()
+    top_discounted = stats_index.top_discounted()
 
-async def show_top_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Функция 'Топ игр' пока не реализована.")
+    reply_text = "🎮 Самые отслеживаемые игры:\n\n"
+    if top_subscribed:
+        for position, game in enumerate(top_subscribed, 1):
+            reply_text += f"{position}. {game['title']} — {int(game['score'])} подп. (ID: {game['game_id']})\n"
+    else:
+        reply_text += "Подписок пока нет.\n"
+
+    reply_text += "\n💰 Самые большие скидки среди отслеживаемых игр:\n\n"
+    if top_discounted:
+        for position, game in enumerate(top_discounted, 1):
+            reply_text += f"{position}. {game['title']} — -{int(game['score'])}% (ID: {game['game_id']})\n"
+    else:
+        reply_text += "Скидок пока нет.\n"
+
+    await update.message.reply_text(reply_text)
 
 async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Функция 'Настройки' пока не реализована.")
 
-async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Функция 'Статистика' пока не реализована.")
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показывает общую статистику бота."""
+    if not stats_index.loaded:
+        await update.message.reply_text("Статистика еще собирается. Пожалуйста, попробуйте через минуту.")
+        return
+
+    stats = stats_index.snapshot()
+    await update.message.reply_text(
+        "📊 Статистика:\n\n"
+        f"• Пользователей: {stats['users']}\n"
+        f"• Игр в базе: {stats['games']}\n"
+        f"• Подписок: {stats['subscriptions']} на {stats['tracked_games']} игр\n"
+        f"• Записей о ценах: {stats['price_records']}\n"
+        f"• Игр со скидкой сейчас: {stats['games_on_sale']}"
+    )
 
-async def show_price_filters(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Функция 'Фильтры цен' пока не реализована.")
\ No newline at end of file
+async def show_price_filters(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показывает текущие фильтры пользователя."""
+    filters = await _get_filters(context, update.effective_user.id)
+    max_price = filters['max_price']
+    min_discount = filters['min_discount']
+
+    await update.message.reply_text(
+        "🏷️ Ваши фильтры:\n\n"
+        f"• Максимальная цена: {f'${max_price:.2f}' if max_price is not None else 'не задана'}\n"
+        f"• Минимальная скидка: {f'{min_discount}%' if min_discount is not None else 'не задана'}\n"
+        f"• Уведомления о новых скидках: {'включены' if filters['deal_alerts'] else 'выключены'}\n\n"
+        "Фильтры применяются к /discounts. Изменить их:\n"
+        "/filter price <макс_цена>\n"
+        "/filter discount <процент>\n"
+        "/filter alerts on|off\n"
+        "/filter clear"
+    )
@@ -1,15 +1,70 @@
 import os
+import time
 import logging
 import asyncio
+import hmac
+import base64
+import hashlib
 import threading
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from bot.handlers import start, help_command, search_games, subscribe_game, unsubscribe_game, list_subscriptions, check_discounts, button_handler, error_handler, handle_message
+import functools
+from typing import Any, Dict, Optional
+from telegram import Update
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackQueryHandler, InlineQueryHandler
+from bot.update_processor import PerChatUpdateProcessor
+from services.metrics import BOT_HANDLER_SECONDS, BOT_HANDLER_ERRORS
+from services.config import TELEGRAM_API_BASE_URL, TELEGRAM_API_FILE_URL
+from services.readiness import readiness
+from bot.handlers import start, help_command, search_games, subscribe_game, unsubscribe_game, list_subscriptions, check_discounts, button_handler, error_handler, handle_message, handle_filters, inline_query, similar_games, price_history, show_top_games, show_stats
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Public HTTPS URL Telegram should post updates to (e.g. https://example.com/telegram/webhook).
+# When unset the bot falls back to long polling.
+WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+
+def _derive_webhook_secret(token: Optional[str]) -> Optional[str]:
+    """Webhook secret derived from the bot token, the same in every process and replica"""
+    if not token:
+        return None
+    digest = hmac.new(token.encode('utf-8'), b'telegram-webhook-secret', hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+# Secret Telegram sends back in the X-Telegram-Bot-Api-Secret-Token header.
+# Derived from the bot token when a webhook URL is configured without one, so every
+# web worker and replica that calls setWebhook registers the same secret.
+_webhook_secret = os.getenv("TELEGRAM_WEBHOOK_SECRET") or (
+    _derive_webhook_secret(os.getenv("TELEGRAM_TOKEN")) if WEBHOOK_URL else None)
+
+# Maximum simultaneous webhook connections Telegram may open to us
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Maximum number of updates processed concurrently (updates from one chat stay in order)
+CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "32"))
+
+# The bot thread currently running, used by the webhook endpoint
+active_bot_thread = None
+
+def get_webhook_secret() -> Optional[str]:
+    """Return the webhook secret token, or None if the webhook endpoint is disabled"""
+    return _webhook_secret
+
+def _instrumented(callback):
+    """Wrap a handler callback to record its duration and failures in the metrics registry"""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            BOT_HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            BOT_HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+    return wrapper
+
 def start_bot(app=None):
     """Initialize and start the Telegram bot
 
@@ -29,22 +84,35 @@ def start_bot(app=None):
 
     try:
         # Create the Application instance
-        application = ApplicationBuilder().token(telegram_token).build()
+        application = (ApplicationBuilder()
+                       .token(telegram_token)
+                       .base_url(TELEGRAM_API_BASE_URL)
+                       .base_file_url(TELEGRAM_API_FILE_URL)
+                       .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES))
+                       .build())
 
         # Add command handlers
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("search", search_games))
-        application.add_handler(CommandHandler("subscribe", subscribe_game))
-        application.add_handler(CommandHandler("unsubscribe", unsubscribe_game))
-        application.add_handler(CommandHandler("mysubs", list_subscriptions))
-        application.add_handler(CommandHandler("discounts", check_discounts))
+        application.add_handler(CommandHandler("start", _instrumented(start)))
+        application.add_handler(CommandHandler("help", _instrumented(help_command)))
+        application.add_handler(CommandHandler("search", _instrumented(search_games)))
+        application.add_handler(CommandHandler("subscribe", _instrumented(subscribe_game)))
+        application.add_handler(CommandHandler("unsubscribe", _instrumented(unsubscribe_game)))
+        application.add_handler(CommandHandler("mysubs", _instrumented(list_subscriptions)))
+        application.add_handler(CommandHandler("discounts", _instrumented(check_discounts)))
+        application.add_handler(CommandHandler("filter", _instrumented(handle_filters)))
+        application.add_handler(CommandHandler("similar", _instrumented(similar_games)))
+        application.add_handler(CommandHandler("history", _instrumented(price_history)))
+        application.add_handler(CommandHandler("top", _instrumented(show_top_games)))
+        application.add_handler(CommandHandler("stats", _instrumented(show_stats)))
 
         # Add callback query handler for inline buttons
-        application.add_handler(CallbackQueryHandler(button_handler))
+        application.add_handler(CallbackQueryHandler(_instrumented(button_handler)))
+
+        # Add inline query handler for type-ahead game search
+        application.add_handler(InlineQueryHandler(_instrumented(inline_query)))
 
         # Add message handler for keyboard buttons
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, _instrumented(handle_message)))
 
         # Add error handler
         application.add_error_handler(error_handler)
@@ -57,12 +125,37 @@ def start_bot(app=None):
 class BotThread(threading.Thread):
     """Thread class for running the Telegram bot with its own event loop"""
 
-    def __init__(self, application, flask_app=None):
+    def __init__(self, application, flask_app=None, webhook_url=None, secret_token=None):
         super().__init__()
         self.application = application
         self.flask_app = flask_app
+        self.webhook_url = webhook_url
+        self.secret_token = secret_token
+        self.loop = None
         self.daemon = True
 
+    def feed_update(self, data: Dict[str, Any]) -> bool:
+        """Hand an update received over HTTP to the bot's event loop
+
+        Safe to call from any thread (e.g. a Flask request worker).
+
+        Args:
+            data: Update JSON as sent by Telegram
+
+        Returns:
+            True if the update was queued, False if the bot is not running
+        """
+        loop = self.loop
+        if not loop or not loop.is_running():
+            return False
+
+        update = Update.de_json(data, self.application.bot)
+        if update is None:
+            return False
+
+        asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), loop)
+        return True
+
     def run(self):
         """Run the bot in a new event loop with auto-restart"""
         while True:
@@ -74,6 +167,7 @@ class BotThread(threading.Thread):
                 # Create new event loop for this thread
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
+                self.loop = loop
 
                 # Define an async function to run the bot
                 async def start_bot_async():
@@ -92,15 +186,28 @@ class BotThread(threading.Thread):
 
                     await self.application.initialize()
                     await self.application.start()
-                    await self.application.updater.start_polling()
-                    logger.info("Telegram bot polling started successfully")
+
+                    if self.webhook_url:
+                        # Updates arrive through the Flask endpoint and are fed into the update queue
+                        await self.application.bot.set_webhook(
+                            url=self.webhook_url,
+                            secret_token=self.secret_token,
+                            allowed_updates=Update.ALL_TYPES,
+                            max_connections=WEBHOOK_MAX_CONNECTIONS
+                        )
+                        logger.info(f"Telegram bot webhook registered at {self.webhook_url}")
+                    else:
+                        await self.application.updater.start_polling()
+                        logger.info("Telegram bot polling started successfully")
+                    readiness.mark_ready('bot', 'webhook' if self.webhook_url else 'polling')
 
                 # Run the async function in the loop
                 loop.run_until_complete(start_bot_async())
                 loop.run_forever()
             except Exception as e:
                 logger.error(f"Error running Telegram bot: {e}, restarting in 5 seconds...")
-                asyncio.sleep(5)
+                readiness.mark_failed('bot', e)
+                time.sleep(5)
 
 def run_bot(application, flask_app=None):
     """Start the bot in a separate thread with its own event loop
@@ -109,6 +216,8 @@ def run_bot(application, flask_app=None):
         application: The initialized Telegram application
         flask_app: Flask application instance for context (optional)
     """
+    global active_bot_thread
+
     if not application:
         logger.error("Cannot run bot: application not initialized.")
         return
@@ -116,8 +225,13 @@ def run_bot(application, flask_app=None):
     try:
         # Start the Bot in a dedicated thread
         logger.info("Starting Telegram bot in a separate thread...")
-        bot_thread = BotThread(application, flask_app)
+        if WEBHOOK_URL:
+            logger.info("Webhook URL configured, using webhook mode")
+        else:
+            logger.info("No webhook URL configured, using long polling")
+        bot_thread = BotThread(application, flask_app, webhook_url=WEBHOOK_URL, secret_token=_webhook_secret)
         bot_thread.start()
+        active_bot_thread = bot_thread
         return bot_thread
     except Exception as e:
         logger.error(f"Error starting Telegram bot thread: {e}")
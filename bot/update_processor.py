@@ -0,0 +1,171 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from services.metrics import BOT_UPDATE_SECONDS
+from services.upstream import INTERACTIVE, set_priority, reset_priority
+
+logger = logging.getLogger(__name__)
+
+# Size of the base class's semaphore: it is taken before do_process_update, ahead of
+# the per-chat ordering, so it must never be what limits concurrency
+_UNLIMITED = 2 ** 31 - 1
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Update processor that runs updates concurrently but keeps each chat's updates in order
+
+    Updates from different chats are processed in parallel, up to
+    max_concurrent_updates at a time. Updates from the same chat are serialized
+    through a per-chat lock, so e.g. a subscribe and an unsubscribe from one
+    user never race each other; an update waits for its chat's turn before it
+    takes a concurrency slot, so a busy chat cannot starve the others.
+
+    The base class takes its own slot before calling do_process_update, which
+    would let a burst from one chat hold every slot while its updates wait on
+    each other. So the base limit is effectively disabled and the slots are
+    handed out here, after the chat's turn has come.
+    """
+
+    def __init__(self, max_concurrent_updates: int, latency_window: int = 2000, log_every: int = 500):
+        """
+        Args:
+            max_concurrent_updates: Maximum number of updates processed at the same time
+            latency_window: Number of most recent update latencies kept for percentiles
+            log_every: Log a latency summary after this many processed updates (0 disables)
+        """
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        # max_concurrent_updates is read by the base initializer, so report the base limit until it ran
+        self._limit = _UNLIMITED
+        super().__init__(_UNLIMITED)
+        self._limit = max_concurrent_updates
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_pending: Dict[int, int] = {}
+        self._latencies = deque(maxlen=latency_window)
+        self._processed = 0
+        self._log_every = log_every
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        """Maximum number of updates processed at the same time"""
+        return self._limit
+
+    @property
+    def current_concurrent_updates(self) -> int:
+        """Number of updates holding a slot (not counting those waiting for their chat's turn)"""
+        return self._in_flight
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[int]:
+        """Return the key updates are serialized on: the chat, or the user for inline queries"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Wait for earlier updates from the same chat, then for a free slot, and process the update"""
+        key = self._ordering_key(update)
+        started = time.perf_counter()
+
+        try:
+            if key is None:
+                await self._run(coroutine)
+                return
+
+            lock = self._chat_locks.get(key)
+            if lock is None:
+                lock = self._chat_locks[key] = asyncio.Lock()
+            self._chat_pending[key] = self._chat_pending.get(key, 0) + 1
+
+            try:
+                async with lock:
+                    await self._run(coroutine)
+            finally:
+                # Drop the lock once no update for this chat is waiting on it
+                self._chat_pending[key] -= 1
+                if not self._chat_pending[key]:
+                    del self._chat_pending[key]
+                    del self._chat_locks[key]
+        finally:
+            self._record_latency(time.perf_counter() - started)
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        """Take a slot and process an update at interactive upstream priority"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._limit)
+        async with self._slots:
+            self._in_flight += 1
+            # Someone is waiting on this update: its CheapShark calls jump ahead of sweeps
+            priority_token = set_priority(INTERACTIVE)
+            try:
+                await coroutine
+            finally:
+                reset_priority(priority_token)
+                self._in_flight -= 1
+
+    def _record_latency(self, seconds: float) -> None:
+        """Store a processed update's latency and periodically log a summary"""
+        self._latencies.append(seconds)
+        BOT_UPDATE_SECONDS.observe(seconds)
+        self._processed += 1
+
+        if self._log_every and self._processed % self._log_every == 0:
+            stats = self.latency_stats()
+            logger.info(
+                f"Processed {self._processed} updates; latency over last {stats['count']}: "
+                f"p50={stats['p50'] * 1000:.1f}ms p99={stats['p99'] * 1000:.1f}ms "
+                f"max={stats['max'] * 1000:.1f}ms, in flight: {self.current_concurrent_updates}"
+            )
+
+    def latency_stats(self) -> Dict[str, float]:
+        """
+        Get latency percentiles over the most recent updates
+
+        Returns:
+            Dictionary with count, p50, p90, p99 and max latency in seconds
+        """
+        samples = sorted(self._latencies)
+        if not samples:
+            return {'count': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+
+        def percentile(p: float) -> float:
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            'count': len(samples),
+            'p50': percentile(0.50),
+            'p90': percentile(0.90),
+            'p99': percentile(0.99),
+            'max': samples[-1]
+        }
+
+    @property
+    def processed(self) -> int:
+        """Number of updates processed so far"""
+        return self._processed
+
+    def reset_latency_stats(self) -> None:
+        """Forget the recorded latencies, e.g. between benchmark scenarios"""
+        self._latencies.clear()
+
+    async def initialize(self) -> None:
+        """Create the slots on the running event loop"""
+        self._slots = asyncio.Semaphore(self._limit)
+
+    async def shutdown(self) -> None:
+        """Log final latency figures"""
+        if self._processed:
+            stats = self.latency_stats()
+            logger.info(
+                f"Update processor shut down after {self._processed} updates "
+                f"(p50={stats['p50'] * 1000:.1f}ms p99={stats['p99'] * 1000:.1f}ms)"
+            )
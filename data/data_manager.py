@@ -1,13 +1,17 @@
+import asyncio
+import functools
+import json
 import logging
-from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
-from models import db, User, Game, Subscription, PriceRecord, Store
+from sqlalchemy import func
+from models import db, User, Game, Subscription, PriceRecord, Store, PriceStat, AnnouncedDeal
+from services.config import DB_EXECUTOR_WORKERS, DEAL_ALERTS_FORGET_DAYS
+from services.metrics import DB_CALL_SECONDS
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def add_subscription(user_id: int, game_id: str, game_name: str, thumbnail: str = None) -> bool:
@@ -206,12 +210,19 @@ def update_game_price(game_id: str, store_id: str, price: float, discount_percen
                           .order_by(PriceRecord.recorded_at.desc())
                           .first())
         
+        recorded_at = datetime.utcnow()
+        
+        # Update the store and game-wide statistics before the new record is stored
+        _update_price_stat(game_id, store_id, price, discount_percent, recorded_at)
+        _update_price_stat(game_id, ALL_STORES, price, discount_percent, recorded_at)
+        
         # Create a new price record
         price_record = PriceRecord(
             game_id=game_id,
             store_id=store_id,
             price=price,
-            discount_percent=discount_percent
+            discount_percent=discount_percent,
+            recorded_at=recorded_at
         )
         db.session.add(price_record)
         db.session.commit()
@@ -229,6 +240,142 @@ def update_game_price(game_id: str, store_id: str, price: float, discount_percen
         logger.error(f"Database error updating game price: {e}")
         return None
 
+# store_id of the statistics row covering all stores of a game
+ALL_STORES = '*'
+
+# Rolling average windows: (days, sum column, count column, window start column)
+_STAT_WINDOWS = (
+    (30, 'sum_30d', 'count_30d', 'window_30d_start'),
+    (90, 'sum_90d', 'count_90d', 'window_90d_start'),
+)
+
+def _price_records_query(game_id: str, store_id: str, *columns):
+    """Query over the price records a statistics row covers"""
+    query = db.session.query(*columns).filter(PriceRecord.game_id == game_id)
+    if store_id != ALL_STORES:
+        query = query.filter(PriceRecord.store_id == store_id)
+    return query
+
+def _bootstrap_price_stat(stat: PriceStat, recorded_at: datetime) -> None:
+    """Initialize a new statistics row from records stored before it existed"""
+    count, low = _price_records_query(
+        stat.game_id, stat.store_id, func.count(PriceRecord.id), func.min(PriceRecord.price)
+    ).one()
+    stat.record_count = count or 0
+    
+    if count:
+        stat.all_time_low = low
+        stat.all_time_low_at = (_price_records_query(stat.game_id, stat.store_id, PriceRecord.recorded_at)
+                                .filter(PriceRecord.price == low)
+                                .order_by(PriceRecord.recorded_at.desc())
+                                .limit(1).scalar())
+        stat.last_price, stat.last_recorded_at = (_price_records_query(
+            stat.game_id, stat.store_id, PriceRecord.price, PriceRecord.recorded_at
+        ).order_by(PriceRecord.recorded_at.desc()).first())
+        stat.last_sale_at = (_price_records_query(stat.game_id, stat.store_id, func.max(PriceRecord.recorded_at))
+                             .filter(PriceRecord.discount_percent > 0)
+                             .scalar())
+    
+    for days, sum_column, count_column, start_column in _STAT_WINDOWS:
+        window_start = recorded_at - timedelta(days=days)
+        window_sum, window_count = _price_records_query(
+            stat.game_id, stat.store_id, func.sum(PriceRecord.price), func.count(PriceRecord.id)
+        ).filter(PriceRecord.recorded_at >= window_start).one()
+        setattr(stat, sum_column, window_sum or 0.0)
+        setattr(stat, count_column, window_count or 0)
+        setattr(stat, start_column, window_start)
+
+def _update_price_stat(game_id: str, store_id: str, price: float, discount_percent: int, recorded_at: datetime) -> None:
+    """
+    Fold a new price into a statistics row (part of the caller's transaction)
+    
+    Each record is added to a rolling window once on ingest and subtracted once
+    when a later ingest moves the window start past it, so the cost per ingest
+    is a primary key lookup plus an index range scan over the few expired records.
+    """
+    stat = PriceStat.query.get((game_id, store_id))
+    if stat is None:
+        stat = PriceStat(game_id=game_id, store_id=store_id)
+        _bootstrap_price_stat(stat, recorded_at)
+        db.session.add(stat)
+    
+    stat.record_count = (stat.record_count or 0) + 1
+    if stat.all_time_low is None or price < stat.all_time_low:
+        stat.all_time_low = price
+        stat.all_time_low_at = recorded_at
+    stat.last_price = price
+    stat.last_recorded_at = recorded_at
+    if discount_percent > 0:
+        stat.last_sale_at = recorded_at
+    
+    for days, sum_column, count_column, start_column in _STAT_WINDOWS:
+        window_start = getattr(stat, start_column)
+        new_start = recorded_at - timedelta(days=days)
+        if window_start is not None and window_start < new_start:
+            # Subtract the records that aged out since the last ingest
+            expired_sum, expired_count = _price_records_query(
+                game_id, store_id, func.sum(PriceRecord.price), func.count(PriceRecord.id)
+            ).filter(PriceRecord.recorded_at >= window_start, PriceRecord.recorded_at < new_start).one()
+            setattr(stat, sum_column, max((getattr(stat, sum_column) or 0.0) - (expired_sum or 0.0), 0.0))
+            setattr(stat, count_column, max((getattr(stat, count_column) or 0) - (expired_count or 0), 0))
+        setattr(stat, start_column, new_start)
+        setattr(stat, sum_column, (getattr(stat, sum_column) or 0.0) + price)
+        setattr(stat, count_column, (getattr(stat, count_column) or 0) + 1)
+
+def get_price_stats(game_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the price statistics of a game
+    
+    Args:
+        game_id: Game ID
+        
+    Returns:
+        Dictionary with store as keys (ALL_STORES for the game as a whole) and
+        all_time_low, all_time_low_at, avg_30d, avg_90d, last_price and
+        last_sale_at as values. Averages are as of the latest recorded price.
+    """
+    try:
+        stats = {}
+        for stat in PriceStat.query.filter_by(game_id=game_id).all():
+            stats[stat.store_id] = {
+                'all_time_low': stat.all_time_low,
+                'all_time_low_at': stat.all_time_low_at,
+                'avg_30d': stat.sum_30d / stat.count_30d if stat.count_30d else None,
+                'avg_90d': stat.sum_90d / stat.count_90d if stat.count_90d else None,
+                'last_price': stat.last_price,
+                'last_sale_at': stat.last_sale_at,
+                'record_count': stat.record_count
+            }
+        return stats
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching price stats: {e}")
+        return {}
+
+def get_price_records(game_id: str, days: Optional[int] = None) -> Dict[str, List[Tuple[datetime, float]]]:
+    """
+    Get the stored price history of a game, grouped by store
+    
+    Args:
+        game_id: Game ID
+        days: Only include records from the last N days (all records if None)
+        
+    Returns:
+        Dictionary with store as keys and time-ordered (recorded_at, price) lists as values
+    """
+    try:
+        query = (db.session.query(PriceRecord.store_id, PriceRecord.recorded_at, PriceRecord.price)
+                 .filter(PriceRecord.game_id == game_id))
+        if days is not None:
+            query = query.filter(PriceRecord.recorded_at >= datetime.utcnow() - timedelta(days=days))
+        
+        history = {}
+        for store_id, recorded_at, price in query.order_by(PriceRecord.recorded_at):
+            history.setdefault(store_id, []).append((recorded_at, price))
+        return history
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching price records: {e}")
+        return {}
+
 def add_or_update_store(store_id: str, name: str, logo: str = None) -> bool:
     """
     Add or update a store in the database
@@ -264,6 +411,65 @@ def add_or_update_store(store_id: str, name: str, logo: str = None) -> bool:
         logger.error(f"Database error adding/updating store: {e}")
         return False
 
+def get_game_titles(game_ids: List[str]) -> Dict[str, str]:
+    """
+    Get the titles of several games at once
+    
+    Args:
+        game_ids: Game IDs to look up
+        
+    Returns:
+        Dictionary with game_id as keys and titles as values (unknown games are omitted)
+    """
+    try:
+        if not game_ids:
+            return {}
+        rows = db.session.query(Game.id, Game.title).filter(Game.id.in_(game_ids)).all()
+        return {game_id: title for game_id, title in rows}
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching game titles: {e}")
+        return {}
+
+def upsert_games(games: List[Dict[str, Any]]) -> int:
+    """
+    Store games seen in search results, adding new ones and refreshing known ones
+    
+    Args:
+        games: Games in the search result format (id, name, thumbnail, cheapest_price)
+        
+    Returns:
+        Number of games added or updated
+    """
+    try:
+        games_by_id = {game['id']: game for game in games if game.get('id') and game.get('name')}
+        if not games_by_id:
+            return 0
+        
+        existing = {game.id: game for game in Game.query.filter(Game.id.in_(games_by_id.keys())).all()}
+        
+        for game_id, game_info in games_by_id.items():
+            game = existing.get(game_id)
+            if not game:
+                game = Game(id=game_id, title=game_info['name'])
+                db.session.add(game)
+            
+            game.title = game_info['name']
+            if game_info.get('thumbnail'):
+                game.thumbnail = game_info['thumbnail']
+            
+            # Keep the last seen cheapest price alongside any other stored details
+            details = json.loads(game.details or '{}')
+            details['cheapest_price'] = game_info.get('cheapest_price')
+            game.details = json.dumps(details)
+            game.updated_at = datetime.utcnow()
+        
+        db.session.commit()
+        return len(games_by_id)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error upserting games: {e}")
+        return 0
+
 def update_user_info(user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> bool:
     """
     Update user information in the database
@@ -303,3 +509,270 @@ def update_user_info(user_id: int, username: str = None, first_name: str = None,
         db.session.rollback()
         logger.error(f"Database error updating user info: {e}")
         return False
+
+# Deal filters with their defaults; deal_alerts has its own column, the rest are kept in User.settings
+DEAL_FILTER_DEFAULTS = {'max_price': None, 'min_discount': None, 'deal_alerts': False}
+
+def _load_settings(settings: Optional[str]) -> Dict[str, Any]:
+    try:
+        return json.loads(settings or '{}')
+    except ValueError:
+        return {}
+
+def _deal_filters(settings: Optional[str], deal_alerts: Optional[bool]) -> Dict[str, Any]:
+    stored = _load_settings(settings)
+    filters = {key: stored.get(key, default) for key, default in DEAL_FILTER_DEFAULTS.items()}
+    filters['deal_alerts'] = bool(deal_alerts)
+    return filters
+
+def get_user_filters(user_id: int) -> Dict[str, Any]:
+    """
+    Get a user's deal filters
+
+    Returns:
+        Dictionary with max_price, min_discount (None when not set) and deal_alerts
+    """
+    try:
+        user = User.query.get(user_id)
+        if not user:
+            return dict(DEAL_FILTER_DEFAULTS)
+        return _deal_filters(user.settings, user.deal_alerts)
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching user filters: {e}")
+        return dict(DEAL_FILTER_DEFAULTS)
+
+def update_user_filters(user_id: int, **changes: Any) -> Optional[Dict[str, Any]]:
+    """
+    Change some of a user's deal filters (stored in the users table, so they survive restarts)
+
+    Args:
+        user_id: Telegram user ID
+        **changes: New values for max_price, min_discount or deal_alerts; None clears a filter
+
+    Returns:
+        The user's filters after the change, or None on a database error
+    """
+    unknown = set(changes) - set(DEAL_FILTER_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown deal filters: {', '.join(sorted(unknown))}")
+    try:
+        user = User.query.get(user_id)
+        if not user:
+            user = User(id=user_id)
+            db.session.add(user)
+        settings = _load_settings(user.settings)
+        for key, value in changes.items():
+            if key == 'deal_alerts':
+                user.deal_alerts = bool(value)
+            elif value is None or value == DEAL_FILTER_DEFAULTS[key]:
+                settings.pop(key, None)
+            else:
+                settings[key] = value
+        user.settings = json.dumps(settings)
+        db.session.commit()
+        return _deal_filters(user.settings, user.deal_alerts)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error updating user filters: {e}")
+        return None
+
+def get_deal_alert_filters() -> List[Tuple[int, Optional[float], Optional[float]]]:
+    """
+    Get the filters of all users who turned deal alerts on
+
+    Returns:
+        List of (user_id, max_price, min_discount) tuples
+    """
+    try:
+        rows = (db.session.query(User.id, User.settings)
+                .filter(User.deal_alerts.is_(True))
+                .yield_per(10000))
+        result = []
+        for user_id, settings in rows:
+            filters = _deal_filters(settings, True)
+            result.append((user_id, filters['max_price'], filters['min_discount']))
+        return result
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching deal alert filters: {e}")
+        return []
+
+def move_deal_alerts_setting() -> int:
+    """
+    Move the deal_alerts flag from User.settings into its column (run once, when the column is added)
+
+    Returns:
+        Number of users whose flag was moved
+    """
+    moved = 0
+    for user in User.query.filter(User.settings.isnot(None)).yield_per(1000):
+        settings = _load_settings(user.settings)
+        if 'deal_alerts' in settings:
+            user.deal_alerts = bool(settings.pop('deal_alerts'))
+            user.settings = json.dumps(settings)
+            moved += 1
+    db.session.commit()
+    return moved
+
+# Deal IDs per IN (...) query, below SQLite's limit on bound parameters
+_DEAL_ID_CHUNK = 500
+
+def _chunks(ids: List[str]):
+    for start in range(0, len(ids), _DEAL_ID_CHUNK):
+        yield ids[start:start + _DEAL_ID_CHUNK]
+
+def get_announced_deal_prices(deal_ids: List[str]) -> Optional[Dict[str, float]]:
+    """
+    Get the prices deals were announced at
+    
+    Args:
+        deal_ids: Deals to look up
+        
+    Returns:
+        deal_id -> announced price for those of the deals announced before, or None on a database error
+    """
+    try:
+        prices = {}
+        for chunk in _chunks(deal_ids):
+            prices.update(db.session.query(AnnouncedDeal.deal_id, AnnouncedDeal.price)
+                          .filter(AnnouncedDeal.deal_id.in_(chunk)).all())
+        return prices
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching announced deals: {e}")
+        return None
+
+def has_announced_deals() -> bool:
+    """Whether any deal has been announced yet"""
+    try:
+        return db.session.query(AnnouncedDeal.deal_id).first() is not None
+    except SQLAlchemyError as e:
+        logger.error(f"Database error checking announced deals: {e}")
+        return False
+
+def record_announced_deals(announced: List[Dict[str, Any]], seen_ids: List[str],
+                           forget_days: int = DEAL_ALERTS_FORGET_DAYS) -> bool:
+    """
+    Remember the deals just announced and forget the ones long gone
+    
+    Args:
+        announced: Deals just announced (deal_id and price)
+        seen_ids: Deals currently on offer; their announcements are kept
+        forget_days: Days after which a deal no longer on offer is forgotten
+        
+    Returns:
+        False on a database error
+    """
+    now = datetime.utcnow()
+    try:
+        deals = {deal['deal_id']: deal for deal in announced}
+        existing = {}
+        for chunk in _chunks(list(deals)):
+            existing.update((row.deal_id, row) for row in AnnouncedDeal.query.filter(AnnouncedDeal.deal_id.in_(chunk)))
+        for deal_id, deal in deals.items():
+            row = existing.get(deal_id)
+            if row is None:
+                row = AnnouncedDeal(deal_id=deal_id)
+                db.session.add(row)
+            row.price = deal['price']
+            row.announced_at = now
+        for chunk in _chunks(seen_ids):
+            (AnnouncedDeal.query.filter(AnnouncedDeal.deal_id.in_(chunk))
+             .update({'seen_at': now}, synchronize_session=False))
+        (AnnouncedDeal.query.filter(AnnouncedDeal.seen_at < now - timedelta(days=forget_days))
+         .delete(synchronize_session=False))
+        db.session.commit()
+        return True
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error recording announced deals: {e}")
+        return False
+
+
+# Async access layer
+#
+# The bot handlers run on an asyncio event loop, so the synchronous functions
+# above must not be called from them directly: a single slow query would stall
+# update processing for every user. The wrappers below run them on a dedicated,
+# bounded thread pool inside their own Flask app context.
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+def _call_in_app_context(app, func: Callable, *args, **kwargs):
+    """Run a data manager function inside a fresh app context (and DB session)"""
+    with app.app_context():
+        return func(*args, **kwargs)
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a synchronous data manager function on the DB thread pool
+
+    Must be awaited inside a Flask app context; the same app is used for the
+    worker thread. The session is scoped to that context and removed when it ends.
+
+    Args:
+        func: Synchronous function to run
+        *args, **kwargs: Arguments passed to the function
+
+    Returns:
+        The function's return value
+    """
+    app = current_app._get_current_object()
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_call_in_app_context, app, func, *args, **kwargs)
+    with DB_CALL_SECONDS.time(function=func.__name__):
+        return await loop.run_in_executor(_db_executor, call)
+
+async def add_subscription_async(user_id: int, game_id: str, game_name: str, thumbnail: str = None) -> bool:
+    """Awaitable version of add_subscription"""
+    return await run_db(add_subscription, user_id, game_id, game_name, thumbnail)
+
+async def remove_subscription_async(user_id: int, game_id: str) -> Tuple[bool, str]:
+    """Awaitable version of remove_subscription"""
+    return await run_db(remove_subscription, user_id, game_id)
+
+async def get_user_subscriptions_async(user_id: int) -> Dict[str, Dict[str, Any]]:
+    """Awaitable version of get_user_subscriptions"""
+    return await run_db(get_user_subscriptions, user_id)
+
+async def get_all_subscriptions_async() -> Dict[str, List[int]]:
+    """Awaitable version of get_all_subscriptions"""
+    return await run_db(get_all_subscriptions)
+
+async def get_subscribed_users_for_game_async(game_id: str) -> List[int]:
+    """Awaitable version of get_subscribed_users_for_game"""
+    return await run_db(get_subscribed_users_for_game, game_id)
+
+async def update_game_price_async(game_id: str, store_id: str, price: float, discount_percent: int) -> Optional[Dict[str, Any]]:
+    """Awaitable version of update_game_price"""
+    return await run_db(update_game_price, game_id, store_id, price, discount_percent)
+
+async def add_or_update_store_async(store_id: str, name: str, logo: str = None) -> bool:
+    """Awaitable version of add_or_update_store"""
+    return await run_db(add_or_update_store, store_id, name, logo)
+
+async def get_game_titles_async(game_ids: List[str]) -> Dict[str, str]:
+    """Awaitable version of get_game_titles"""
+    return await run_db(get_game_titles, game_ids)
+
+async def get_price_records_async(game_id: str, days: Optional[int] = None) -> Dict[str, List[Tuple[datetime, float]]]:
+    """Awaitable version of get_price_records"""
+    return await run_db(get_price_records, game_id, days)
+
+async def get_price_stats_async(game_id: str) -> Dict[str, Dict[str, Any]]:
+    """Awaitable version of get_price_stats"""
+    return await run_db(get_price_stats, game_id)
+
+async def upsert_games_async(games: List[Dict[str, Any]]) -> int:
+    """Awaitable version of upsert_games"""
+    return await run_db(upsert_games, games)
+
+async def get_user_filters_async(user_id: int) -> Dict[str, Any]:
+    """Awaitable version of get_user_filters"""
+    return await run_db(get_user_filters, user_id)
+
+async def update_user_filters_async(user_id: int, **changes: Any) -> Optional[Dict[str, Any]]:
+    """Awaitable version of update_user_filters"""
+    return await run_db(update_user_filters, user_id, **changes)
+
+async def update_user_info_async(user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> bool:
+    """Awaitable version of update_user_info"""
+    return await run_db(update_user_info, user_id, username, first_name, last_name)
@@ -0,0 +1,11 @@
+"""
+gunicorn settings, read automatically from the working directory
+
+Serving main:app only imports the application; the bot, the scheduler and
+the database setup are started by the hook below once the worker is up, so
+nothing else that imports main (such as a multiprocessing child) starts them.
+"""
+
+def post_worker_init(worker):
+    from app import start_services
+    start_services()
@@ -1,14 +1,16 @@
-
 import os
-from app import app, bot_thread, scheduler_thread
+from services.logging_setup import configure_logging
+
+# Logging is configured before the app modules are imported, so nothing they log is lost
+configure_logging()
+
+from app import app, start_services
 
 if __name__ == "__main__":
-    # Start bot and scheduler threads
-    if bot_thread:
-        bot_thread.start()
-    if scheduler_thread:
-        scheduler_thread.start()
-        
+    # Importing this module starts nothing: under gunicorn (main:app) the
+    # post_worker_init hook in gunicorn.conf.py starts the services instead
+    start_services()
+
     # Run Flask app
     port = os.getenv('PORT', 5000)
     app.run(host="0.0.0.0", port=port)
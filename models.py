@@ -17,6 +17,7 @@ class User(db.Model):
     last_name = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     settings = db.Column(db.Text, default='{}')
+    deal_alerts = db.Column(db.Boolean, nullable=False, default=False, index=True)  # New deal alerts turned on
     
     # Relationships
     subscriptions = db.relationship('Subscription', back_populates='user', cascade='all, delete-orphan')
@@ -82,10 +83,43 @@ class PriceRecord(db.Model):
     # Relationships
     game = db.relationship('Game', back_populates='price_records')
     
+    # Latest-record and rolling-window lookups filter by game, store and time
+    __table_args__ = (
+        db.Index('ix_price_records_game_store_time', 'game_id', 'store_id', 'recorded_at'),
+    )
+    
     def __repr__(self):
         return f"<PriceRecord {self.id}: {self.game_id} - {self.store_id} - ${self.price}>"
 
 
+class PriceStat(db.Model):
+    """Incrementally maintained price statistics per game and store
+
+    store_id '*' holds the statistics across all stores of the game. Rolling
+    averages are kept as a sum and count over records newer than the window
+    start; records are subtracted once as they age out of the window.
+    """
+    __tablename__ = 'price_stats'
+    
+    game_id = db.Column(db.String(64), db.ForeignKey('games.id'), primary_key=True)
+    store_id = db.Column(db.String(64), primary_key=True)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    all_time_low = db.Column(db.Float, nullable=True)
+    all_time_low_at = db.Column(db.DateTime, nullable=True)
+    last_price = db.Column(db.Float, nullable=True)
+    last_recorded_at = db.Column(db.DateTime, nullable=True)
+    last_sale_at = db.Column(db.DateTime, nullable=True)
+    sum_30d = db.Column(db.Float, nullable=False, default=0.0)
+    count_30d = db.Column(db.Integer, nullable=False, default=0)
+    window_30d_start = db.Column(db.DateTime, nullable=True)
+    sum_90d = db.Column(db.Float, nullable=False, default=0.0)
+    count_90d = db.Column(db.Integer, nullable=False, default=0)
+    window_90d_start = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<PriceStat {self.game_id} - {self.store_id}: low ${self.all_time_low}>"
+
+
 class Store(db.Model):
     """Store model for caching store information"""
     __tablename__ = 'stores'
@@ -96,4 +130,121 @@ class Store(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
-        return f"<Store {self.id}: {self.name}>"
\ No newline at end of file
+        return f"<Store {self.id}: {self.name}>"
+
+class SimilarGame(db.Model):
+    """Precomputed nearest neighbours of a game by content similarity"""
+    __tablename__ = 'similar_games'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.String(64), db.ForeignKey('games.id'), nullable=False, index=True)
+    similar_game_id = db.Column(db.String(64), db.ForeignKey('games.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    similar_game = db.relationship('Game', foreign_keys=[similar_game_id])
+    
+    def __repr__(self):
+        return f"<SimilarGame {self.game_id} -> {self.similar_game_id}: {self.score:.3f}>"
+
+class SweepRun(db.Model):
+    """Timing report of one scheduled price sweep"""
+    __tablename__ = 'sweep_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    duration_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    outcome = db.Column(db.String(32), nullable=False)
+    games_checked = db.Column(db.Integer, nullable=False, default=0)
+    price_drops = db.Column(db.Integer, nullable=False, default=0)
+    median_game_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    phases = db.Column(db.Text, default='{}')  # phase -> {"seconds", "calls"}
+    slowest_games = db.Column(db.Text, default='[]')  # [{"game_id", "seconds", "phases"}], slowest first
+    profile_file = db.Column(db.String(255), nullable=True)  # collapsed stacks, if the sweep was profiled
+    
+    def __repr__(self):
+        return f"<SweepRun {self.id}: {self.outcome} in {self.duration_seconds:.1f}s>"
+
+class SweepWorker(db.Model):
+    """A worker process taking part in sharded price sweeps, kept alive by heartbeats"""
+    __tablename__ = 'sweep_workers'
+    
+    id = db.Column(db.String(128), primary_key=True)  # hostname:pid:random
+    hostname = db.Column(db.String(255), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<SweepWorker {self.id}>"
+
+class ShardedSweep(db.Model):
+    """A price sweep split between worker processes"""
+    __tablename__ = 'sharded_sweeps'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(32), nullable=False, default='running')  # running, completed
+    
+    def __repr__(self):
+        return f"<ShardedSweep {self.id}: {self.status}>"
+
+class SweepShard(db.Model):
+    """The games one worker checks in a sharded sweep"""
+    __tablename__ = 'sweep_shards'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sweep_id = db.Column(db.Integer, db.ForeignKey('sharded_sweeps.id'), nullable=False, index=True)
+    worker_id = db.Column(db.String(128), nullable=False, index=True)
+    game_ids = db.Column(db.Text, nullable=False, default='[]')
+    # pending -> running -> done / failed; reassigned when the worker stopped heartbeating
+    status = db.Column(db.String(32), nullable=False, default='pending')
+    price_drops = db.Column(db.Integer, nullable=False, default=0)
+    report = db.Column(db.Text, default='{}')  # {"phases", "games"} from the worker's sweep report
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<SweepShard {self.sweep_id}/{self.worker_id}: {self.status}>"
+
+class PendingPriceDrop(db.Model):
+    """A price drop found by a sweep worker, waiting for the coordinator to send notifications"""
+    __tablename__ = 'pending_price_drops'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sweep_id = db.Column(db.Integer, db.ForeignKey('sharded_sweeps.id'), nullable=False, index=True)
+    game_id = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # price_drops entry: name, users, price_info
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<PendingPriceDrop {self.sweep_id}/{self.game_id}>"
+
+class AnnouncedDeal(db.Model):
+    """A deal users were alerted about, with the price it was announced at"""
+    __tablename__ = 'announced_deals'
+    
+    deal_id = db.Column(db.String(255), primary_key=True)
+    price = db.Column(db.Float, nullable=False)
+    announced_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    seen_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # last time it was on offer
+    
+    def __repr__(self):
+        return f"<AnnouncedDeal {self.deal_id} at {self.price}>"
+
+class Lease(db.Model):
+    """A named lease held by one process at a time, for leader election between replicas"""
+    __tablename__ = 'leases'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    term = db.Column(db.Integer, nullable=False, default=1)  # incremented whenever the holder changes
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<Lease {self.name}: {self.holder} until {self.expires_at}>"
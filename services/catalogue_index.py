@@ -0,0 +1,397 @@
+import re
+import math
+import json
+import logging
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import event
+from models import Game
+from data.data_manager import run_db, upsert_games_async
+from services.game_service import search_game
+from services.config import CATALOGUE_STALE_HOURS
+from services.metrics import CACHE_REQUESTS
+from services.session_hooks import after_commit
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Prefixes shorter than this only match whole tokens, to keep lookups cheap
+MIN_PREFIX_LENGTH = 2
+
+# Maximum number of vocabulary tokens a single prefix may expand to
+MAX_PREFIX_EXPANSIONS = 200
+
+def tokenize(text: str) -> List[str]:
+    """Split a title or query into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.casefold()) if text else []
+
+class PrefixIndex:
+    """Sorted-array prefix index for type-ahead lookups
+
+    Every title is stored under each of its word suffixes ("witcher 3 wild
+    hunt", "3 wild hunt", "wild hunt", "hunt"), so a prefix typed from the start
+    of any word matches. Lookups bisect to the first candidate and scan forward;
+    updates insert or delete in place. Not thread-safe on its own.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str]] = []
+        self._keys: Dict[str, List[str]] = {}
+
+    def add(self, game_id: str, tokens: List[str]) -> None:
+        """Index a game under the word suffixes of its title tokens"""
+        self.remove(game_id)
+        keys = [' '.join(tokens[i:]) for i in range(len(tokens))]
+        for key in keys:
+            insort(self._entries, (key, game_id))
+        self._keys[game_id] = keys
+
+    def add_many(self, games: List[Tuple[str, List[str]]]) -> None:
+        """Index many new games at once with a single sort"""
+        for game_id, tokens in games:
+            self.remove(game_id)
+            keys = [' '.join(tokens[i:]) for i in range(len(tokens))]
+            self._entries.extend((key, game_id) for key in keys)
+            self._keys[game_id] = keys
+        self._entries.sort()
+
+    def remove(self, game_id: str) -> None:
+        """Remove a game's entries"""
+        for key in self._keys.pop(game_id, []):
+            position = bisect_left(self._entries, (key, game_id))
+            if position < len(self._entries) and self._entries[position] == (key, game_id):
+                del self._entries[position]
+
+    def lookup(self, prefix: str, max_candidates: int = 200) -> Dict[str, bool]:
+        """
+        Find games with a title word sequence starting with prefix
+
+        Args:
+            prefix: Normalized prefix (tokens joined by single spaces)
+            max_candidates: Stop scanning after this many matching entries
+
+        Returns:
+            Matching game IDs mapped to whether the match is at the start of the title
+        """
+        matches: Dict[str, bool] = {}
+        position = bisect_left(self._entries, (prefix, ''))
+        scanned = 0
+        while position < len(self._entries) and scanned < max_candidates:
+            key, game_id = self._entries[position]
+            if not key.startswith(prefix):
+                break
+            at_start = self._keys[game_id][0] == key
+            matches[game_id] = matches.get(game_id, False) or at_start
+            position += 1
+            scanned += 1
+        return matches
+
+class CatalogueIndex:
+    """In-process inverted index over game titles
+
+    Each title token maps to the set of games containing it. A sorted copy of
+    the vocabulary allows prefix lookups with bisect, so "witch" matches
+    "witcher". Queries use AND semantics: every query token must match, either
+    exactly or as a prefix, and results are ranked by IDF-weighted match
+    quality. All methods are thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._games: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._prefixes = PrefixIndex()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def add_game(
+        self,
+        game_id: str,
+        title: str,
+        thumbnail: Optional[str] = None,
+        cheapest_price: Optional[str] = None,
+        updated_at: Optional[datetime] = None
+    ) -> None:
+        """Add a game to the index, or update it if already present"""
+        with self._lock:
+            previous = self._games.get(game_id)
+            if previous and previous['title'] != title:
+                self._remove_postings(game_id, previous['tokens'])
+
+            tokens = tokenize(title)
+            self._games[game_id] = {
+                'title': title,
+                'tokens': tokens,
+                'thumbnail': thumbnail if thumbnail else (previous or {}).get('thumbnail'),
+                'cheapest_price': cheapest_price if cheapest_price else (previous or {}).get('cheapest_price'),
+                'updated_at': updated_at or datetime.utcnow()
+            }
+
+            for token in set(tokens):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    insort(self._vocabulary, token)
+                postings.add(game_id)
+
+            if not previous or previous['title'] != title:
+                self._prefixes.add(game_id, tokens)
+
+    def add_games(self, games: List[Dict[str, Any]]) -> None:
+        """
+        Bulk-load games not yet in the index, sorting the lookup arrays once
+
+        Args:
+            games: Dictionaries with id, title and optionally thumbnail,
+                cheapest_price and updated_at
+        """
+        with self._lock:
+            new_prefixes = []
+            for game in games:
+                if game['id'] in self._games:
+                    self.add_game(game['id'], game['title'], game.get('thumbnail'),
+                                  game.get('cheapest_price'), game.get('updated_at'))
+                    continue
+
+                tokens = tokenize(game['title'])
+                self._games[game['id']] = {
+                    'title': game['title'],
+                    'tokens': tokens,
+                    'thumbnail': game.get('thumbnail'),
+                    'cheapest_price': game.get('cheapest_price'),
+                    'updated_at': game.get('updated_at') or datetime.utcnow()
+                }
+                for token in set(tokens):
+                    self._postings.setdefault(token, set()).add(game['id'])
+                new_prefixes.append((game['id'], tokens))
+
+            self._vocabulary = sorted(self._postings)
+            self._prefixes.add_many(new_prefixes)
+
+    def remove_game(self, game_id: str) -> None:
+        """Remove a game from the index"""
+        with self._lock:
+            game = self._games.pop(game_id, None)
+            if game:
+                self._remove_postings(game_id, game['tokens'])
+                self._prefixes.remove(game_id)
+
+    def _remove_postings(self, game_id: str, tokens: List[str]) -> None:
+        """Drop a game from the postings of its tokens; caller must hold the lock"""
+        for token in set(tokens):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(game_id)
+            if not postings:
+                del self._postings[token]
+                position = bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+
+    def _expand(self, query_token: str) -> List[str]:
+        """Return vocabulary tokens matching a query token exactly or by prefix"""
+        if len(query_token) < MIN_PREFIX_LENGTH:
+            return [query_token] if query_token in self._postings else []
+
+        matches = []
+        position = bisect_left(self._vocabulary, query_token)
+        while position < len(self._vocabulary) and len(matches) < MAX_PREFIX_EXPANSIONS:
+            token = self._vocabulary[position]
+            if not token.startswith(query_token):
+                break
+            matches.append(token)
+            position += 1
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find games whose titles match every token of the query
+
+        Args:
+            query: Free-text query; each token may be a prefix of a title word
+            limit: Maximum number of results
+
+        Returns:
+            Best matches first, in the search result format plus 'updated_at'
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            total_games = max(len(self._games), 1)
+            scores: Optional[Dict[str, float]] = None
+
+            for query_token in query_tokens:
+                token_scores: Dict[str, float] = {}
+                for token in self._expand(query_token):
+                    postings = self._postings[token]
+                    idf = math.log(1 + total_games / len(postings))
+                    # Whole-word matches rank above prefix matches
+                    weight = idf if token == query_token else idf * 0.7
+                    for game_id in postings:
+                        if weight > token_scores.get(game_id, 0.0):
+                            token_scores[game_id] = weight
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {game_id: score + token_scores[game_id]
+                              for game_id, score in scores.items() if game_id in token_scores}
+                if not scores:
+                    return []
+
+            normalized_query = ' '.join(query_tokens)
+
+            def rank(game_id: str) -> Tuple[float, int, str]:
+                game = self._games[game_id]
+                # Prefer titles that start with the query and shorter titles
+                starts_with = 1.0 if ' '.join(game['tokens']).startswith(normalized_query) else 0.0
+                return (-(scores[game_id] + starts_with), len(game['tokens']), game['title'])
+
+            best = sorted(scores, key=rank)[:limit]
+            return [
+                {
+                    'id': game_id,
+                    'name': self._games[game_id]['title'],
+                    'thumbnail': self._games[game_id]['thumbnail'],
+                    'cheapest_price': self._games[game_id]['cheapest_price'],
+                    'updated_at': self._games[game_id]['updated_at']
+                }
+                for game_id in best
+            ]
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Complete a partially typed title
+
+        Args:
+            prefix: Text typed so far; matched against the start of any title word
+            limit: Maximum number of results
+
+        Returns:
+            Matches starting at the beginning of the title first, then shorter titles
+        """
+        normalized = ' '.join(tokenize(prefix))
+        if not normalized:
+            return []
+
+        with self._lock:
+            matches = self._prefixes.lookup(normalized)
+            best = sorted(
+                matches,
+                key=lambda game_id: (not matches[game_id], len(self._games[game_id]['title']), self._games[game_id]['title'])
+            )[:limit]
+            return [
+                {
+                    'id': game_id,
+                    'name': self._games[game_id]['title'],
+                    'thumbnail': self._games[game_id]['thumbnail'],
+                    'cheapest_price': self._games[game_id]['cheapest_price']
+                }
+                for game_id in best
+            ]
+
+# Shared catalogue index for the whole process
+catalogue_index = CatalogueIndex()
+_load_lock = threading.Lock()
+
+def _game_cheapest_price(game: Game) -> Optional[str]:
+    """Read the last seen cheapest price from a game's stored details"""
+    try:
+        return json.loads(game.details or '{}').get('cheapest_price')
+    except (ValueError, AttributeError):
+        return None
+
+def load_catalogue_index() -> int:
+    """
+    Build the catalogue index from the games table (needs an app context)
+
+    Returns:
+        Number of games indexed
+    """
+    with _load_lock:
+        if catalogue_index.loaded:
+            return len(catalogue_index)
+
+        catalogue_index.add_games([
+            {
+                'id': game.id,
+                'title': game.title,
+                'thumbnail': game.thumbnail,
+                'cheapest_price': _game_cheapest_price(game),
+                'updated_at': game.updated_at
+            }
+            for game in Game.query.all()
+        ])
+        catalogue_index.loaded = True
+        logger.info(f"Catalogue index built with {len(catalogue_index)} games")
+        return len(catalogue_index)
+
+@event.listens_for(Game, 'after_insert')
+@event.listens_for(Game, 'after_update')
+def _index_saved_game(mapper, connection, target: Game) -> None:
+    """Keep the index in step with every Game row written through the ORM, once the write commits"""
+    after_commit(
+        target,
+        catalogue_index.add_game,
+        target.id,
+        target.title,
+        thumbnail=target.thumbnail,
+        cheapest_price=_game_cheapest_price(target)
+    )
+
+@event.listens_for(Game, 'after_delete')
+def _unindex_deleted_game(mapper, connection, target: Game) -> None:
+    """Drop deleted games from the index once the delete commits"""
+    after_commit(target, catalogue_index.remove_game, target.id)
+
+async def ensure_catalogue_loaded() -> None:
+    """Build the catalogue index on the DB thread pool if it is not built yet"""
+    if not catalogue_index.loaded:
+        await run_db(load_catalogue_index)
+
+def _is_stale(results: List[Dict[str, Any]]) -> bool:
+    """Results are stale when even the freshest of them is older than CATALOGUE_STALE_HOURS"""
+    newest = max(result['updated_at'] for result in results)
+    return datetime.utcnow() - newest > timedelta(hours=CATALOGUE_STALE_HOURS)
+
+async def search_catalogue(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Search games in the local catalogue, falling back to the API
+
+    The API is only queried when the local index has no match or its matches
+    are stale. API results are stored in the games table, which also adds
+    them to the index. Must be awaited inside a Flask app context.
+
+    Args:
+        query: Game title or part of it
+        limit: Maximum number of results
+
+    Returns:
+        A list of games with id, name, thumbnail and cheapest_price
+    """
+    await ensure_catalogue_loaded()
+
+    local_results = catalogue_index.search(query, limit)
+    if local_results and not _is_stale(local_results):
+        CACHE_REQUESTS.inc(cache='catalogue', result='hit')
+        logger.debug(f"Catalogue hit for '{query}': {len(local_results)} games")
+        return local_results
+
+    CACHE_REQUESTS.inc(cache='catalogue', result='stale' if local_results else 'miss')
+
+    api_results = await search_game(query)
+    if api_results:
+        await upsert_games_async(api_results)
+        return api_results[:limit]
+
+    # API unavailable or empty: stale local results are better than nothing
+    return local_results
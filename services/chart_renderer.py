@@ -0,0 +1,137 @@
+"""
+Minimal PNG line chart renderer for price history
+
+Kept free of third-party and app imports: it runs in worker processes that
+preload only this module.
+"""
+import zlib
+import struct
+from typing import Dict, List, Sequence, Tuple
+
+# Line colours, paired with the emoji used to label them in captions
+PALETTE = [
+    ((220, 50, 47), '🔴'),
+    ((38, 139, 210), '🔵'),
+    ((133, 153, 0), '🟢'),
+    ((203, 75, 22), '🟠'),
+    ((108, 113, 196), '🟣'),
+    ((181, 137, 0), '🟡'),
+    ((120, 80, 50), '🟤'),
+    ((40, 40, 40), '⚫'),
+]
+
+BACKGROUND = (255, 255, 255)
+GRID = (225, 225, 225)
+AXIS = (90, 90, 90)
+
+def _encode_png(width: int, height: int, pixels: bytearray) -> bytes:
+    """Encode an RGB pixel buffer as a PNG file"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row_size = width * 3
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)  # no filter
+        raw.extend(pixels[y * row_size:(y + 1) * row_size])
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(bytes(raw), 6))
+            + chunk(b'IEND', b''))
+
+class _Canvas:
+    """RGB pixel buffer with thick line drawing"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(BACKGROUND * (width * height))
+
+    def dot(self, x: int, y: int, colour: Tuple[int, int, int], radius: int = 1) -> None:
+        """Fill a square of side 2 * radius + 1 centred on (x, y)"""
+        for dy in range(-radius, radius + 1):
+            for dx in range(-radius, radius + 1):
+                px, py = x + dx, y + dy
+                if 0 <= px < self.width and 0 <= py < self.height:
+                    offset = (py * self.width + px) * 3
+                    self.pixels[offset:offset + 3] = bytes(colour)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, colour: Tuple[int, int, int], radius: int = 1) -> None:
+        """Bresenham line, thickened by drawing a square dot at each step"""
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        error = dx + dy
+        while True:
+            self.dot(x0, y0, colour, radius)
+            if x0 == x1 and y0 == y1:
+                return
+            doubled = 2 * error
+            if doubled >= dy:
+                error += dy
+                x0 += sx
+            if doubled <= dx:
+                error += dx
+                y0 += sy
+
+def render_price_chart(
+    series: Dict[str, Sequence[Tuple[float, float]]],
+    width: int = 800,
+    height: int = 400
+) -> bytes:
+    """
+    Render price series as a step chart
+
+    Each price is drawn as holding until the next recorded change, and the last
+    one is extended to the newest timestamp in the chart.
+
+    Args:
+        series: Store name mapped to (unix timestamp, price) points sorted by time
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        PNG image bytes
+    """
+    canvas = _Canvas(width, height)
+    margin = 30
+    points = [point for values in series.values() for point in values]
+    if not points:
+        return _encode_png(width, height, canvas.pixels)
+
+    min_time = min(t for t, _ in points)
+    max_time = max(t for t, _ in points)
+    max_price = max(p for _, p in points) * 1.1 or 1.0
+    time_span = (max_time - min_time) or 1.0
+
+    def to_pixel(timestamp: float, price: float) -> Tuple[int, int]:
+        x = margin + int((timestamp - min_time) / time_span * (width - 2 * margin))
+        y = height - margin - int(price / max_price * (height - 2 * margin))
+        return x, y
+
+    # Horizontal grid and axes
+    for step in range(1, 5):
+        y = height - margin - int(step / 4 * (height - 2 * margin))
+        canvas.line(margin, y, width - margin, y, GRID, radius=0)
+    canvas.line(margin, height - margin, width - margin, height - margin, AXIS, radius=0)
+    canvas.line(margin, margin, margin, height - margin, AXIS, radius=0)
+
+    for index, values in enumerate(series.values()):
+        colour = PALETTE[index % len(PALETTE)][0]
+        previous = None
+        for timestamp, price in values:
+            x, y = to_pixel(timestamp, price)
+            if previous:
+                canvas.line(previous[0], previous[1], x, previous[1], colour)
+                canvas.line(x, previous[1], x, y, colour)
+            canvas.dot(x, y, colour, radius=3)
+            previous = (x, y)
+        if previous:
+            end_x, _ = to_pixel(max_time, 0)
+            canvas.line(previous[0], previous[1], end_x, previous[1], colour)
+
+    return _encode_png(width, height, canvas.pixels)
+
+def legend(store_names: List[str]) -> List[str]:
+    """Caption lines pairing each store with its line colour"""
+    return [f"{PALETTE[index % len(PALETTE)][1]} {name}" for index, name in enumerate(store_names)]
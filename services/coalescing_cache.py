@@ -0,0 +1,113 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from services.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+class CoalescingCache:
+    """Short-lived result cache with in-flight request coalescing
+
+    Concurrent callers asking for the same key while a fetch is running share
+    that single fetch instead of each calling upstream. Successful results are
+    kept for ttl_seconds so callers arriving just afterwards are served from
+    memory. None results are not cached.
+
+    The result cache is shared between threads. In-flight fetches are shared per
+    event loop, since an asyncio task can only be awaited on its own loop. A
+    fetch runs to completion even if every caller waiting for it is
+    cancelled, and its result is cached for the next one.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 10000, name: str = 'default'):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached, unexpired result or None"""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._results[key]
+                return None
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a result for ttl_seconds"""
+        if value is None:
+            return
+        with self._lock:
+            if len(self._results) >= self.max_entries and key not in self._results:
+                self._evict_expired()
+                if len(self._results) >= self.max_entries:
+                    # Still full: drop the oldest insertion
+                    self._results.pop(next(iter(self._results)))
+            self._results[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Forget a cached result"""
+        with self._lock:
+            self._results.pop(key, None)
+
+    def _evict_expired(self) -> None:
+        """Remove expired entries; caller must hold the lock"""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._results.items() if expires_at < now]:
+            del self._results[key]
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], fresh: bool = False) -> Any:
+        """
+        Return the result for key, fetching it at most once for concurrent callers
+
+        Args:
+            key: Cache key
+            fetch: Coroutine function performing the upstream call
+            fresh: Skip the result cache (still joins an in-flight fetch and stores the result)
+
+        Returns:
+            The fetched or cached result
+        """
+        if not fresh:
+            cached = self.get(key)
+            if cached is not None:
+                CACHE_REQUESTS.inc(cache=self.name, result='hit')
+                return cached
+
+        loop = asyncio.get_running_loop()
+        inflight_key = (id(loop), key)
+
+        task = self._inflight.get(inflight_key)
+        if task is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result='coalesced')
+        else:
+            CACHE_REQUESTS.inc(cache=self.name, result='refresh' if fresh else 'miss')
+            task = loop.create_task(self._fetch(key, fetch))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda done: self._fetch_done(inflight_key, done))
+
+        # The fetch runs as its own task and every caller, including the one that
+        # started it, waits through a shield: a cancelled caller stops waiting
+        # without cancelling the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        result = await fetch()
+        self.put(key, result)
+        return result
+
+    def _fetch_done(self, inflight_key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        if self._inflight.get(inflight_key) is task:
+            del self._inflight[inflight_key]
+        # Mark the exception as retrieved in case every caller stopped waiting
+        if not task.cancelled():
+            task.exception()
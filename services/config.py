@@ -1,6 +1,155 @@
+import os
+
+# Database shared by the web app, the bot and sweep workers
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///gamebot.db")
+
+# Size of the thread pool used for database access from async code
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+# Seconds a fetched game details result is reused by handlers and the sweep
+GAME_DETAILS_CACHE_TTL = float(os.getenv("GAME_DETAILS_CACHE_TTL", "60"))
+
+# Pages of 60 deals kept in the /discounts snapshot and how often it is refreshed
+DEALS_SNAPSHOT_PAGES = int(os.getenv("DEALS_SNAPSHOT_PAGES", "20"))
+DEALS_SNAPSHOT_REFRESH_MINUTES = int(os.getenv("DEALS_SNAPSHOT_REFRESH_MINUTES", "15"))
+
+# Deals listed in one "new deals matching your filters" alert, and days after which an
+# announced deal no longer on offer is forgotten (and announced again if it returns)
+DEAL_ALERTS_MAX_DEALS = int(os.getenv("DEAL_ALERTS_MAX_DEALS", "5"))
+DEAL_ALERTS_FORGET_DAYS = int(os.getenv("DEAL_ALERTS_FORGET_DAYS", "30"))
+
+# Hours after which locally indexed search results are refreshed from the API
+CATALOGUE_STALE_HOURS = float(os.getenv("CATALOGUE_STALE_HOURS", "24"))
+
+# Number of precomputed similar games kept per game
+SIMILAR_GAMES_TOP_K = int(os.getenv("SIMILAR_GAMES_TOP_K", "10"))
+
+# Number of co-subscribed games precomputed per game
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "10"))
+
+# Stats views: games in each top list, minutes between full rebuilds of the counters
+# (which pick up writes from other processes) and hours a price record counts as the current discount
+STATS_TOP_SIZE = int(os.getenv("STATS_TOP_SIZE", "10"))
+STATS_REBUILD_MINUTES = int(os.getenv("STATS_REBUILD_MINUTES", "30"))
+STATS_DISCOUNT_MAX_AGE_HOURS = float(os.getenv("STATS_DISCOUNT_MAX_AGE_HOURS", "24"))
+
+# Processes rendering price history charts, number of rendered charts kept in memory
+# and number of Telegram file IDs of uploaded charts remembered
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "256"))
+CHART_FILE_ID_CACHE_SIZE = int(os.getenv("CHART_FILE_ID_CACHE_SIZE", "4096"))
+
+# Number of sweep reports kept, and how many of the slowest games each one lists
+SWEEP_REPORTS_KEPT = int(os.getenv("SWEEP_REPORTS_KEPT", "200"))
+SWEEP_REPORT_SLOWEST_GAMES = int(os.getenv("SWEEP_REPORT_SLOWEST_GAMES", "10"))
+
+# Sampling profiler: directory for saved profiles and the interval between stack samples
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# Memory instrumentation: tracemalloc frames per allocation at startup (0 leaves it off),
+# snapshots kept for diffing and seconds between RSS samples during a sweep
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "0"))
+MEMORY_SNAPSHOTS_KEPT = int(os.getenv("MEMORY_SNAPSHOTS_KEPT", "3"))
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "0.5"))
+
+# Sharded sweeps: seconds between worker heartbeats, after which a silent worker
+# counts as gone, and between checks for new shards; the longest a sweep waits for workers
+WORKER_HEARTBEAT_SECONDS = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "5"))
+WORKER_TIMEOUT_SECONDS = float(os.getenv("WORKER_TIMEOUT_SECONDS", "20"))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+SWEEP_SHARD_TIMEOUT_SECONDS = float(os.getenv("SWEEP_SHARD_TIMEOUT_SECONDS", "1800"))
+
+# Leader election between replicas: seconds a lease lasts without renewal (the longest
+# failover takes after a leader dies), seconds between renewals and seconds before the
+# lease runs out at which a leader that could not renew stops acting as one (covers clock skew)
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "30"))
+LEADER_RENEW_SECONDS = float(os.getenv("LEADER_RENEW_SECONDS", "10"))
+LEADER_MARGIN_SECONDS = float(os.getenv("LEADER_MARGIN_SECONDS", "3"))
+
+# Token required by admin endpoints; they are disabled when it is not set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# CheapShark request pacing: the rate adapts between the min and max (requests per second)
+UPSTREAM_MAX_RATE = float(os.getenv("UPSTREAM_MAX_RATE", "5"))
+UPSTREAM_MIN_RATE = float(os.getenv("UPSTREAM_MIN_RATE", "0.5"))
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", "10"))
+UPSTREAM_RATE_STEP = float(os.getenv("UPSTREAM_RATE_STEP", "0.05"))
+# Tokens the sweep and other background traffic leave in the bucket for interactive requests,
+# and seconds after which a waiting background request is served like an interactive one
+UPSTREAM_INTERACTIVE_RESERVE = float(os.getenv("UPSTREAM_INTERACTIVE_RESERVE", "2"))
+UPSTREAM_STARVATION_SECONDS = float(os.getenv("UPSTREAM_STARVATION_SECONDS", "10"))
+# Longest a request waits for its turn before failing instead
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "30"))
+# Consecutive failures that open the circuit breaker and seconds between recovery probes
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))
+# Seconds a single game search or details request may take
+UPSTREAM_SEARCH_TIMEOUT = float(os.getenv("UPSTREAM_SEARCH_TIMEOUT", "5"))
+UPSTREAM_DETAILS_TIMEOUT = float(os.getenv("UPSTREAM_DETAILS_TIMEOUT", "5"))
+# Attempts per lookup on timeouts, network errors and 5xx/429 responses, with
+# exponential backoff (full jitter) between them
+UPSTREAM_RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3"))
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.2"))
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2"))
+# Hedged lookups: a second request is sent when the first is slower than the p95 latency.
+# Hedges may add at most this share of extra requests (0 turns hedging off), and only
+# start once the endpoint has this many latency samples
+UPSTREAM_HEDGE_BUDGET = float(os.getenv("UPSTREAM_HEDGE_BUDGET", "0.05"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+
+def _parse_budgets(value: str) -> dict:
+    """Parse "endpoint=requests per minute" pairs separated by commas"""
+    budgets = {}
+    for item in value.split(','):
+        endpoint, _, per_minute = item.partition('=')
+        if endpoint.strip() and per_minute.strip():
+            budgets[endpoint.strip()] = float(per_minute)
+    return budgets
+
+# Requests per minute allowed per CheapShark endpoint (names as in the upstream_request_seconds metric)
+UPSTREAM_ENDPOINT_BUDGETS = _parse_budgets(os.getenv(
+    "UPSTREAM_ENDPOINT_BUDGETS", "deals=120,games:title=120,games:id=240,games:ids=60"))
+
+def _parse_levels(value: str) -> dict:
+    """Parse "logger=LEVEL" pairs separated by commas"""
+    levels = {}
+    for item in value.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+# Root log level, per-logger levels (the HTTP clients log every request at INFO)
+# and records buffered for the background log writer before new ones are dropped
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = _parse_levels(os.getenv("LOG_LEVELS", "httpx=WARNING,httpcore=WARNING"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Telegram Bot API endpoints (overridable to point the bot at a local stand-in)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+TELEGRAM_API_FILE_URL = os.getenv("TELEGRAM_API_FILE_URL", "https://api.telegram.org/file/bot")
+
+# Email notifications: SMTP server and account (the sender address doubles as the login by default)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+NOTIFICATION_EMAIL = os.getenv("NOTIFICATION_EMAIL")
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", NOTIFICATION_EMAIL)
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+
+# SMTP connections kept open (and threads sending through them), messages sent over one
+# connection before it is replaced, seconds an idle connection is kept, socket timeout,
+# messages per minute allowed by the server (0 for no limit) and attempts per message
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", "100"))
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_RATE_PER_MINUTE = float(os.getenv("SMTP_RATE_PER_MINUTE", "600"))
+SMTP_SEND_ATTEMPTS = int(os.getenv("SMTP_SEND_ATTEMPTS", "3"))
 
 # CheapShark API URL and Store IDs
-CHEAPSHARK_API_URL = "https://www.cheapshark.com/api/1.0"
+CHEAPSHARK_API_URL = os.getenv("CHEAPSHARK_API_URL", "https://www.cheapshark.com/api/1.0")
 SUPPORTED_STORES = {
     "1": "Steam",
     "2": "GamersGate",
@@ -0,0 +1,133 @@
+import math
+import logging
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from services.deals_snapshot import DealsSnapshot
+from services.metrics import NOTIFICATIONS
+from services.logging_setup import LogSummary
+from services.config import DEAL_ALERTS_MAX_DEALS
+
+logger = logging.getLogger(__name__)
+
+class FilterIndex:
+    """Users' deal filters indexed for reverse matching
+
+    A deal (price, discount) matches a user's filters (max_price,
+    min_discount) when price <= max_price and discount >= min_discount, a 2-D
+    dominance query. Deal discounts are whole percents, so filters are kept
+    in one bucket per minimum discount (0-100), each sorted by maximum price:
+    the users matching a deal are the tails, past the deal's price, of the
+    buckets up to its discount. A lookup costs at most 101 binary searches
+    plus the number of matches, however many users have alerts on.
+    """
+
+    def __init__(self):
+        self._buckets: List[List[Tuple[float, int]]] = [[] for _ in range(101)]
+        self._filters: Dict[int, Tuple[float, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._filters)
+
+    @staticmethod
+    def _key(max_price: Optional[float], min_discount: Optional[float]) -> Tuple[float, int]:
+        price = math.inf if max_price is None else float(max_price)
+        discount = 0 if min_discount is None else min(100, max(0, math.ceil(min_discount)))
+        return price, discount
+
+    def build(self, filters: Iterable[Tuple[int, Optional[float], Optional[float]]]) -> None:
+        """Replace all filters with (user_id, max_price, min_discount) tuples, sorting each bucket once"""
+        keys = {user_id: self._key(max_price, min_discount) for user_id, max_price, min_discount in filters}
+        buckets: List[List[Tuple[float, int]]] = [[] for _ in range(101)]
+        for user_id, (price, discount) in keys.items():
+            buckets[discount].append((price, user_id))
+        for bucket in buckets:
+            bucket.sort()
+        self._buckets = buckets
+        self._filters = keys
+
+    def set(self, user_id: int, max_price: Optional[float], min_discount: Optional[float]) -> None:
+        """Add a user's filters or replace the previous ones (None means no limit)"""
+        self.remove(user_id)
+        price, discount = self._key(max_price, min_discount)
+        self._filters[user_id] = (price, discount)
+        insort(self._buckets[discount], (price, user_id))
+
+    def remove(self, user_id: int) -> None:
+        key = self._filters.pop(user_id, None)
+        if key is not None:
+            price, discount = key
+            bucket = self._buckets[discount]
+            del bucket[bisect_left(bucket, (price, user_id))]
+
+    def match(self, price: float, discount: int) -> List[int]:
+        """IDs of the users whose filters the deal satisfies"""
+        users = []
+        for bucket in self._buckets[:max(0, min(100, int(discount))) + 1]:
+            if bucket:
+                start = bisect_left(bucket, (price, -math.inf))
+                users.extend(user_id for _, user_id in bucket[start:])
+        return users
+
+    def match_deals(self, deals: Iterable[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+        """Group deals by the users they match, each user's deals in input order"""
+        matches: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for deal in deals:
+            for user_id in self.match(deal['price'], deal['discount_percent']):
+                matches[user_id].append(deal)
+        return matches
+
+def build_filter_index(filters: Iterable[Tuple[int, Optional[float], Optional[float]]]) -> FilterIndex:
+    """Index (user_id, max_price, min_discount) filters"""
+    index = FilterIndex()
+    index.build(filters)
+    return index
+
+def new_deals(snapshot: DealsSnapshot, announced: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Deals never announced, or cheaper now than when they were
+
+    Args:
+        snapshot: Current deals
+        announced: deal_id -> price the deal was announced at
+    """
+    return [deal for deal in snapshot.deals
+            if deal['deal_id'] not in announced or deal['price'] < announced[deal['deal_id']]]
+
+def _alert_message(deals: List[Dict[str, Any]]) -> str:
+    message = "🔔 Новые скидки по вашим фильтрам!\n\n"
+    for deal in deals[:DEAL_ALERTS_MAX_DEALS]:
+        message += (f"〔 {deal['name']} 〕\n"
+                    f"💰 {deal['price_current']} (было {deal['price_original']}, -{deal['discount_percent']}%) "
+                    f"в {deal['store']}\n\n")
+    if len(deals) > DEAL_ALERTS_MAX_DEALS:
+        message += f"И еще {len(deals) - DEAL_ALERTS_MAX_DEALS}. "
+    message += "Все подходящие скидки: /discounts\nОтключить уведомления: /filter alerts off"
+    return message
+
+async def send_deal_alerts(bot, deals: List[Dict[str, Any]], index: FilterIndex) -> int:
+    """
+    Tell every user with deal alerts on about the new deals matching their filters
+
+    Each user gets one message listing up to DEAL_ALERTS_MAX_DEALS deals, best first.
+
+    Args:
+        bot: Telegram bot to send with
+        deals: New deals
+        index: Filters of the users with deal alerts on
+
+    Returns:
+        Number of messages sent
+    """
+    matches = index.match_deals(deals)
+    summary = LogSummary(logger, f"Deal alerts for {len(deals)} new deals")
+    for user_id, user_deals in matches.items():
+        try:
+            await bot.send_message(chat_id=user_id, text=_alert_message(user_deals))
+            NOTIFICATIONS.inc(channel='telegram', outcome='sent')
+            summary.add('sent')
+        except Exception as e:
+            NOTIFICATIONS.inc(channel='telegram', outcome='failed')
+            summary.add('failed', f"Failed to send deal alert to user {user_id}: {e}", logging.ERROR)
+    summary.log()
+    return summary.counts['sent']
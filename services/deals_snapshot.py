@@ -0,0 +1,83 @@
+import time
+import logging
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DealsSnapshot:
+    """Immutable set of current deals indexed by price and discount
+
+    Deals are kept in display order (highest discount first, then cheapest),
+    with a second index sorted by price. A query walks whichever index gives
+    the smaller candidate range, so filtered lookups never scan deals that fail
+    the more selective filter.
+    """
+
+    def __init__(self, deals: List[Dict[str, Any]], fetched_at: Optional[float] = None):
+        """
+        Args:
+            deals: Formatted deals, each with numeric 'price' and 'discount_percent'
+            fetched_at: Unix time the deals were fetched (defaults to now)
+        """
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.deals = sorted(deals, key=lambda d: (-d['discount_percent'], d['price']))
+
+        # Discount index: the display order is sorted by discount descending,
+        # so negated discounts are ascending and can be bisected
+        self._neg_discounts = [-d['discount_percent'] for d in self.deals]
+
+        # Price index: positions into self.deals sorted by price
+        self._by_price = sorted(range(len(self.deals)), key=lambda i: self.deals[i]['price'])
+        self._prices = [self.deals[i]['price'] for i in self._by_price]
+
+    def __len__(self) -> int:
+        return len(self.deals)
+
+    def query(
+        self,
+        max_price: Optional[float] = None,
+        min_discount: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 10
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Find deals matching the filters, in display order
+
+        Args:
+            max_price: Maximum sale price (inclusive)
+            min_discount: Minimum discount percentage (inclusive)
+            offset: Number of matching deals to skip
+            limit: Maximum number of deals to return
+
+        Returns:
+            Tuple of (deals on the requested page, total number of matching deals)
+        """
+        # Deals satisfying each filter on its own form a prefix of its index
+        discount_end = len(self.deals) if min_discount is None else bisect_right(self._neg_discounts, -min_discount)
+        price_end = len(self.deals) if max_price is None else bisect_right(self._prices, max_price)
+
+        if discount_end <= price_end:
+            # Walk the discount prefix, already in display order
+            matches = [i for i in range(discount_end)
+                       if max_price is None or self.deals[i]['price'] <= max_price]
+        else:
+            # Walk the price prefix, then restore display order
+            matches = sorted(i for i in self._by_price[:price_end]
+                             if min_discount is None or self.deals[i]['discount_percent'] >= min_discount)
+
+        page = [self.deals[i] for i in matches[offset:offset + limit]]
+        return page, len(matches)
+
+# Latest snapshot, replaced atomically by the refresh job
+_current_snapshot: Optional[DealsSnapshot] = None
+
+def get_deals_snapshot() -> Optional[DealsSnapshot]:
+    """Return the latest deals snapshot, or None if none has been loaded yet"""
+    return _current_snapshot
+
+def set_deals_snapshot(snapshot: DealsSnapshot) -> None:
+    """Publish a new deals snapshot"""
+    global _current_snapshot
+    _current_snapshot = snapshot
+    logger.info(f"Deals snapshot updated with {len(snapshot)} deals")
@@ -0,0 +1,52 @@
+import hashlib
+from bisect import bisect
+from typing import Dict, Iterable, List
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Consistent hash ring mapping keys (game IDs) to nodes (worker IDs)
+
+    Every node is placed on the ring at `replicas` points; a key belongs to the
+    first node point strictly after its hash, wrapping around past the last
+    point to the first. When a node joins or leaves, only
+    the keys between its points and their neighbours move (about 1/N of them),
+    so the other nodes keep the games they had.
+
+    Args:
+        nodes: Node names
+        replicas: Points per node; more points spread keys more evenly
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 64):
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node_for(self, key: str) -> str:
+        """
+        Node owning a key
+
+        Raises:
+            ValueError: The ring has no nodes
+        """
+        if not self._hashes:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+    def assign(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        """Split keys by owning node (every node gets an entry, possibly empty)"""
+        shards: Dict[str, List[str]] = {node: [] for node in self.nodes}
+        for key in keys:
+            shards[self.node_for(key)].append(key)
+        return shards
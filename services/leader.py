@@ -0,0 +1,191 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from models import db, Lease
+from services.metrics import LEADER
+from services.config import LEADER_LEASE_SECONDS, LEADER_RENEW_SECONDS, LEADER_MARGIN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class LeaderElector:
+    """Lease-based leader election through the shared database
+
+    Every replica runs an elector for the same lease name. The holder renews
+    the lease every `renew_seconds`; anyone may take it over once it has gone
+    `lease_seconds` without renewal. Taking and renewing are single
+    conditional UPDATEs, so two replicas can never both succeed.
+
+    `is_leader` is judged by the local monotonic clock: it turns False
+    `margin_seconds` before the last successful renewal can have expired,
+    whether or not the renewal thread got to run, so there is at most one
+    leader at any time (assuming clocks differ by less than the margin). The
+    lease term, incremented on every takeover, serves as a fencing token: a
+    long job reads `term` when it starts and checks `holds(term)` before
+    each step with side effects, stopping if leadership was lost, even
+    briefly, in between. A leader that dies is replaced within
+    lease_seconds + renew_seconds.
+
+    Args:
+        flask_app: Flask application instance for database access
+        name: Lease name; electors with the same name compete
+        holder: This process's name (generated if None)
+        lease_seconds: Lease duration
+        renew_seconds: Interval between renewals and takeover attempts
+        margin_seconds: How long before the lease can expire the leader stops counting as one
+        on_change: Called with True when this process becomes leader and False when it stops being one
+    """
+
+    def __init__(
+        self,
+        flask_app,
+        name: str,
+        holder: Optional[str] = None,
+        lease_seconds: float = LEADER_LEASE_SECONDS,
+        renew_seconds: float = LEADER_RENEW_SECONDS,
+        margin_seconds: float = LEADER_MARGIN_SECONDS,
+        on_change: Optional[Callable[[bool], None]] = None
+    ):
+        self.flask_app = flask_app
+        self.name = name
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.renew_seconds = min(renew_seconds, lease_seconds / 2)
+        # Leave room for a renewal before the deadline
+        self.margin_seconds = min(margin_seconds, self.lease_seconds - self.renew_seconds)
+        self.on_change = on_change
+        self._leading = False
+        self._term: Optional[int] = None
+        self._renewed_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process holds the lease and it cannot have expired yet"""
+        return self._leading and time.monotonic() < self._renewed_at + self.lease_seconds - self.margin_seconds
+
+    @property
+    def term(self) -> Optional[int]:
+        """Term of the lease while this process is the leader, None otherwise"""
+        return self._term if self.is_leader else None
+
+    def holds(self, term: Optional[int]) -> bool:
+        """Whether this process is still the leader in `term`, without having lost the lease since"""
+        return term is not None and self.term == term
+
+    def _try_acquire(self) -> Optional[int]:
+        """
+        Renew the lease, or take it if it is free or expired (needs an app context)
+
+        Returns:
+            The lease term if this process holds the lease, None otherwise
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        renewed = (Lease.query
+                   .filter(Lease.name == self.name, Lease.holder == self.holder)
+                   .update({'expires_at': expires_at}, synchronize_session=False))
+        if not renewed:
+            taken = (Lease.query
+                     .filter(Lease.name == self.name, Lease.expires_at < now)
+                     .update({
+                         'holder': self.holder,
+                         'term': Lease.term + 1,
+                         'acquired_at': now,
+                         'expires_at': expires_at
+                     }, synchronize_session=False))
+            if not taken:
+                if db.session.get(Lease, self.name) is not None:
+                    # Held by someone else
+                    db.session.commit()
+                    return None
+                db.session.add(Lease(name=self.name, holder=self.holder, acquired_at=now, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another replica created the lease first
+            db.session.rollback()
+            return None
+        term = (db.session.query(Lease.term)
+                .filter(Lease.name == self.name, Lease.holder == self.holder)
+                .scalar())
+        db.session.commit()
+        return term
+
+    def _set_leader(self, is_leader: bool) -> None:
+        if is_leader == self._leading:
+            return
+        self._leading = is_leader
+        if not is_leader:
+            self._term = None
+        LEADER.set(1 if is_leader else 0, lease=self.name)
+        logger.info(f"{self.holder} {'became' if is_leader else 'is no longer'} leader for '{self.name}'")
+        if self.on_change:
+            try:
+                self.on_change(is_leader)
+            except Exception as e:
+                logger.error(f"Error handling leadership change for '{self.name}': {e}")
+
+    def check(self) -> bool:
+        """
+        Renew or try to take the lease once
+
+        Returns:
+            Whether this process is the leader now
+        """
+        # The lease is set to expire lease_seconds after the UPDATE, so count from before it
+        started = time.monotonic()
+        try:
+            with self.flask_app.app_context():
+                term = self._try_acquire()
+            if term is not None:
+                if self._leading and term != self._term:
+                    # Lost and retaken between two checks: jobs of the old term must stop
+                    self._set_leader(False)
+                self._renewed_at = started
+                self._term = term
+            self._set_leader(term is not None)
+        except SQLAlchemyError as e:
+            with self.flask_app.app_context():
+                db.session.rollback()
+            logger.error(f"Database error renewing lease '{self.name}': {e}")
+            # Keep leading only while the lease surely has not expired
+            self._set_leader(self.is_leader)
+        return self.is_leader
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.renew_seconds):
+            self.check()
+
+    def start(self) -> bool:
+        """
+        Try to take the lease right away, then keep renewing or retrying in a background thread
+
+        Returns:
+            Whether this process is the leader after the first attempt
+        """
+        leader = self.check()
+        self._thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+        return leader
+
+    def stop(self) -> None:
+        """Stop competing and give up the lease, so another replica takes over without waiting for it to expire"""
+        self._stop.set()
+        if not self._leading:
+            return
+        try:
+            with self.flask_app.app_context():
+                (Lease.query
+                 .filter(Lease.name == self.name, Lease.holder == self.holder)
+                 .update({'expires_at': datetime.utcnow()}, synchronize_session=False))
+                db.session.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Database error releasing lease '{self.name}': {e}")
+        self._set_leader(False)
@@ -0,0 +1,150 @@
+import sys
+import queue
+import atexit
+import logging
+import threading
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Union
+from services.config import LOG_LEVEL, LOG_LEVELS, LOG_QUEUE_SIZE
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional['_NonBlockingQueueHandler'] = None
+_lock = threading.Lock()
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that hands records over as they are
+
+    The stock QueueHandler formats every record on the logging thread so it
+    can be pickled; here the queue stays in-process, so formatting (message,
+    timestamp, traceback) is left to the listener thread. When the queue is
+    full, records are dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """
+    Set up the process-wide logging pipeline; the single configuration point
+
+    Loggers hand records to a bounded queue, and a background thread formats
+    them and writes them to stderr, so logging costs the sweep and the bot
+    handlers little more than a queue put. Calling it again only changes the
+    root level.
+
+    Args:
+        level: Root level name (LOG_LEVEL by default)
+    """
+    global _listener, _queue_handler
+
+    with _lock:
+        root = logging.getLogger()
+        root.setLevel((level or LOG_LEVEL).upper())
+        if _listener is not None:
+            return
+
+        for name, logger_level in LOG_LEVELS.items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = _NonBlockingQueueHandler(log_queue)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def set_level(level: Union[str, int], logger_name: Optional[str] = None) -> str:
+    """
+    Change a logger's level at runtime
+
+    Args:
+        level: Level name or number
+        logger_name: Logger to change; the root logger if None
+
+    Returns:
+        The new level name
+
+    Raises:
+        ValueError: Unknown level name
+    """
+    if isinstance(level, str):
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(level)
+    logging.getLogger(__name__).info(
+        f"Log level of {logger_name or 'root'} set to {logging.getLevelName(logger.level)}")
+    return logging.getLevelName(logger.level)
+
+def get_levels() -> Dict[str, object]:
+    """Root level, explicitly set logger levels and the number of dropped records"""
+    levels = {
+        name: logging.getLevelName(logger.level)
+        for name, logger in sorted(logging.root.manager.loggerDict.items())
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET
+    }
+    return {
+        'root': logging.getLevelName(logging.getLogger().level),
+        'loggers': levels,
+        'dropped': _queue_handler.dropped if _queue_handler else 0
+    }
+
+class LogSummary:
+    """Aggregates per-item log messages of a batch into one summary line
+
+    For loops over many users or games: outcomes are counted, only the first
+    `sample` messages of each outcome are logged individually, and log()
+    writes the counts once at the end.
+
+    Args:
+        logger: Logger to write to
+        label: Batch description starting the summary line
+        sample: Messages logged individually per outcome
+    """
+
+    def __init__(self, logger: logging.Logger, label: str, sample: int = 3):
+        self.logger = logger
+        self.label = label
+        self.sample = sample
+        self.counts: Counter = Counter()
+
+    def add(self, outcome: str, message: Optional[str] = None, level: int = logging.DEBUG) -> None:
+        """Count an item; log its message if fewer than `sample` were logged for this outcome"""
+        self.counts[outcome] += 1
+        if message is not None and self.counts[outcome] <= self.sample:
+            suppressed = " (further ones only counted)" if self.counts[outcome] == self.sample else ""
+            self.logger.log(level, message + suppressed)
+
+    def log(self, level: int = logging.INFO) -> None:
+        """Write the summary line (nothing if no items were counted)"""
+        if self.counts:
+            counts = ', '.join(f"{count} {outcome}" for outcome, count in self.counts.most_common())
+            self.logger.log(level, f"{self.label}: {counts}")
@@ -0,0 +1,239 @@
+import gc
+import sys
+import logging
+import threading
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from services.config import MEMORY_SNAPSHOTS_KEPT, MEMORY_SAMPLE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc snapshots taken at the end of sweeps or on request, oldest first
+_snapshots: "deque[Tuple[str, tracemalloc.Snapshot]]" = deque(maxlen=MEMORY_SNAPSHOTS_KEPT)
+# Memory figures of recent sweeps, oldest first
+_sweep_history: "deque[Dict[str, Any]]" = deque(maxlen=50)
+_lock = threading.Lock()
+
+# Snapshot noise from the profiling machinery itself
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def rss_bytes() -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get the resident set size of the process
+
+    Returns:
+        (current RSS, peak RSS over the process lifetime) in bytes; None where unavailable
+    """
+    try:
+        values = {}
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    name, amount, _ = line.split()
+                    values[name] = int(amount) * 1024
+        return values.get('VmRSS:'), values.get('VmHWM:')
+    except OSError:
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return None, peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None, None
+
+def object_counts(limit: int = 30) -> List[Tuple[str, int]]:
+    """
+    Count live objects tracked by the garbage collector by type
+
+    Walks every tracked object, so it takes a moment on a large heap; meant
+    for the admin endpoint, not for hot paths.
+
+    Args:
+        limit: Number of types to return
+
+    Returns:
+        (type name, count) pairs, most common first
+    """
+    counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+    return counts.most_common(limit)
+
+def start_tracing(frames: int = 1) -> None:
+    """Start tracemalloc, keeping the given number of frames per allocation"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info(f"tracemalloc started with {frames} frame(s) per allocation")
+
+def stop_tracing() -> None:
+    """Stop tracemalloc and drop the stored snapshots"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("tracemalloc stopped")
+    with _lock:
+        _snapshots.clear()
+
+def take_snapshot(label: str) -> bool:
+    """
+    Store a tracemalloc snapshot for later diffs
+
+    Args:
+        label: Name shown for the snapshot, e.g. the sweep it was taken after
+
+    Returns:
+        False if tracemalloc is not tracing
+    """
+    if not tracemalloc.is_tracing():
+        return False
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    with _lock:
+        _snapshots.append((label, snapshot))
+    return True
+
+def snapshot_diff(limit: int = 25, key_type: str = 'lineno') -> Optional[Dict[str, Any]]:
+    """
+    Compare the two most recent snapshots
+
+    Args:
+        limit: Number of allocation sites to return
+        key_type: Grouping passed to Snapshot.compare_to ('lineno', 'filename' or 'traceback')
+
+    Returns:
+        The snapshot labels and the allocation sites that grew the most, or None
+        with fewer than two snapshots
+    """
+    with _lock:
+        if len(_snapshots) < 2:
+            return None
+        (old_label, old), (new_label, new) = _snapshots[-2], _snapshots[-1]
+
+    stats = new.compare_to(old, key_type)
+    return {
+        'from': old_label,
+        'to': new_label,
+        'size_diff_total': sum(stat.size_diff for stat in stats),
+        'top': [
+            {
+                'site': str(stat.traceback),
+                'size': stat.size,
+                'size_diff': stat.size_diff,
+                'count': stat.count,
+                'count_diff': stat.count_diff
+            }
+            for stat in stats[:limit]
+        ]
+    }
+
+class SweepMemoryTracker:
+    """Tracks the memory high-water mark of one sweep
+
+    A background thread samples RSS while the sweep runs, since the kernel's
+    own peak (VmHWM) covers the whole process lifetime. When tracemalloc is
+    tracing, its peak is reset at the start so it reflects this sweep only,
+    and a snapshot is stored at the end for diffing against the previous sweep.
+    """
+
+    def __init__(self, label: str, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.label = label
+        self.interval = interval
+        self.rss_start: Optional[int] = None
+        self.rss_peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        rss, _ = rss_bytes()
+        if rss is not None and (self.rss_peak is None or rss > self.rss_peak):
+            self.rss_peak = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        """Record the starting figures and begin sampling"""
+        self.rss_start, _ = rss_bytes()
+        self._sample()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._thread = threading.Thread(target=self._run, name='sweep-memory', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        """
+        Stop sampling, log the sweep's memory figures and remember them
+
+        Returns:
+            The recorded figures
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        rss_end, _ = rss_bytes()
+        if rss_end is not None and (self.rss_peak is None or rss_end > self.rss_peak):
+            self.rss_peak = rss_end
+
+        record = {
+            'sweep': self.label,
+            'finished_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'rss_start': self.rss_start,
+            'rss_end': rss_end,
+            'rss_peak': self.rss_peak,
+            'traced_peak': tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        }
+        with _lock:
+            _sweep_history.append(record)
+        take_snapshot(f"after sweep {self.label}")
+
+        logger.info(
+            f"Sweep {self.label} memory: RSS {_mib(self.rss_start)} -> {_mib(rss_end)}, "
+            f"high-water {_mib(self.rss_peak)}"
+            + (f", traced peak {_mib(record['traced_peak'])}" if record['traced_peak'] is not None else "")
+        )
+        return record
+
+def _mib(value: Optional[int]) -> str:
+    return f"{value / 1048576:.1f} MiB" if value is not None else "n/a"
+
+def memory_report(limit: int = 30) -> Dict[str, Any]:
+    """
+    Collect the figures shown by the admin memory endpoint
+
+    Args:
+        limit: Number of object types and allocation sites to include
+
+    Returns:
+        RSS, garbage collector state, object counts by type, recent sweeps and,
+        when tracing, tracemalloc totals and the latest snapshot diff
+    """
+    rss, rss_peak = rss_bytes()
+    with _lock:
+        sweeps = list(_sweep_history)
+        snapshots = [label for label, _ in _snapshots]
+
+    report = {
+        'rss': rss,
+        'rss_peak': rss_peak,
+        'gc': {
+            'counts': gc.get_count(),
+            'garbage': len(gc.garbage)
+        },
+        'objects': object_counts(limit),
+        'sweeps': sweeps,
+        'tracemalloc': {'tracing': tracemalloc.is_tracing()}
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report['tracemalloc'].update({
+            'traced': current,
+            'traced_peak': peak,
+            'snapshots': snapshots,
+            'diff': snapshot_diff(limit)
+        })
+    return report
@@ -0,0 +1,233 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+from urllib.parse import urlsplit, parse_qsl
+import aiohttp
+
+# Latency buckets in seconds, from fast cache hits to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    """Render a Prometheus label set"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add amount to the count for the given labels"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Gauge(Counter):
+    """Value that can go up and down, optionally split by labels"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        """Replace the value for the given labels"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram:
+    """Distribution of observed values in fixed buckets, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one value for the given labels"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry exposed on /metrics
+registry = MetricsRegistry()
+
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    'upstream_request_seconds', 'CheapShark API request latency', ('endpoint', 'status'))
+SWEEP_PHASE_SECONDS = registry.histogram(
+    'sweep_phase_seconds', 'Time spent in each phase of the price sweep', ('phase',))
+SWEEP_RUNS = registry.counter(
+    'sweep_runs_total', 'Completed price sweeps by outcome', ('outcome',))
+BOT_HANDLER_SECONDS = registry.histogram(
+    'bot_handler_seconds', 'Bot handler execution time', ('handler',))
+BOT_HANDLER_ERRORS = registry.counter(
+    'bot_handler_errors_total', 'Bot handlers that raised', ('handler',))
+BOT_UPDATE_SECONDS = registry.histogram(
+    'bot_update_seconds', 'Time from dequeuing an update to finishing it, including per-chat waits')
+DB_CALL_SECONDS = registry.histogram(
+    'db_call_seconds', 'Data manager call time from async code, including pool wait', ('function',))
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+UPSTREAM_WAIT_SECONDS = registry.histogram(
+    'upstream_wait_seconds', 'Time a CheapShark request waited for the rate limiter', ('priority', 'endpoint'))
+UPSTREAM_QUEUE_DEPTH = registry.gauge(
+    'upstream_queue_depth', 'CheapShark requests waiting for the rate limiter', ('priority',))
+UPSTREAM_REJECTED = registry.counter(
+    'upstream_rejected_total', 'CheapShark requests not sent by the governor', ('endpoint', 'reason'))
+UPSTREAM_RETRIES = registry.counter(
+    'upstream_retries_total', 'CheapShark lookups retried after a failed attempt', ('endpoint', 'reason'))
+UPSTREAM_HEDGES = registry.counter(
+    'upstream_hedges_total', 'Hedged CheapShark lookups by outcome', ('endpoint', 'outcome'))
+NOTIFICATIONS = registry.counter(
+    'notifications_total', 'Notification deliveries by channel and outcome', ('channel', 'outcome'))
+LEADER = registry.gauge(
+    'leader', '1 while this process holds the named lease (runs the scheduled jobs)', ('lease',))
+
+def upstream_endpoint(url: str) -> str:
+    """Name an API call by path and lookup kind, e.g. 'games:title' or 'deals'"""
+    parts = urlsplit(url)
+    path = parts.path.rstrip('/').rsplit('/', 1)[-1] or '/'
+    keys = [key for key, _ in parse_qsl(parts.query)]
+    for key in ('id', 'ids', 'title'):
+        if key in keys:
+            return f"{path}:{key}"
+    return path
+
+async def _on_request_start(session, context, params) -> None:
+    context.started = time.perf_counter()
+
+async def _on_request_end(session, context, params) -> None:
+    UPSTREAM_REQUEST_SECONDS.observe(
+        time.perf_counter() - context.started,
+        endpoint=upstream_endpoint(str(params.url)),
+        status=str(params.response.status)
+    )
+
+async def _on_request_exception(session, context, params) -> None:
+    UPSTREAM_REQUEST_SECONDS.observe(
+        time.perf_counter() - context.started,
+        endpoint=upstream_endpoint(str(params.url)),
+        status=type(params.exception).__name__
+    )
+
+def upstream_trace_config() -> aiohttp.TraceConfig:
+    """aiohttp trace hooks recording every API request in UPSTREAM_REQUEST_SECONDS"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_request_end.append(_on_request_end)
+    trace_config.on_request_exception.append(_on_request_exception)
+    return trace_config
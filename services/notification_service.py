@@ -1,37 +1,329 @@
-
+import time
+import queue
+import atexit
+import random
+import socket
+import asyncio
 import smtplib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import logging
+from typing import Iterable, List, Optional, Tuple
+from services.upstream import TokenBucket
+from services.metrics import NOTIFICATIONS
+from services.logging_setup import LogSummary
+from services.config import (
+    SMTP_HOST, SMTP_PORT, SMTP_STARTTLS, SMTP_USERNAME, EMAIL_PASSWORD, NOTIFICATION_EMAIL, SMTP_POOL_SIZE,
+    SMTP_MESSAGES_PER_CONNECTION, SMTP_IDLE_SECONDS, SMTP_TIMEOUT, SMTP_RATE_PER_MINUTE, SMTP_SEND_ATTEMPTS
+)
 
 logger = logging.getLogger(__name__)
 
+# Failures after which the connection cannot be trusted any more; the message is retried on a new one.
+# Not OSError as a whole: every SMTPException is one, including the server rejecting a message.
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)
+
+class _Connection:
+    """An authenticated SMTP session and its usage counters"""
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.idle_since = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+class SMTPConnectionPool:
+    """Authenticated connections to one SMTP server, reused across messages
+
+    Connecting, STARTTLS and logging in cost several round trips, so a
+    connection is returned to the pool after each message and handed to the
+    next sender. At most `size` connections are open at once. A connection
+    is replaced after `max_messages` messages (servers limit messages per
+    session) or when it sat idle longer than `idle_seconds` (servers drop
+    idle sessions), and is discarded whenever a send through it fails.
+
+    Args:
+        host: SMTP server
+        port: SMTP port
+        username: Login (no login if None)
+        password: Password
+        starttls: Upgrade the connection with STARTTLS before logging in
+        size: Maximum open connections
+        max_messages: Messages per connection before it is replaced
+        idle_seconds: Idle time after which a pooled connection is replaced
+        timeout: Socket timeout
+    """
+
+    def __init__(
+        self,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        username: Optional[str] = SMTP_USERNAME,
+        password: Optional[str] = EMAIL_PASSWORD,
+        starttls: bool = SMTP_STARTTLS,
+        size: int = SMTP_POOL_SIZE,
+        max_messages: int = SMTP_MESSAGES_PER_CONNECTION,
+        idle_seconds: float = SMTP_IDLE_SECONDS,
+        timeout: float = SMTP_TIMEOUT
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _Connection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+        except Exception:
+            smtp.close()
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return _Connection(smtp)
+
+    def acquire(self) -> _Connection:
+        """Take an idle connection or open a new one, waiting while `size` connections are in use"""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - connection.idle_since <= self.idle_seconds:
+                    return connection
+                connection.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection: _Connection, broken: bool = False) -> None:
+        """Return a connection to the pool; broken or worn-out connections are closed instead"""
+        try:
+            if broken:
+                connection.smtp.close()
+            elif connection.sent >= self.max_messages:
+                connection.close()
+            else:
+                connection.idle_since = time.monotonic()
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Close the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class EmailSender:
+    """Sends email through a connection pool from a thread pool, within the server's rate limit
+
+    Each message takes a token from a bucket refilled at `rate_per_minute`
+    (allowing bursts of one message per connection), so batches never
+    exceed the limit the server imposes on the account. A message that
+    fails because the connection broke is retried on a fresh connection
+    after a jittered backoff, up to `attempts` times; messages the server
+    rejects outright (5xx) are not retried.
+
+    Args:
+        pool: Connections to the SMTP server
+        rate_per_minute: Messages per minute allowed by the server (0 for no limit)
+        attempts: Attempts per message
+    """
+
+    def __init__(self, pool: SMTPConnectionPool, rate_per_minute: float = SMTP_RATE_PER_MINUTE,
+                 attempts: int = SMTP_SEND_ATTEMPTS):
+        self.pool = pool
+        self.attempts = max(1, attempts)
+        self._bucket = TokenBucket(rate_per_minute / 60.0, pool.size) if rate_per_minute > 0 else None
+        self._bucket_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix='smtp')
+
+    def _wait_turn(self) -> None:
+        """Reserve the next token, sleeping until it is due"""
+        if self._bucket is None:
+            return
+        with self._bucket_lock:
+            wait = self._bucket.time_until(1, time.monotonic())
+            self._bucket.take()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _send_once(self, message: MIMEMultipart) -> None:
+        connection = self.pool.acquire()
+        try:
+            connection.smtp.send_message(message)
+        except _CONNECTION_ERRORS:
+            self.pool.release(connection, broken=True)
+            raise
+        except smtplib.SMTPException:
+            self._reset(connection)
+            raise
+        except OSError:
+            self.pool.release(connection, broken=True)
+            raise
+        connection.sent += 1
+        self.pool.release(connection)
+
+    def _reset(self, connection: _Connection) -> None:
+        """Clear a failed transaction so the connection can carry the next message"""
+        try:
+            connection.smtp.rset()
+        except (smtplib.SMTPException, OSError):
+            self.pool.release(connection, broken=True)
+        else:
+            self.pool.release(connection)
+
+    def _deliver(self, message: MIMEMultipart) -> Optional[Exception]:
+        """Send one message with retries; returns the last error, or None once the server accepted it"""
+        error: Optional[Exception] = None
+        for attempt in range(1, self.attempts + 1):
+            self._wait_turn()
+            try:
+                self._send_once(message)
+                NOTIFICATIONS.inc(channel='email', outcome='sent')
+                return None
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused) as e:
+                error = e
+                break
+            except smtplib.SMTPResponseException as e:
+                error = e
+                if e.smtp_code >= 500:
+                    break
+            except _CONNECTION_ERRORS as e:
+                error = e
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+                break
+            if attempt < self.attempts:
+                time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+        NOTIFICATIONS.inc(channel='email', outcome='failed')
+        return error
+
+    def send(self, message: MIMEMultipart) -> bool:
+        """
+        Send one message (blocking)
+
+        Returns:
+            True if the server accepted the message
+        """
+        error = self._deliver(message)
+        if error is not None:
+            logger.error(f"Failed to send email to {message['To']}: {error}")
+        return error is None
+
+    def _summarize(self, messages: List[MIMEMultipart], errors: List[Optional[Exception]]) -> List[bool]:
+        summary = LogSummary(logger, f"Email batch of {len(messages)}")
+        for message, error in zip(messages, errors):
+            if error is None:
+                summary.add('sent')
+            else:
+                summary.add('failed', f"Failed to send email to {message['To']}: {error}", logging.ERROR)
+        summary.log()
+        return [error is None for error in errors]
+
+    def send_batch(self, messages: Iterable[MIMEMultipart]) -> List[bool]:
+        """
+        Send messages concurrently over the pooled connections (blocking)
+
+        Returns:
+            Whether each message was accepted, in input order
+        """
+        messages = list(messages)
+        return self._summarize(messages, list(self._executor.map(self._deliver, messages)))
+
+    async def send_batch_async(self, messages: Iterable[MIMEMultipart]) -> List[bool]:
+        """Awaitable version of send_batch; the event loop keeps running while the threads send"""
+        messages = list(messages)
+        loop = asyncio.get_running_loop()
+        errors = await asyncio.gather(*(loop.run_in_executor(self._executor, self._deliver, message)
+                                        for message in messages))
+        return self._summarize(messages, list(errors))
+
+    def close(self) -> None:
+        """Wait for queued messages, then close the pooled connections"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+_sender: Optional[EmailSender] = None
+_sender_lock = threading.Lock()
+
+def get_email_sender() -> EmailSender:
+    """Shared sender for the configured SMTP server, created on first use"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = EmailSender(SMTPConnectionPool())
+            atexit.register(_sender.close)
+        return _sender
+
+def build_price_drop_email(recipient_email: str, game_name: str, price_info: dict,
+                           sender_email: Optional[str] = NOTIFICATION_EMAIL) -> MIMEMultipart:
+    """Compose a price drop email; price_info maps store names to current, original and discount_percent"""
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    msg['Subject'] = f"Price Drop Alert: {game_name}"
+
+    body = f"Price drop for {game_name}!\n\n"
+    for store, info in price_info.items():
+        body += f"Store: {store}\n"
+        body += f"Current Price: {info['current']}\n"
+        body += f"Original Price: {info['original']}\n"
+        body += f"Discount: {info['discount_percent']}%\n\n"
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
 def send_email_notification(recipient_email: str, game_name: str, price_info: dict) -> bool:
-    """Send email notification about price changes"""
+    """Send email notification about price changes (blocking; use send_email_notifications_async from async code)"""
     try:
-        sender_email = os.getenv("NOTIFICATION_EMAIL")
-        password = os.getenv("EMAIL_PASSWORD")
-        
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        msg['Subject'] = f"Price Drop Alert: {game_name}"
-        
-        body = f"Price drop for {game_name}!\n\n"
-        for store, info in price_info.items():
-            body += f"Store: {store}\n"
-            body += f"Current Price: {info['current']}\n"
-            body += f"Original Price: {info['original']}\n"
-            body += f"Discount: {info['discount_percent']}%\n\n"
-            
-        msg.attach(MIMEText(body, 'plain'))
-        
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(sender_email, password)
-            server.send_message(msg)
-            
-        return True
+        return get_email_sender().send(build_price_drop_email(recipient_email, game_name, price_info))
     except Exception as e:
         logger.error(f"Failed to send email notification: {e}")
         return False
+
+def send_email_notifications(notifications: Iterable[Tuple[str, str, dict]]) -> List[bool]:
+    """
+    Send price drop emails in one batch over the pooled connections (blocking)
+
+    Args:
+        notifications: (recipient_email, game_name, price_info) tuples
+
+    Returns:
+        Whether each email was accepted, in input order
+    """
+    return get_email_sender().send_batch(
+        build_price_drop_email(recipient, game_name, price_info)
+        for recipient, game_name, price_info in notifications
+    )
+
+async def send_email_notifications_async(notifications: Iterable[Tuple[str, str, dict]]) -> List[bool]:
+    """Awaitable version of send_email_notifications"""
+    return await get_email_sender().send_batch_async(
+        build_price_drop_email(recipient, game_name, price_info)
+        for recipient, game_name, price_info in notifications
+    )
@@ -0,0 +1,100 @@
+import json
+import asyncio
+import hashlib
+import logging
+import calendar
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from services.chart_renderer import render_price_chart
+from services.config import CHART_RENDER_WORKERS, CHART_CACHE_SIZE, CHART_FILE_ID_CACHE_SIZE
+from services.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Rendered PNGs and Telegram file IDs keyed by a hash of the chart data
+_png_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_file_ids: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Create the chart rendering process pool on first use
+
+    Rendering is pure-Python CPU work, so it runs in other processes to keep
+    the GIL free for the bot and the web server. Workers are started from a
+    fork server that preloads the renderer, so they do not inherit the bot's
+    threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['services.chart_renderer'])
+            _executor = ProcessPoolExecutor(max_workers=CHART_RENDER_WORKERS, mp_context=context)
+        return _executor
+
+def chart_series(records: Dict[str, List[Tuple[datetime, float]]]) -> Dict[str, List[Tuple[int, float]]]:
+    """Convert stored price records into renderer input with unix timestamps"""
+    return {
+        store: [(calendar.timegm(recorded_at.utctimetuple()), price) for recorded_at, price in points]
+        for store, points in sorted(records.items())
+    }
+
+def chart_key(series: Dict[str, List[Tuple[int, float]]]) -> str:
+    """Hash of the chart data, identifying identical renders"""
+    return hashlib.sha256(json.dumps(series, sort_keys=True).encode()).hexdigest()
+
+def get_chart_file_id(key: str) -> Optional[str]:
+    """Telegram file_id of an already uploaded chart, if any"""
+    with _cache_lock:
+        file_id = _file_ids.get(key)
+        if file_id is not None:
+            _file_ids.move_to_end(key)
+    CACHE_REQUESTS.inc(cache='chart_file_id', result='hit' if file_id else 'miss')
+    return file_id
+
+def remember_chart_file_id(key: str, file_id: str) -> None:
+    """Remember the file_id Telegram assigned to an uploaded chart"""
+    with _cache_lock:
+        _file_ids[key] = file_id
+        _file_ids.move_to_end(key)
+        while len(_file_ids) > CHART_FILE_ID_CACHE_SIZE:
+            _file_ids.popitem(last=False)
+        # The PNG is no longer needed once Telegram has it
+        _png_cache.pop(key, None)
+
+async def render_chart(key: str, series: Dict[str, List[Tuple[int, float]]]) -> bytes:
+    """
+    Get the PNG for a chart, rendering it in the process pool on a cache miss
+
+    Args:
+        key: chart_key of the series
+        series: Renderer input from chart_series
+
+    Returns:
+        PNG image bytes
+    """
+    with _cache_lock:
+        png = _png_cache.get(key)
+        if png is not None:
+            _png_cache.move_to_end(key)
+            CACHE_REQUESTS.inc(cache='chart_png', result='hit')
+            return png
+
+    CACHE_REQUESTS.inc(cache='chart_png', result='miss')
+
+    loop = asyncio.get_running_loop()
+    png = await loop.run_in_executor(_get_executor(), render_price_chart, series)
+
+    with _cache_lock:
+        _png_cache[key] = png
+        while len(_png_cache) > CHART_CACHE_SIZE:
+            _png_cache.popitem(last=False)
+
+    return png
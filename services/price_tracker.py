@@ -1,29 +1,80 @@
 import os
+import asyncio
 import logging
 import aiohttp
-from typing import Dict, List, Any, Optional
-from data.data_manager import get_all_subscriptions, update_game_price, get_subscribed_users_for_game
+from typing import Dict, Iterable, List, Any, Optional
+from data.data_manager import (
+    get_all_subscriptions, update_game_price, get_subscribed_users_for_game, get_game_titles,
+    get_price_stats, get_deal_alert_filters, get_announced_deal_prices, has_announced_deals,
+    record_announced_deals, ALL_STORES
+)
 from services.game_service import get_game_details
+from services.deals_snapshot import DealsSnapshot, set_deals_snapshot
+from services.deal_alerts import build_filter_index, new_deals, send_deal_alerts
+from services.recommendations import co_subscription_index
+from services.stats_index import stats_index
+from services.metrics import NOTIFICATIONS, upstream_trace_config
+from services.sweep_report import sweep_phase
+from services.upstream import upstream_get
+from services.logging_setup import LogSummary
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # CheapShark API URL is now in config.py
-from config import CHEAPSHARK_API_URL, SUPPORTED_STORES
+from services.config import (
+    CHEAPSHARK_API_URL, SUPPORTED_STORES, DEALS_SNAPSHOT_PAGES, TELEGRAM_API_BASE_URL, TELEGRAM_API_FILE_URL
+)
 
-async def check_price_updates() -> Dict[str, Dict[str, Any]]:
+# CheapShark's maximum page size for the deals endpoint
+DEALS_PAGE_SIZE = 60
+
+# Discount a store price needs to be stored and notified about
+SIGNIFICANT_DISCOUNT = 10
+
+def _price_value(price: Any) -> float:
+    """Parse a price like '$12.34', 0.0 if it is not one"""
+    try:
+        if price.startswith('$'):
+            price = price[1:]
+        return float(price)
+    except (ValueError, TypeError, AttributeError):
+        return 0.0
+
+def _is_historical_low(price: float, all_time_low: Optional[float], first_low: float) -> bool:
+    """
+    Whether a sale price is the lowest known for the game
+
+    Args:
+        price: The store's current price
+        all_time_low: Lowest price stored for the game before this check, None if none is
+        first_low: Cheapest significant sale price of this check, used when nothing is stored
+
+    Returns:
+        True if the price is below every stored price or, for a game with no
+        stored prices yet, is the cheapest sale price of its first check
+    """
+    if all_time_low is None:
+        return price <= first_low
+    return price < all_time_low
+
+async def check_price_updates(game_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
     """
     Check price updates for all subscribed games
 
+    Args:
+        game_ids: Only check these games (a sweep worker's shard); all subscribed games if None
+
     Returns:
         A dictionary with game_id as keys and game information (including users to notify) as values
     """
     logger.info("Checking price updates for subscribed games...")
 
     # Get all game subscriptions
-    all_subscriptions = get_all_subscriptions()
+    with sweep_phase('load_subscriptions'):
+        all_subscriptions = get_all_subscriptions()
+        if game_ids is not None:
+            all_subscriptions = {game_id: all_subscriptions[game_id] for game_id in game_ids
+                                 if game_id in all_subscriptions}
 
     if not all_subscriptions:
         logger.info("No subscriptions found.")
@@ -31,37 +82,43 @@ async def check_price_updates() -> Dict[str, Dict[str, Any]]:
 
     # Track games with price drops
     price_drops = {}
+    summary = LogSummary(logger, f"Checked {len(all_subscriptions)} games")
 
     # Check each game
     for game_id in all_subscriptions:
         try:
-            # Get current game details from API
-            game_details = await get_game_details(game_id)
+            # Get current game details from API (also refreshes the shared details cache)
+            with sweep_phase('fetch_details', game_id):
+                game_details = await get_game_details(game_id, fresh=True)
 
             if not game_details:
-                logger.warning(f"Could not get details for game ID: {game_id}")
+                summary.add('without details', f"Could not get details for game ID: {game_id}", logging.WARNING)
                 continue
 
             # Check if there's a price drop in any store
             has_price_drop = False
             price_drop_info = {}
 
-            for store_name, price_info in game_details.get('prices', {}).items():
-                current_price = price_info.get('current', '0')
+            # Lowest price ever recorded for this game, read before this sweep's prices are stored
+            with sweep_phase('load_stats', game_id):
+                all_time_low = get_price_stats(game_id).get(ALL_STORES, {}).get('all_time_low')
+
+            prices = game_details.get('prices', {})
+            first_low = min((_price_value(price_info.get('current', '0')) for price_info in prices.values()
+                             if price_info.get('discount_percent', 0) > SIGNIFICANT_DISCOUNT), default=0.0)
+
+            for store_name, price_info in prices.items():
+                current_price_float = _price_value(price_info.get('current', '0'))
                 discount_percent = price_info.get('discount_percent', 0)
 
-                # Remove currency symbol for comparison
-                try:
-                    if current_price.startswith('$'):
-                        current_price = current_price[1:]
-                    current_price_float = float(current_price)
-                except (ValueError, TypeError, AttributeError):
-                    current_price_float = 0.0
+                # Only significant discounts are stored, but the stats ranking needs to see sales end too
+                stats_index.store_discount_observed(game_id, store_name, discount_percent)
 
-                # Check if there's a significant discount (> 10%)
-                if discount_percent > 10:
+                # Check if there's a significant discount
+                if discount_percent > SIGNIFICANT_DISCOUNT:
                     # Get previous price information
-                    previous_info = update_game_price(game_id, store_name, current_price_float, discount_percent)
+                    with sweep_phase('store_prices', game_id):
+                        previous_info = update_game_price(game_id, store_name, current_price_float, discount_percent)
 
                     if previous_info:
                         previous_price = previous_info.get('price', 0.0)
@@ -72,7 +129,8 @@ async def check_price_updates() -> Dict[str, Dict[str, Any]]:
                             price_drop_info[store_name] = {
                                 'previous_price': f"${previous_price}",
                                 'current_price': price_info.get('current'),
-                                'discount_percent': discount_percent
+                                'discount_percent': discount_percent,
+                                'historical_low': _is_historical_low(current_price_float, all_time_low, first_low)
                             }
                     else:
                         # First time tracking this price, consider it a drop if there's a discount
@@ -80,14 +138,17 @@ async def check_price_updates() -> Dict[str, Dict[str, Any]]:
                         price_drop_info[store_name] = {
                             'current_price': price_info.get('current'),
                             'original_price': price_info.get('original'),
-                            'discount_percent': discount_percent
+                            'discount_percent': discount_percent,
+                            'historical_low': _is_historical_low(current_price_float, all_time_low, first_low)
                         }
 
             # If price drop detected, add to notify list
             if has_price_drop:
                 # Get users subscribed to this game
-                users = get_subscribed_users_for_game(game_id)
+                with sweep_phase('load_subscribers', game_id):
+                    users = get_subscribed_users_for_game(game_id)
 
+                summary.add('with price drops')
                 if users:
                     price_drops[game_id] = {
                         'name': game_details.get('name', 'Unknown Game'),
@@ -96,8 +157,9 @@ async def check_price_updates() -> Dict[str, Dict[str, Any]]:
                     }
 
         except Exception as e:
-            logger.error(f"Error checking price updates for game {game_id}: {e}")
+            summary.add('failed', f"Error checking price updates for game {game_id}: {e}", logging.ERROR)
 
+    summary.log()
     logger.info(f"Found {len(price_drops)} games with price drops.")
     return price_drops
 
@@ -112,53 +174,126 @@ async def send_price_drop_notifications(price_drops: Dict[str, Dict[str, Any]])
         logger.info("No price drops to notify users about.")
         return
 
-    # Get the bot application instance
     try:
-        from telegram.ext import ApplicationBuilder
+        application = _notification_application()
+        if application is None:
+            return
+
+        # The bot's HTTP client is closed at the end so each sweep does not leak one
+        async with application.bot:
+            await _send_notifications(application.bot, price_drops)
+
+    except Exception as e:
+        logger.error(f"Error sending price drop notifications: {e}")
+
+def _notification_application():
+    """Build a bot application for sending notifications outside the bot thread (None without a token)"""
+    from telegram.ext import ApplicationBuilder
 
-        telegram_token = os.getenv("TELEGRAM_TOKEN")
+    telegram_token = os.getenv("TELEGRAM_TOKEN")
 
-        if not telegram_token:
-            logger.error("No Telegram token found in environment variables!")
+    if not telegram_token:
+        logger.error("No Telegram token found in environment variables!")
+        return None
+
+    return (ApplicationBuilder()
+            .token(telegram_token)
+            .base_url(TELEGRAM_API_BASE_URL)
+            .base_file_url(TELEGRAM_API_FILE_URL)
+            .build())
+
+async def send_new_deal_alerts(snapshot: DealsSnapshot) -> None:
+    """
+    Alert users with deal alerts on about new deals matching their filters (needs an app context)
+
+    A deal is new if it was never announced or is cheaper now than when it
+    was. Announced deals are stored with their price, so a deal that drops
+    out of the snapshot window and comes back, or a restart, does not cause
+    a repeat alert. The first run against an empty table only records the
+    current deals. The filter index is built from the users table on every
+    call, so filters changed through any replica are taken into account.
+
+    Args:
+        snapshot: Current deals snapshot
+    """
+    deal_ids = [deal['deal_id'] for deal in snapshot.deals]
+    announced = get_announced_deal_prices(deal_ids)
+    if announced is None:
+        return
+    deals = new_deals(snapshot, announced)
+
+    if deals and not announced and not has_announced_deals():
+        logger.info(f"No deals announced yet, recording the {len(deals)} current deals without alerts")
+    elif deals:
+        await _alert_deals(deals)
+    record_announced_deals(deals, deal_ids)
+
+async def _alert_deals(deals: List[Dict[str, Any]]) -> None:
+    index = build_filter_index(get_deal_alert_filters())
+    if not len(index):
+        return
+
+    try:
+        application = _notification_application()
+        if application is None:
             return
 
-        application = ApplicationBuilder().token(telegram_token).build()
-
-        # Send notifications to each user
-        for game_id, game_info in price_drops.items():
-            game_name = game_info.get('name', 'Unknown Game')
-            users = game_info.get('users', [])
-            price_info = game_info.get('price_info', {})
-
-            # Create notification message
-            message = f"🔥 Снижение цены! 🔥\n\n"
-            message += f"Игра: {game_name}\n\n"
-
-            for store_name, store_price_info in price_info.items():
-                current_price = store_price_info.get('current_price', 'Unknown')
-
-                if 'previous_price' in store_price_info:
-                    previous_price = store_price_info.get('previous_price', 'Unknown')
-                    discount = store_price_info.get('discount_percent', 0)
-                    message += f"🏪 {store_name}: {current_price} (was {previous_price}, -{discount}%)\n"
-                else:
-                    original_price = store_price_info.get('original_price', 'Unknown')
-                    discount = store_price_info.get('discount_percent', 0)
-                    message += f"🏪 {store_name}: {current_price} (was {original_price}, -{discount}%)\n"
-
-            # Add a call to action
-            message += f"\nИспользуйте /search {game_name} чтобы узнать подробности!"
-
-            # Send to each subscribed user
-            for user_id in users:
-                try:
-                    await application.bot.send_message(chat_id=user_id, text=message)
-                    logger.info(f"Sent price drop notification for {game_name} to user {user_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send notification to user {user_id}: {e}")
+        async with application.bot:
+            await send_deal_alerts(application.bot, deals, index)
 
     except Exception as e:
-        logger.error(f"Error sending price drop notifications: {e}")
+        logger.error(f"Error sending deal alerts: {e}")
+
+async def _send_notifications(bot, price_drops: Dict[str, Dict[str, Any]]) -> None:
+    """Send one price drop message per game to each of its subscribers"""
+    summary = LogSummary(logger, f"Price drop notifications for {len(price_drops)} games")
+    for game_id, game_info in price_drops.items():
+        game_name = game_info.get('name', 'Unknown Game')
+        users = game_info.get('users', [])
+        price_info = game_info.get('price_info', {})
+
+        # Create notification message
+        message = f"🔥 Снижение цены! 🔥\n\n"
+        message += f"Игра: {game_name}\n\n"
+
+        for store_name, store_price_info in price_info.items():
+            current_price = store_price_info.get('current_price', 'Unknown')
+
+            if 'previous_price' in store_price_info:
+                previous_price = store_price_info.get('previous_price', 'Unknown')
+                discount = store_price_info.get('discount_percent', 0)
+                message += f"🏪 {store_name}: {current_price} (was {previous_price}, -{discount}%)\n"
+            else:
+                original_price = store_price_info.get('original_price', 'Unknown')
+                discount = store_price_info.get('discount_percent', 0)
+                message += f"🏪 {store_name}: {current_price} (was {original_price}, -{discount}%)\n"
+
+            if store_price_info.get('historical_low'):
+                message += "🏆 Самая низкая цена за всю историю!\n"
+
+        # Suggest games that are often tracked together with this one
+        recommended = co_subscription_index.recommend(game_id, limit=3)
+        if recommended:
+            with sweep_phase('load_recommendations', game_id):
+                titles = get_game_titles([other_id for other_id, _ in recommended])
+            if titles:
+                message += f"\n👥 Вместе с этой игрой отслеживают: {', '.join(titles.values())}\n"
+
+        # Add a call to action
+        message += f"\nИспользуйте /search {game_name} чтобы узнать подробности!"
+
+        # Send to each subscribed user
+        for user_id in users:
+            try:
+                with sweep_phase('send_message', game_id):
+                    await bot.send_message(chat_id=user_id, text=message)
+                NOTIFICATIONS.inc(channel='telegram', outcome='sent')
+                summary.add('sent')
+            except Exception as e:
+                NOTIFICATIONS.inc(channel='telegram', outcome='failed')
+                summary.add('failed', f"Failed to send notification to user {user_id}: {e}", logging.ERROR)
+
+    summary.log()
 
 async def get_current_discounts(
     limit: int = 20,
@@ -177,12 +312,12 @@ async def get_current_discounts(
         A list of discounted games
     """
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[upstream_trace_config()]) as session:
             # Get deals sorted by savings from all stores
             stores_param = ','.join(SUPPORTED_STORES.keys())
             deals_url = f"{CHEAPSHARK_API_URL}/deals?pageSize={limit}&sortBy=savings&storeID={stores_param}"
 
-            async with session.get(deals_url) as response:
+            async with upstream_get(session, deals_url) as response:
                 if response.status != 200:
                     logger.error(f"API request failed with status {response.status}")
                     return []
@@ -201,22 +336,100 @@ async def get_current_discounts(
                     if min_discount and savings < min_discount:
                         continue
 
-                    # Get store name
-                    store_id = deal.get('storeID')
-                    store_name = SUPPORTED_STORES.get(store_id, "Unknown Store")
-
-                    # Format the deal
-                    results.append({
-                        'id': deal.get('gameID'),
-                        'name': deal.get('title'),
-                        'store': store_name,
-                        'price_current': f"${deal.get('salePrice')}",
-                        'price_original': f"${deal.get('normalPrice')}",
-                        'discount_percent': int(float(deal.get('savings', '0'))),
-                        'deal_rating': deal.get('dealRating')
-                    })
+                    results.append(_format_deal(deal))
 
                 return results
     except Exception as e:
         logger.error(f"Error getting current discounts: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def _format_deal(deal: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a CheapShark deal into our standard format"""
+    store_id = deal.get('storeID')
+
+    return {
+        'id': deal.get('gameID'),
+        'deal_id': deal.get('dealID'),
+        'name': deal.get('title'),
+        'store': SUPPORTED_STORES.get(store_id, "Unknown Store"),
+        'price': float(deal.get('salePrice') or 0),
+        'price_current': f"${deal.get('salePrice')}",
+        'price_original': f"${deal.get('normalPrice')}",
+        'discount_percent': int(float(deal.get('savings') or 0)),
+        'deal_rating': deal.get('dealRating')
+    }
+
+async def fetch_all_deals(pages: int = DEALS_SNAPSHOT_PAGES) -> List[Dict[str, Any]]:
+    """
+    Fetch the current deals from all supported stores, several pages deep
+
+    Pages 0 to pages - 1 of the deals sorted by savings are requested at the
+    same time over one session, each through the upstream governor and
+    without retries. Each call fetches them anew; nothing is cached or shared
+    between callers. A page that fails or does not return 200 is logged and
+    skipped, and deals that fail to parse are dropped. Deals are kept in page
+    order; one that shows up on two pages (the list shifted between requests)
+    is kept only the first time.
+
+    Args:
+        pages: Number of pages of DEALS_PAGE_SIZE deals to fetch
+
+    Returns:
+        A list of deals in the _format_deal format (id, deal_id, name, store,
+        price, price_current, price_original, discount_percent, deal_rating),
+        best savings first; empty if every page failed
+    """
+    stores_param = ','.join(SUPPORTED_STORES.keys())
+
+    async def fetch_page(session: aiohttp.ClientSession, page_number: int) -> List[Dict[str, Any]]:
+        deals_url = (f"{CHEAPSHARK_API_URL}/deals?pageNumber={page_number}&pageSize={DEALS_PAGE_SIZE}"
+                     f"&sortBy=savings&storeID={stores_param}")
+        async with upstream_get(session, deals_url) as response:
+            if response.status != 200:
+                logger.error(f"Deals page {page_number} request failed with status {response.status}")
+                return []
+            return await response.json()
+
+    try:
+        async with aiohttp.ClientSession(trace_configs=[upstream_trace_config()]) as session:
+            pages_data = await asyncio.gather(
+                *(fetch_page(session, page_number) for page_number in range(pages)),
+                return_exceptions=True
+            )
+    except Exception as e:
+        logger.error(f"Error fetching deals: {e}")
+        return []
+
+    results = []
+    seen_deals = set()
+    for page_data in pages_data:
+        if isinstance(page_data, Exception):
+            logger.error(f"Error fetching deals page: {page_data}")
+            continue
+        for deal in page_data:
+            try:
+                formatted = _format_deal(deal)
+            except (ValueError, TypeError):
+                continue
+            # Pages can overlap when deals change while we fetch
+            if formatted['deal_id'] in seen_deals:
+                continue
+            seen_deals.add(formatted['deal_id'])
+            results.append(formatted)
+
+    return results
+
+async def refresh_deals_snapshot() -> bool:
+    """
+    Fetch current deals and publish them as the new deals snapshot
+
+    Returns:
+        True if a new snapshot was published
+    """
+    deals = await fetch_all_deals()
+    if not deals:
+        logger.warning("No deals fetched, keeping the previous deals snapshot")
+        return False
+
+    set_deals_snapshot(DealsSnapshot(deals))
+    return True
\ No newline at end of file
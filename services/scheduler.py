@@ -1,12 +1,25 @@
+import atexit
 import logging
 import asyncio
+from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from services.price_tracker import check_price_updates, send_price_drop_notifications
+from apscheduler.triggers.interval import IntervalTrigger
+from services.price_tracker import send_price_drop_notifications, refresh_deals_snapshot, send_new_deal_alerts
+from services.deals_snapshot import get_deals_snapshot
+from services.sweep_sharding import check_prices_sharded
+from services.similarity import rebuild_similar_games
+from services.recommendations import rebuild_recommendations
+from services.stats_index import rebuild_stats
+from services.config import DEALS_SNAPSHOT_REFRESH_MINUTES, STATS_REBUILD_MINUTES
+from services.metrics import SWEEP_RUNS
+from services.sweep_report import SweepReport, take_profile_request, profile_path
+from services.profiler import SamplingProfiler
+from services.memory import SweepMemoryTracker
+from services.catalogue_index import load_catalogue_index
+from services.readiness import readiness
+from services.leader import LeaderElector
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Create a scheduler
@@ -15,34 +28,204 @@ scheduler = BackgroundScheduler()
 # Global app reference
 flask_app = None
 
+# Elects the one replica that runs the shared jobs (price checks, similar games, deal alerts);
+# jobs that fill this process's caches run on every replica
+leader_elector = None
+
 async def scheduled_price_check():
     """Job to check prices and send notifications"""
+    if not flask_app:
+        SWEEP_RUNS.inc(outcome='skipped')
+        logger.error("Flask app not available for scheduler. Skipping price check.")
+        return
+
+    # Fencing token: a sweep started as leader must not notify after losing the lease,
+    # since the new leader runs its own sweep. Followers do not sweep at all.
+    term = leader_elector.term if leader_elector is not None else None
+    if leader_elector is not None and term is None:
+        SWEEP_RUNS.inc(outcome='skipped')
+        logger.info("Not the leader replica, skipping price check.")
+        return
+
+    report = SweepReport()
+    token = report.activate()
+    profiler = SamplingProfiler() if take_profile_request() else None
+    memory = SweepMemoryTracker(f"{report.started_at:%Y-%m-%d %H:%M:%S}")
+    memory.start()
+    outcome = 'failed'
+    price_drops = {}
     try:
-        logger.info("Running scheduled price check...")
+        logger.info("Running scheduled price check" + (" under the profiler..." if profiler else "..."))
+        if profiler:
+            profiler.start()
         # Use the global app reference
-        if flask_app:
-            with flask_app.app_context():
-                price_drops = await check_price_updates()
+        with flask_app.app_context():
+            with report.phase('check_prices'):
+                # Split between sweep workers when any are running
+                price_drops = await check_prices_sharded(report)
+            if leader_elector is not None and not leader_elector.holds(term):
+                outcome = 'aborted'
+                logger.warning(f"Lost leadership (term {term}) during the price check; "
+                               f"skipping notifications for {len(price_drops)} games.")
+                return
+            with report.phase('notify'):
                 await send_price_drop_notifications(price_drops)
-                logger.info("Scheduled price check completed.")
-        else:
-            logger.error("Flask app not available for scheduler. Skipping price check.")
+            outcome = 'completed'
+            logger.info("Scheduled price check completed.")
+            readiness.mark_ready('first_sweep')
     except Exception as e:
         logger.error(f"Error in scheduled price check: {e}")
+        if not readiness.is_ready('first_sweep'):
+            readiness.mark_failed('first_sweep', e)
+    finally:
+        report.deactivate(token)
+        report.finish()
+        memory.stop()
+        SWEEP_RUNS.inc(outcome=outcome)
+
+        profile_file = None
+        if profiler:
+            profiler.stop()
+            profile_file = f"sweep-{report.started_at:%Y%m%d-%H%M%S}.folded"
+            try:
+                profiler.save(profile_path(profile_file))
+            except OSError as e:
+                logger.error(f"Could not save sweep profile: {e}")
+                profile_file = None
+
+        with flask_app.app_context():
+            report.save(outcome, len(price_drops), profile_file)
+
+def _on_leadership_change(is_leader: bool) -> None:
+    readiness.mark_ready('leadership', 'leader' if is_leader else 'follower')
+
+def is_leader_replica() -> bool:
+    """Whether this replica runs the shared jobs (always true without leader election)"""
+    return leader_elector is None or leader_elector.is_leader
+
+def _runs_here(component: str) -> bool:
+    """
+    Whether this replica runs the shared jobs
+
+    On the other replicas the job's readiness component is marked as handled elsewhere.
+    """
+    if is_leader_replica():
+        return True
+    if not readiness.is_ready(component):
+        readiness.mark_disabled(component, 'runs on the leader replica')
+    logger.info("Not the leader replica, skipping shared job.")
+    return False
+
+def run_price_check_job():
+    """Scheduled price check, run by the leader replica only"""
+    if _runs_here('first_sweep'):
+        run_async_job()
+
+def trigger_price_check() -> None:
+    """Run a price check now in the scheduler's thread pool (on the leader replica only, like the scheduled one)"""
+    scheduler.add_job(run_price_check_job, id='manual_price_check', name='Manual price check', replace_existing=True)
 
 def run_async_job():
-    """Run the async scheduled job in the current event loop"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(scheduled_price_check())
+    """Run the async scheduled job in a fresh event loop, closed when it finishes"""
+    asyncio.run(scheduled_price_check())
+
+def run_deals_refresh_job():
+    """Refresh the deals snapshot used by /discounts and alert users about new deals"""
+    try:
+        if asyncio.run(refresh_deals_snapshot()):
+            readiness.mark_ready('deals_snapshot')
+            run_deal_alerts(get_deals_snapshot())
+        elif not readiness.is_ready('deals_snapshot'):
+            readiness.mark_failed('deals_snapshot', 'no deals fetched')
+    except Exception as e:
+        logger.error(f"Error refreshing deals snapshot: {e}")
+        if not readiness.is_ready('deals_snapshot'):
+            readiness.mark_failed('deals_snapshot', e)
+
+def run_deal_alerts(snapshot):
+    """Send alerts for the deals not announced before (on the leader replica only, so each goes out once)"""
+    if leader_elector is not None and not leader_elector.is_leader:
+        return
+    try:
+        if flask_app:
+            with flask_app.app_context():
+                asyncio.run(send_new_deal_alerts(snapshot))
+        else:
+            logger.error("Flask app not available for scheduler. Skipping deal alerts.")
+    except Exception as e:
+        logger.error(f"Error sending deal alerts: {e}")
+
+def run_catalogue_warmup_job():
+    """Build the catalogue index ahead of the first search"""
+    try:
+        if flask_app:
+            with flask_app.app_context():
+                count = load_catalogue_index()
+            readiness.mark_ready('catalogue_index', f"{count} games")
+        else:
+            logger.error("Flask app not available for scheduler. Skipping catalogue warm-up.")
+    except Exception as e:
+        logger.error(f"Error building catalogue index: {e}")
+        readiness.mark_failed('catalogue_index', e)
+
+def run_similarity_job():
+    """Recompute the similar games index (stored in the database, so on the leader replica only)"""
+    if not _runs_here('similar_games'):
+        return
+    try:
+        if flask_app:
+            with flask_app.app_context():
+                rebuild_similar_games()
+            readiness.mark_ready('similar_games')
+        else:
+            logger.error("Flask app not available for scheduler. Skipping similar games rebuild.")
+    except Exception as e:
+        logger.error(f"Error rebuilding similar games: {e}")
+        if not readiness.is_ready('similar_games'):
+            readiness.mark_failed('similar_games', e)
+
+def run_recommendations_job():
+    """Rebuild the co-subscription matrix from scratch"""
+    try:
+        if flask_app:
+            with flask_app.app_context():
+                rebuild_recommendations()
+            readiness.mark_ready('recommendations')
+        else:
+            logger.error("Flask app not available for scheduler. Skipping recommendations rebuild.")
+    except Exception as e:
+        logger.error(f"Error rebuilding recommendations: {e}")
+        if not readiness.is_ready('recommendations'):
+            readiness.mark_failed('recommendations', e)
+
+def run_stats_job():
+    """Rebuild the stats counters and rankings from scratch"""
+    try:
+        if flask_app:
+            with flask_app.app_context():
+                rebuild_stats()
+            readiness.mark_ready('stats')
+        else:
+            logger.error("Flask app not available for scheduler. Skipping stats rebuild.")
+    except Exception as e:
+        logger.error(f"Error rebuilding stats: {e}")
+        if not readiness.is_ready('stats'):
+            readiness.mark_failed('stats', e)
+
+# Jobs run once at startup; the process serves requests while they run
+WARMUP_COMPONENTS = ('first_sweep', 'deals_snapshot', 'catalogue_index', 'similar_games', 'recommendations',
+                     'stats')
 
 def start_scheduler(app=None):
     """Start the APScheduler for price checking
+
+    Returns right away: the first price check and the warm-up jobs run in the
+    scheduler's thread pool and report their progress to the readiness registry.
     
     Args:
         app: Flask application instance (optional)
     """
-    global flask_app
+    global flask_app, leader_elector
     
     # Set the Flask app for future context use
     if app:
@@ -52,10 +235,22 @@ def start_scheduler(app=None):
         logger.info("Scheduler is already running.")
         return
 
+    readiness.register('scheduler')
+    for component in WARMUP_COMPONENTS:
+        readiness.register(component, required=False)
+    readiness.register('leadership', required=False)
+
+    # Take part in the leader election before any job can run
+    if flask_app and leader_elector is None:
+        leader_elector = LeaderElector(flask_app, 'scheduler', on_change=_on_leadership_change)
+        if not leader_elector.start():
+            _on_leadership_change(False)
+        atexit.register(leader_elector.stop)
+
     try:
         # Schedule price check job to run daily at midnight
         scheduler.add_job(
-            run_async_job,
+            run_price_check_job,
             trigger=CronTrigger(hour=0, minute=0),
             id='price_check_job',
             name='Daily price check',
@@ -64,22 +259,77 @@ def start_scheduler(app=None):
         
         # Add another job to run every 4 hours for more frequent checks
         scheduler.add_job(
-            run_async_job,
+            run_price_check_job,
             trigger=CronTrigger(hour='*/4'),
             id='price_check_frequent_job',
             name='Frequent price check',
             replace_existing=True
         )
         
+        # Keep the /discounts snapshot fresh; the first refresh runs right away
+        scheduler.add_job(
+            run_deals_refresh_job,
+            trigger=IntervalTrigger(minutes=DEALS_SNAPSHOT_REFRESH_MINUTES),
+            id='deals_snapshot_job',
+            name='Deals snapshot refresh',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
+        # Recompute similar games nightly, and once at startup
+        scheduler.add_job(
+            run_similarity_job,
+            trigger=CronTrigger(hour=3, minute=30),
+            id='similar_games_job',
+            name='Similar games rebuild',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
+        # Rebuild the co-subscription matrix nightly (it is updated incrementally in between), and once at startup
+        scheduler.add_job(
+            run_recommendations_job,
+            trigger=CronTrigger(hour=4, minute=0),
+            id='recommendations_job',
+            name='Recommendations rebuild',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
+        # Rebuild the stats counters periodically (they are updated incrementally in between), and once at startup
+        scheduler.add_job(
+            run_stats_job,
+            trigger=IntervalTrigger(minutes=STATS_REBUILD_MINUTES),
+            id='stats_job',
+            name='Stats rebuild',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
+        # First price check and catalogue warm-up, once, right after startup
+        scheduler.add_job(
+            run_price_check_job,
+            id='initial_price_check',
+            name='Initial price check',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+        scheduler.add_job(
+            run_catalogue_warmup_job,
+            id='catalogue_warmup_job',
+            name='Catalogue index warm-up',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
         # Start the scheduler
         scheduler.start()
+        readiness.mark_ready('scheduler')
         logger.info("Price check scheduler started.")
         
-        # Run job immediately on startup
-        run_async_job()
-        
     except Exception as e:
         logger.error(f"Error starting scheduler: {e}")
+        readiness.mark_failed('scheduler', e)
 
 def stop_scheduler():
     """Stop the APScheduler"""
@@ -0,0 +1,42 @@
+import logging
+from typing import Any, Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+logger = logging.getLogger(__name__)
+
+# Key in Session.info holding the callbacks waiting for the transaction to commit
+_PENDING_KEY = 'after_commit_callbacks'
+
+def after_commit(target: Any, callback: Callable, *args: Any, **kwargs: Any) -> None:
+    """
+    Run a callback once the transaction that wrote `target` commits
+
+    For in-memory indexes kept current from mapper events: those events fire
+    at flush, before the transaction is settled, so the change is queued on
+    the session and applied after commit, or dropped if the transaction rolls
+    back. Pass plain values captured at flush time, not the instance, since
+    it is expired by the commit.
+
+    Args:
+        target: Instance passed to the mapper event
+        callback: Function to call after commit
+        *args, **kwargs: Arguments for the callback
+    """
+    session = object_session(target)
+    if session is None:
+        callback(*args, **kwargs)
+        return
+    session.info.setdefault(_PENDING_KEY, []).append((callback, args, kwargs))
+
+@event.listens_for(Session, 'after_commit')
+def _run_pending(session: Session) -> None:
+    for callback, args, kwargs in session.info.pop(_PENDING_KEY, []):
+        try:
+            callback(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error applying committed change with {callback.__qualname__}: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
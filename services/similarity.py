@@ -0,0 +1,211 @@
+import re
+import math
+import json
+import heapq
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import contains_eager
+from models import db, Game, SimilarGame
+from data.data_manager import run_db
+from services.config import SIMILAR_GAMES_TOP_K
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+# Stored detail fields that describe a game's content, if present
+DETAIL_FIELDS = ('genre', 'genres', 'publisher', 'developer', 'tags')
+
+# Features shared by more than this share of a large catalogue carry no signal
+# and would make the pairwise scoring quadratic, so they are skipped
+MAX_DOCUMENT_FREQUENCY = 0.05
+MAX_DF_MIN_CATALOGUE = 200
+
+# Pairs scoring below this are not worth showing
+MIN_SIMILARITY = 0.2
+
+def _normalize(text: str) -> str:
+    """Lowercase text and collapse punctuation to single spaces"""
+    return _NON_WORD_RE.sub(' ', text.casefold()).strip()
+
+def game_features(title: str, details: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Build the raw feature counts of a game
+
+    Titles contribute character trigrams (robust to sequels, subtitles and
+    spelling variants); stored details contribute whole-value tokens.
+
+    Args:
+        title: Game title
+        details: Stored game details
+
+    Returns:
+        Dictionary mapping feature to count
+    """
+    features: Dict[str, float] = {}
+
+    padded = f"  {_normalize(title)}  "
+    for i in range(len(padded) - 2):
+        gram = 't:' + padded[i:i + 3]
+        features[gram] = features.get(gram, 0.0) + 1.0
+
+    for field in DETAIL_FIELDS:
+        value = details.get(field)
+        values = value if isinstance(value, list) else [value] if value else []
+        for item in values:
+            for part in str(item).split(','):
+                part = _normalize(part)
+                if part:
+                    feature = f"{field}:{part}"
+                    features[feature] = features.get(feature, 0.0) + 2.0
+
+    return features
+
+def compute_neighbours(
+    games: Iterable[Tuple[str, Dict[str, float]]],
+    top_k: int = SIMILAR_GAMES_TOP_K
+) -> Dict[str, List[Tuple[str, float]]]:
+    """
+    Compute the top-k most similar games for every game
+
+    Feature counts are TF-IDF weighted and L2-normalized; cosine similarity is
+    accumulated through an inverted index, so only games sharing at least one
+    informative feature are ever compared.
+
+    Args:
+        games: (game_id, raw feature counts) pairs
+        top_k: Number of neighbours to keep per game
+
+    Returns:
+        Dictionary mapping game_id to [(neighbour_id, score)], best first
+    """
+    games = list(games)
+    total = len(games)
+    if total < 2:
+        return {}
+
+    document_frequency: Dict[str, int] = {}
+    for _, features in games:
+        for feature in features:
+            document_frequency[feature] = document_frequency.get(feature, 0) + 1
+
+    max_df = total * MAX_DOCUMENT_FREQUENCY if total >= MAX_DF_MIN_CATALOGUE else total
+
+    vectors: Dict[str, Dict[str, float]] = {}
+    postings: Dict[str, List[Tuple[str, float]]] = {}
+    for game_id, features in games:
+        vector = {}
+        for feature, count in features.items():
+            df = document_frequency[feature]
+            if df > max_df:
+                continue
+            vector[feature] = (1.0 + math.log(count)) * math.log(1.0 + total / df)
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if not norm:
+            continue
+        vector = {feature: weight / norm for feature, weight in vector.items()}
+        vectors[game_id] = vector
+        for feature, weight in vector.items():
+            postings.setdefault(feature, []).append((game_id, weight))
+
+    neighbours = {}
+    for game_id, vector in vectors.items():
+        scores: Dict[str, float] = {}
+        for feature, weight in vector.items():
+            for other_id, other_weight in postings[feature]:
+                if other_id != game_id:
+                    scores[other_id] = scores.get(other_id, 0.0) + weight * other_weight
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        best = [(other_id, score) for other_id, score in best if score >= MIN_SIMILARITY]
+        if best:
+            neighbours[game_id] = best
+
+    return neighbours
+
+def rebuild_similar_games() -> int:
+    """
+    Recompute nearest neighbours for the whole catalogue (needs an app context)
+
+    Returns:
+        Number of games that have neighbours
+    """
+    started = datetime.utcnow()
+
+    games = []
+    for game_id, title, details in db.session.query(Game.id, Game.title, Game.details):
+        try:
+            parsed_details = json.loads(details or '{}')
+        except ValueError:
+            parsed_details = {}
+        games.append((game_id, game_features(title, parsed_details)))
+
+    neighbours = compute_neighbours(games)
+
+    try:
+        SimilarGame.query.delete()
+        db.session.bulk_insert_mappings(SimilarGame, [
+            {
+                'game_id': game_id,
+                'similar_game_id': other_id,
+                'score': score,
+                'rank': rank,
+                'computed_at': started
+            }
+            for game_id, best in neighbours.items()
+            for rank, (other_id, score) in enumerate(best)
+        ])
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error storing similar games: {e}")
+        return 0
+
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    logger.info(f"Similar games rebuilt for {len(neighbours)} of {len(games)} games in {elapsed:.1f}s")
+    return len(neighbours)
+
+def get_similar_games_sync(game_id: str) -> List[Dict[str, Any]]:
+    """
+    Look up the precomputed neighbours of a game
+
+    Args:
+        game_id: Game to find similar ones for
+
+    Returns:
+        List of similar games (id, name, thumbnail, score and cheapest_price if known)
+    """
+    try:
+        rows = (SimilarGame.query
+                .filter_by(game_id=game_id)
+                .join(SimilarGame.similar_game)
+                .options(contains_eager(SimilarGame.similar_game))
+                .order_by(SimilarGame.rank)
+                .all())
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching similar games: {e}")
+        return []
+
+    results = []
+    for row in rows:
+        game = row.similar_game
+        result = {
+            'id': game.id,
+            'name': game.title,
+            'thumbnail': game.thumbnail,
+            'score': row.score
+        }
+        try:
+            cheapest_price = json.loads(game.details or '{}').get('cheapest_price')
+        except ValueError:
+            cheapest_price = None
+        if cheapest_price:
+            result['cheapest_price'] = cheapest_price
+        results.append(result)
+    return results
+
+async def get_similar_games(game_id: str) -> List[Dict[str, Any]]:
+    """Awaitable lookup of a game's precomputed neighbours (needs an app context)"""
+    return await run_db(get_similar_games_sync, game_id)
@@ -0,0 +1,268 @@
+import logging
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, event, func
+from models import db, User, Game, Subscription, PriceRecord
+from services.session_hooks import after_commit
+from services.config import STATS_TOP_SIZE, STATS_DISCOUNT_MAX_AGE_HOURS
+
+logger = logging.getLogger(__name__)
+
+class RankedSet:
+    """Members ordered by score, highest first (like a Redis sorted set)
+
+    Entries are kept in a sorted list of (-score, member), so ties are broken
+    by member. Setting a score is a binary search plus a list insert, and
+    reading the first N members is a slice, independent of how many
+    members there are.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[float, Hashable]] = []
+        self._scores: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def score(self, member: Hashable) -> float:
+        return self._scores.get(member, 0)
+
+    def set(self, member: Hashable, score: float) -> None:
+        """Set a member's score; a score of zero or less removes it"""
+        self.remove(member)
+        if score > 0:
+            self._scores[member] = score
+            insort(self._entries, (-score, member))
+
+    def incr(self, member: Hashable, amount: float = 1) -> float:
+        """Add to a member's score and return the new score"""
+        score = self.score(member) + amount
+        self.set(member, score)
+        return score
+
+    def remove(self, member: Hashable) -> None:
+        score = self._scores.pop(member, None)
+        if score is not None:
+            del self._entries[bisect_left(self._entries, (-score, member))]
+
+    def top(self, limit: int) -> List[Tuple[Hashable, float]]:
+        """The `limit` highest scored members as (member, score) pairs"""
+        return [(member, -score) for score, member in self._entries[:limit]]
+
+class StatsIndex:
+    """Totals and top-game rankings for the stats views
+
+    Built once from aggregate queries, then kept current from the ORM events
+    of every user, game, subscription and price record this process
+    commits, so the bot and the dashboard read counters and top lists
+    without touching the database. Rows written by other processes (sweep
+    workers) are picked up by the periodic rebuild. All methods are
+    thread-safe.
+
+    A game's current discount is the highest discount among the latest
+    observations of its stores. The price check reports every store's
+    discount, including ones too small to be recorded, so a sale that ended
+    lowers the game's score right away; at rebuild time only records newer
+    than `discount_max_age_hours` count, so sales seen ending elsewhere drop
+    out of the ranking too.
+    """
+
+    def __init__(self, discount_max_age_hours: float = STATS_DISCOUNT_MAX_AGE_HOURS):
+        self.discount_max_age_hours = discount_max_age_hours
+        self._lock = threading.Lock()
+        self._reset()
+        self.loaded = False
+
+    def _reset(self) -> None:
+        self._counts: Dict[str, int] = {'users': 0, 'games': 0, 'subscriptions': 0, 'price_records': 0}
+        self._titles: Dict[str, str] = {}
+        self._store_discounts: Dict[str, Dict[str, int]] = {}
+        self._by_subscribers = RankedSet()
+        self._by_discount = RankedSet()
+        self.built_at: Optional[datetime] = None
+
+    def build(
+        self,
+        users: int,
+        price_records: int,
+        games: Iterable[Tuple[str, str]],
+        subscriber_counts: Iterable[Tuple[str, int]],
+        latest_discounts: Iterable[Tuple[str, str, int]]
+    ) -> None:
+        """
+        Rebuild everything from aggregates
+
+        Args:
+            users: Number of users
+            price_records: Number of price records
+            games: (game_id, title) pairs
+            subscriber_counts: (game_id, subscribers) pairs
+            latest_discounts: (game_id, store_id, discount_percent) of the latest record per store
+        """
+        titles = dict(games)
+        by_subscribers = RankedSet()
+        subscriptions = 0
+        for game_id, count in subscriber_counts:
+            by_subscribers.set(game_id, count)
+            subscriptions += count
+
+        store_discounts: Dict[str, Dict[str, int]] = {}
+        for game_id, store_id, discount in latest_discounts:
+            store_discounts.setdefault(game_id, {})[store_id] = discount or 0
+        by_discount = RankedSet()
+        for game_id, stores in store_discounts.items():
+            by_discount.set(game_id, max(stores.values()))
+
+        with self._lock:
+            self._counts = {
+                'users': users,
+                'games': len(titles),
+                'subscriptions': subscriptions,
+                'price_records': price_records
+            }
+            self._titles = titles
+            self._store_discounts = store_discounts
+            self._by_subscribers = by_subscribers
+            self._by_discount = by_discount
+            self.built_at = datetime.utcnow()
+            self.loaded = True
+
+        logger.info(f"Stats index built: {len(titles)} games, {subscriptions} subscriptions, "
+                    f"{len(by_discount)} games on sale")
+
+    def _count(self, name: str, amount: int) -> None:
+        with self._lock:
+            if self.loaded:
+                self._counts[name] = max(0, self._counts[name] + amount)
+
+    def user_added(self) -> None:
+        self._count('users', 1)
+
+    def game_saved(self, game_id: str, title: str, created: bool) -> None:
+        """Record a new game or a changed title"""
+        with self._lock:
+            if not self.loaded:
+                return
+            if created and game_id not in self._titles:
+                self._counts['games'] += 1
+            self._titles[game_id] = title
+
+    def game_removed(self, game_id: str) -> None:
+        with self._lock:
+            if not self.loaded:
+                return
+            if self._titles.pop(game_id, None) is not None:
+                self._counts['games'] = max(0, self._counts['games'] - 1)
+            self._store_discounts.pop(game_id, None)
+            self._by_subscribers.remove(game_id)
+            self._by_discount.remove(game_id)
+
+    def subscribed(self, game_id: str, amount: int) -> None:
+        """Record a subscription added (1) or removed (-1)"""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._counts['subscriptions'] = max(0, self._counts['subscriptions'] + amount)
+            self._by_subscribers.incr(game_id, amount)
+
+    def _set_discount(self, game_id: str, store_id: str, discount: int) -> None:
+        stores = self._store_discounts.setdefault(game_id, {})
+        stores[store_id] = discount or 0
+        self._by_discount.set(game_id, max(stores.values()))
+
+    def price_recorded(self, game_id: str, store_id: str, discount: int) -> None:
+        """Record a new price record, which becomes the latest one for its store"""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._counts['price_records'] += 1
+            self._set_discount(game_id, store_id, discount)
+
+    def store_discount_observed(self, game_id: str, store_id: str, discount: int) -> None:
+        """Record a store's current discount seen by the price check, whether or not it was stored (0 when the sale ended)"""
+        with self._lock:
+            if self.loaded:
+                self._set_discount(game_id, store_id, discount)
+
+    def _ranked(self, ranking: RankedSet, limit: int) -> List[Dict[str, object]]:
+        return [
+            {'game_id': game_id, 'title': self._titles.get(game_id, game_id), 'score': score}
+            for game_id, score in ranking.top(limit)
+        ]
+
+    def top_subscribed(self, limit: int = STATS_TOP_SIZE) -> List[Dict[str, object]]:
+        """Most tracked games as dicts with game_id, title and score (subscribers)"""
+        with self._lock:
+            return self._ranked(self._by_subscribers, limit)
+
+    def top_discounted(self, limit: int = STATS_TOP_SIZE) -> List[Dict[str, object]]:
+        """Games with the deepest current discount as dicts with game_id, title and score (percent)"""
+        with self._lock:
+            return self._ranked(self._by_discount, limit)
+
+    def snapshot(self) -> Dict[str, object]:
+        """Totals, the number of games on sale and when the index was last rebuilt"""
+        with self._lock:
+            return {
+                **self._counts,
+                'games_on_sale': len(self._by_discount),
+                'tracked_games': len(self._by_subscribers),
+                'built_at': self.built_at.isoformat() if self.built_at else None
+            }
+
+# Shared stats index for the whole process
+stats_index = StatsIndex()
+
+def rebuild_stats() -> None:
+    """Rebuild the stats index with one aggregate query per counter and ranking (needs an app context)"""
+    cutoff = datetime.utcnow() - timedelta(hours=stats_index.discount_max_age_hours)
+    latest = (db.session.query(
+                  PriceRecord.game_id,
+                  PriceRecord.store_id,
+                  func.max(PriceRecord.recorded_at).label('recorded_at'))
+              .filter(PriceRecord.recorded_at >= cutoff)
+              .group_by(PriceRecord.game_id, PriceRecord.store_id)
+              .subquery())
+    latest_discounts = (db.session.query(PriceRecord.game_id, PriceRecord.store_id, PriceRecord.discount_percent)
+                        .join(latest, and_(PriceRecord.game_id == latest.c.game_id,
+                                           PriceRecord.store_id == latest.c.store_id,
+                                           PriceRecord.recorded_at == latest.c.recorded_at))
+                        .all())
+    stats_index.build(
+        users=db.session.query(func.count(User.id)).scalar() or 0,
+        price_records=db.session.query(func.count(PriceRecord.id)).scalar() or 0,
+        games=db.session.query(Game.id, Game.title).all(),
+        subscriber_counts=(db.session.query(Subscription.game_id, func.count(Subscription.id))
+                           .group_by(Subscription.game_id).all()),
+        latest_discounts=latest_discounts
+    )
+
+@event.listens_for(User, 'after_insert')
+def _on_user_added(mapper, connection, target: User) -> None:
+    after_commit(target, stats_index.user_added)
+
+@event.listens_for(Game, 'after_insert')
+def _on_game_added(mapper, connection, target: Game) -> None:
+    after_commit(target, stats_index.game_saved, target.id, target.title, created=True)
+
+@event.listens_for(Game, 'after_update')
+def _on_game_updated(mapper, connection, target: Game) -> None:
+    after_commit(target, stats_index.game_saved, target.id, target.title, created=False)
+
+@event.listens_for(Game, 'after_delete')
+def _on_game_removed(mapper, connection, target: Game) -> None:
+    after_commit(target, stats_index.game_removed, target.id)
+
+@event.listens_for(Subscription, 'after_insert')
+def _on_subscribed(mapper, connection, target: Subscription) -> None:
+    after_commit(target, stats_index.subscribed, target.game_id, 1)
+
+@event.listens_for(Subscription, 'after_delete')
+def _on_unsubscribed(mapper, connection, target: Subscription) -> None:
+    after_commit(target, stats_index.subscribed, target.game_id, -1)
+
+@event.listens_for(PriceRecord, 'after_insert')
+def _on_price_recorded(mapper, connection, target: PriceRecord) -> None:
+    after_commit(target, stats_index.price_recorded, target.game_id, target.store_id, target.discount_percent)
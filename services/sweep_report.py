@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import logging
+import statistics
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, SweepRun
+from services.metrics import SWEEP_PHASE_SECONDS
+from services.config import SWEEP_REPORTS_KEPT, SWEEP_REPORT_SLOWEST_GAMES, PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Report of the sweep running in the current task, if any
+_current_report: ContextVar[Optional['SweepReport']] = ContextVar('sweep_report', default=None)
+
+# Set by the admin trigger; the next sweep consumes it and runs under the profiler
+_profile_requested = threading.Event()
+
+class SweepReport:
+    """Timing breakdown of one price sweep by phase and by game"""
+
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self.duration = 0.0
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.games: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str, game_id: Optional[str] = None) -> Iterator[None]:
+        """Time the with-block as one call of a phase, attributed to a game if given"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, game_id)
+
+    def add(self, name: str, seconds: float, game_id: Optional[str] = None) -> None:
+        """Record one call of a phase"""
+        SWEEP_PHASE_SECONDS.observe(seconds, phase=name)
+        totals = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        totals['seconds'] += seconds
+        totals['calls'] += 1
+        if game_id is not None:
+            game = self.games.setdefault(game_id, {})
+            game[name] = game.get(name, 0.0) + seconds
+
+    def merge(self, phases: Dict[str, Dict[str, float]], games: Dict[str, Dict[str, float]]) -> None:
+        """Add the phase and per-game times of a report made elsewhere (a sweep worker's shard)"""
+        for name, totals in phases.items():
+            merged = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            merged['seconds'] += totals['seconds']
+            merged['calls'] += totals['calls']
+        for game_id, game_phases in games.items():
+            game = self.games.setdefault(game_id, {})
+            for name, seconds in game_phases.items():
+                game[name] = game.get(name, 0.0) + seconds
+
+    def finish(self) -> None:
+        """Stop the sweep clock"""
+        self.duration = time.perf_counter() - self._started
+
+    def slowest_games(self, limit: int = SWEEP_REPORT_SLOWEST_GAMES) -> List[Dict[str, Any]]:
+        """Games that took the longest, with their per-phase times"""
+        totals = sorted(((sum(phases.values()), game_id) for game_id, phases in self.games.items()), reverse=True)
+        return [
+            {'game_id': game_id, 'seconds': seconds, 'phases': self.games[game_id]}
+            for seconds, game_id in totals[:limit]
+        ]
+
+    def median_game_seconds(self) -> float:
+        """Median time spent per game, the baseline the slowest games compare against"""
+        if not self.games:
+            return 0.0
+        return statistics.median(sum(phases.values()) for phases in self.games.values())
+
+    def save(self, outcome: str, price_drops: int, profile_file: Optional[str] = None) -> Optional[SweepRun]:
+        """
+        Persist the report and drop the oldest ones beyond SWEEP_REPORTS_KEPT (needs an app context)
+
+        Args:
+            outcome: How the sweep ended ('completed', 'failed', ...)
+            price_drops: Number of games with a price drop
+            profile_file: Name of the saved profile in PROFILE_DIR, if any
+
+        Returns:
+            The stored SweepRun, or None on a database error
+        """
+        run = SweepRun(
+            started_at=self.started_at,
+            duration_seconds=self.duration,
+            outcome=outcome,
+            games_checked=len(self.games),
+            price_drops=price_drops,
+            median_game_seconds=self.median_game_seconds(),
+            phases=json.dumps(self.phases),
+            slowest_games=json.dumps(self.slowest_games()),
+            profile_file=profile_file
+        )
+        try:
+            db.session.add(run)
+            db.session.flush()
+            expired = (SweepRun.query
+                       .order_by(SweepRun.started_at.desc())
+                       .offset(SWEEP_REPORTS_KEPT)
+                       .all())
+            for old_run in expired:
+                _remove_profile(old_run.profile_file)
+                db.session.delete(old_run)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Database error saving sweep report: {e}")
+            return None
+
+        logger.info(f"Sweep {outcome} in {self.duration:.1f}s: {len(self.games)} games, {price_drops} price drops, "
+                    + ', '.join(f"{name}={totals['seconds']:.1f}s" for name, totals in self.phases.items()))
+        return run
+
+    def activate(self):
+        """Make this the report of the current task; returns a token for deactivate"""
+        return _current_report.set(self)
+
+    @staticmethod
+    def deactivate(token) -> None:
+        _current_report.reset(token)
+
+@contextmanager
+def sweep_phase(name: str, game_id: Optional[str] = None) -> Iterator[None]:
+    """
+    Time a phase of the sweep
+
+    Recorded in the sweep_phase_seconds metric and, when a sweep report is
+    active in the current task, in that report.
+
+    Args:
+        name: Phase name
+        game_id: Game the work is for, to find per-game outliers
+    """
+    report = _current_report.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        if report is not None:
+            report.add(name, seconds, game_id)
+        else:
+            SWEEP_PHASE_SECONDS.observe(seconds, phase=name)
+
+def request_profile() -> None:
+    """Run the next sweep under the sampling profiler"""
+    _profile_requested.set()
+
+def profile_requested() -> bool:
+    """Whether the next sweep will be profiled"""
+    return _profile_requested.is_set()
+
+def take_profile_request() -> bool:
+    """Consume a pending profile request"""
+    if _profile_requested.is_set():
+        _profile_requested.clear()
+        return True
+    return False
+
+def profile_path(profile_file: str) -> str:
+    """Absolute path of a saved profile"""
+    return os.path.abspath(os.path.join(PROFILE_DIR, os.path.basename(profile_file)))
+
+def _remove_profile(profile_file: Optional[str]) -> None:
+    if not profile_file:
+        return
+    try:
+        os.remove(profile_path(profile_file))
+    except OSError:
+        pass
+
+def get_sweep_runs(limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Get the most recent sweep reports (needs an app context)
+
+    Args:
+        limit: Maximum number of reports
+
+    Returns:
+        List of reports, newest first, with phases sorted by total time
+    """
+    try:
+        runs = SweepRun.query.order_by(SweepRun.started_at.desc()).limit(limit).all()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching sweep reports: {e}")
+        return []
+
+    reports = []
+    for run in runs:
+        phases = json.loads(run.phases or '{}')
+        reports.append({
+            'id': run.id,
+            'started_at': run.started_at,
+            'duration_seconds': run.duration_seconds,
+            'outcome': run.outcome,
+            'games_checked': run.games_checked,
+            'price_drops': run.price_drops,
+            'phases': sorted(phases.items(), key=lambda item: item[1]['seconds'], reverse=True),
+            'median_game_seconds': run.median_game_seconds,
+            'slowest_games': json.loads(run.slowest_games or '[]'),
+            'profile_file': run.profile_file
+        })
+    return reports
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, SweepWorker, ShardedSweep, SweepShard, PendingPriceDrop
+from data.data_manager import get_all_subscriptions
+from services.hash_ring import HashRing
+from services.price_tracker import check_price_updates
+from services.sweep_report import SweepReport
+from services.upstream import governor
+from services.config import (
+    WORKER_HEARTBEAT_SECONDS, WORKER_TIMEOUT_SECONDS, WORKER_POLL_SECONDS, SWEEP_SHARD_TIMEOUT_SECONDS,
+    SWEEP_REPORTS_KEPT
+)
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATES = ('pending', 'running')
+
+def budget_share(workers: int) -> float:
+    """Share of the CheapShark budget for each process: the workers and the coordinator, which keeps serving the bot"""
+    return 1.0 / (max(0, workers) + 1)
+
+def new_worker_id() -> str:
+    """Unique worker name: hostname, process ID and a random suffix"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# Worker registry (all functions below need an app context)
+
+def heartbeat(worker_id: str) -> bool:
+    """
+    Mark a worker as alive, registering it if it is not (yet, or any more) registered
+
+    Returns:
+        False on a database error
+    """
+    now = datetime.utcnow()
+    try:
+        updated = SweepWorker.query.filter_by(id=worker_id).update({'heartbeat_at': now})
+        if not updated:
+            db.session.add(SweepWorker(id=worker_id, hostname=socket.gethostname(), started_at=now, heartbeat_at=now))
+            logger.info(f"Sweep worker {worker_id} registered")
+        db.session.commit()
+        return True
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error recording heartbeat of {worker_id}: {e}")
+        return False
+
+def unregister_worker(worker_id: str) -> None:
+    """Remove a worker that is shutting down, so its shards are reassigned right away"""
+    try:
+        SweepWorker.query.filter_by(id=worker_id).delete()
+        db.session.commit()
+        logger.info(f"Sweep worker {worker_id} unregistered")
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error unregistering {worker_id}: {e}")
+
+def live_workers() -> List[str]:
+    """IDs of workers that sent a heartbeat within WORKER_TIMEOUT_SECONDS"""
+    cutoff = datetime.utcnow() - timedelta(seconds=WORKER_TIMEOUT_SECONDS)
+    try:
+        return [worker.id for worker in SweepWorker.query.filter(SweepWorker.heartbeat_at >= cutoff).all()]
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error listing sweep workers: {e}")
+        return []
+
+def _prune_workers() -> None:
+    """Forget workers that stopped heartbeating (they re-register if they come back)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=WORKER_TIMEOUT_SECONDS)
+    SweepWorker.query.filter(SweepWorker.heartbeat_at < cutoff).delete()
+
+# Coordinator side
+
+def _assign(sweep_id: int, game_ids: List[str], workers: List[str]) -> None:
+    """Split games between workers by consistent hashing and add a shard per worker (caller commits)"""
+    for worker_id, games in HashRing(workers).assign(game_ids).items():
+        if games:
+            db.session.add(SweepShard(sweep_id=sweep_id, worker_id=worker_id, game_ids=json.dumps(games)))
+
+def _drain_price_drops(sweep_id: int) -> Dict[str, Dict[str, Any]]:
+    """Take the price drops the workers found in a sweep off the pending table (caller commits)"""
+    rows = PendingPriceDrop.query.filter_by(sweep_id=sweep_id).all()
+    price_drops = {row.game_id: json.loads(row.payload) for row in rows}
+    PendingPriceDrop.query.filter_by(sweep_id=sweep_id).delete()
+    return price_drops
+
+def _finish_sweep(sweep: ShardedSweep) -> None:
+    """Mark the sweep completed, drop its shards and prune old sweeps (caller commits)"""
+    sweep.status = 'completed'
+    sweep.finished_at = datetime.utcnow()
+    SweepShard.query.filter_by(sweep_id=sweep.id).delete()
+    expired = (ShardedSweep.query
+               .order_by(ShardedSweep.started_at.desc())
+               .offset(SWEEP_REPORTS_KEPT)
+               .all())
+    for old_sweep in expired:
+        PendingPriceDrop.query.filter_by(sweep_id=old_sweep.id).delete()
+        SweepShard.query.filter_by(sweep_id=old_sweep.id).delete()
+        db.session.delete(old_sweep)
+
+async def check_prices_sharded(report: Optional[SweepReport] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Check prices across the live sweep workers, or in this process if there are none
+
+    Subscribed games are split between the workers by consistent hashing of
+    game_id, so a worker joining or leaving moves only its share of games. When
+    a worker stops heartbeating mid-sweep its open shard is split between the
+    remaining workers; games nobody could check (no workers left, failed
+    shards, SWEEP_SHARD_TIMEOUT_SECONDS passed) are checked here. Price drops
+    the workers found are collected from the pending table and returned
+    together, for one notification pass. Needs an app context.
+
+    Args:
+        report: Sweep report to merge the workers' phase timings into
+
+    Returns:
+        Price drops in the format of check_price_updates
+    """
+    try:
+        _prune_workers()
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error pruning sweep workers: {e}")
+
+    workers = live_workers()
+    governor.set_share(budget_share(len(workers)))
+    if not workers:
+        return await check_price_updates()
+
+    game_ids = list(get_all_subscriptions())
+    sweep = ShardedSweep()
+    db.session.add(sweep)
+    db.session.flush()
+    _assign(sweep.id, game_ids, workers)
+    db.session.commit()
+    logger.info(f"Sharded sweep {sweep.id}: {len(game_ids)} games across {len(workers)} workers")
+
+    deadline = time.monotonic() + SWEEP_SHARD_TIMEOUT_SECONDS
+    leftover: List[str] = []
+    while True:
+        await asyncio.sleep(WORKER_POLL_SECONDS)
+        # End the previous read transaction so the workers' updates are visible
+        db.session.commit()
+        open_shards = SweepShard.query.filter(
+            SweepShard.sweep_id == sweep.id, SweepShard.status.in_(OPEN_STATES)).all()
+        if not open_shards:
+            break
+
+        timed_out = time.monotonic() > deadline
+        alive = [] if timed_out else live_workers()
+        orphaned = [shard for shard in open_shards if shard.worker_id not in alive]
+        if not orphaned:
+            continue
+
+        games = []
+        for shard in orphaned:
+            shard.status = 'reassigned'
+            games.extend(json.loads(shard.game_ids))
+        if alive:
+            _assign(sweep.id, games, alive)
+            logger.warning(f"Sharded sweep {sweep.id}: {len(orphaned)} workers gone, "
+                           f"{len(games)} games moved to {len(alive)} others")
+        else:
+            leftover.extend(games)
+            logger.warning(f"Sharded sweep {sweep.id}: "
+                           + ("timed out" if timed_out else "no workers left")
+                           + f", checking {len(games)} games here")
+        db.session.commit()
+        if not alive:
+            break
+
+    for shard in SweepShard.query.filter_by(sweep_id=sweep.id, status='failed').all():
+        logger.warning(f"Shard of {shard.worker_id} failed ({shard.error}), checking its games here")
+        leftover.extend(json.loads(shard.game_ids))
+
+    price_drops = await check_price_updates(leftover) if leftover else {}
+
+    if report is not None:
+        for shard in SweepShard.query.filter_by(sweep_id=sweep.id, status='done').all():
+            shard_report = json.loads(shard.report or '{}')
+            report.merge(shard_report.get('phases', {}), shard_report.get('games', {}))
+
+    try:
+        price_drops.update(_drain_price_drops(sweep.id))
+        _finish_sweep(sweep)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error collecting sharded sweep {sweep.id}: {e}")
+    return price_drops
+
+# Worker side
+
+def _claim_shard(worker_id: str) -> Optional[SweepShard]:
+    """Take the worker's oldest pending shard, if any"""
+    shard = (SweepShard.query
+             .filter_by(worker_id=worker_id, status='pending')
+             .order_by(SweepShard.id)
+             .first())
+    if shard is None:
+        db.session.commit()
+        return None
+    claimed = (SweepShard.query
+               .filter_by(id=shard.id, status='pending')
+               .update({'status': 'running', 'started_at': datetime.utcnow()}))
+    db.session.commit()
+    return shard if claimed else None
+
+def _complete_shard(shard_id: int, sweep_id: int, price_drops: Dict[str, Dict[str, Any]],
+                    report: SweepReport) -> bool:
+    """
+    Store a shard's price drops and mark it done, in one transaction
+
+    Returns:
+        False if the shard was reassigned meanwhile; its results are dropped
+        so no price drop is reported twice
+    """
+    done = (SweepShard.query
+            .filter_by(id=shard_id, status='running')
+            .update({
+                'status': 'done',
+                'price_drops': len(price_drops),
+                'report': json.dumps({'phases': report.phases, 'games': report.games}),
+                'finished_at': datetime.utcnow()
+            }))
+    if not done:
+        db.session.rollback()
+        return False
+    for game_id, drop in price_drops.items():
+        db.session.add(PendingPriceDrop(sweep_id=sweep_id, game_id=game_id, payload=json.dumps(drop)))
+    db.session.commit()
+    return True
+
+def _fail_shard(shard_id: int, error: Exception) -> None:
+    SweepShard.query.filter_by(id=shard_id, status='running').update({
+        'status': 'failed',
+        'error': str(error)[:1000],
+        'finished_at': datetime.utcnow()
+    })
+    db.session.commit()
+
+async def _check_shard(flask_app, game_ids: List[str], report: SweepReport) -> Dict[str, Dict[str, Any]]:
+    token = report.activate()
+    try:
+        with flask_app.app_context():
+            return await check_price_updates(game_ids)
+    finally:
+        report.deactivate(token)
+        report.finish()
+
+def _run_shard(flask_app, shard: SweepShard) -> None:
+    """Check a claimed shard's games and hand the results to the coordinator (needs an app context)"""
+    game_ids = json.loads(shard.game_ids)
+    # The workers and the coordinator share one CheapShark budget
+    governor.set_share(budget_share(len(live_workers())))
+    logger.info(f"Checking {len(game_ids)} games of sharded sweep {shard.sweep_id}")
+
+    report = SweepReport()
+    try:
+        price_drops = asyncio.run(_check_shard(flask_app, game_ids, report))
+    except Exception as e:
+        logger.error(f"Error checking shard of sweep {shard.sweep_id}: {e}")
+        _fail_shard(shard.id, e)
+        return
+
+    if _complete_shard(shard.id, shard.sweep_id, price_drops, report):
+        logger.info(f"Shard of sweep {shard.sweep_id} done in {report.duration:.1f}s: "
+                    f"{len(game_ids)} games, {len(price_drops)} price drops")
+    else:
+        logger.warning(f"Shard of sweep {shard.sweep_id} was reassigned while running, results dropped")
+
+def _heartbeat_loop(flask_app, worker_id: str, stop: threading.Event) -> None:
+    while not stop.wait(WORKER_HEARTBEAT_SECONDS):
+        with flask_app.app_context():
+            heartbeat(worker_id)
+
+def run_worker(flask_app, worker_id: Optional[str] = None, stop: Optional[threading.Event] = None) -> None:
+    """
+    Run a sweep worker until `stop` is set
+
+    Registers the worker, keeps its heartbeat going in a background thread
+    and checks the shards the coordinator assigns to it.
+
+    Args:
+        flask_app: Flask application instance for database access
+        worker_id: Worker name (generated if None)
+        stop: Event ending the loop (e.g. set from a signal handler)
+    """
+    worker_id = worker_id or new_worker_id()
+    stop = stop or threading.Event()
+
+    with flask_app.app_context():
+        heartbeat(worker_id)
+    heartbeat_thread = threading.Thread(
+        target=_heartbeat_loop, args=(flask_app, worker_id, stop), name='worker-heartbeat', daemon=True)
+    heartbeat_thread.start()
+    logger.info(f"Sweep worker {worker_id} started")
+
+    try:
+        while not stop.is_set():
+            with flask_app.app_context():
+                try:
+                    shard = _claim_shard(worker_id)
+                    if shard is not None:
+                        _run_shard(flask_app, shard)
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    logger.error(f"Database error in sweep worker {worker_id}: {e}")
+                    shard = None
+            if shard is None:
+                stop.wait(WORKER_POLL_SECONDS)
+    finally:
+        stop.set()
+        with flask_app.app_context():
+            unregister_worker(worker_id)
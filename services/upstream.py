@@ -0,0 +1,637 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+import aiohttp
+from services.metrics import (
+    upstream_endpoint, UPSTREAM_WAIT_SECONDS, UPSTREAM_REJECTED, UPSTREAM_QUEUE_DEPTH,
+    UPSTREAM_RETRIES, UPSTREAM_HEDGES
+)
+from services.config import (
+    UPSTREAM_MAX_RATE, UPSTREAM_MIN_RATE, UPSTREAM_BURST, UPSTREAM_RATE_STEP, UPSTREAM_MAX_WAIT,
+    UPSTREAM_BREAKER_THRESHOLD, UPSTREAM_BREAKER_COOLDOWN, UPSTREAM_ENDPOINT_BUDGETS,
+    UPSTREAM_INTERACTIVE_RESERVE, UPSTREAM_STARVATION_SECONDS, UPSTREAM_RETRY_ATTEMPTS,
+    UPSTREAM_RETRY_BASE_DELAY, UPSTREAM_RETRY_MAX_DELAY, UPSTREAM_HEDGE_BUDGET, UPSTREAM_HEDGE_MIN_SAMPLES
+)
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first. Requests made while handling a bot update are
+# interactive; everything else (sweeps, snapshot refreshes, prefetching) is background.
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+_current_priority: ContextVar[str] = ContextVar('upstream_priority', default=BACKGROUND)
+
+def current_priority() -> str:
+    """Priority class of CheapShark requests made from the current task"""
+    return _current_priority.get()
+
+def set_priority(priority: str):
+    """Set the priority class for the current task; returns a token for reset_priority"""
+    return _current_priority.set(priority)
+
+def reset_priority(token) -> None:
+    _current_priority.reset(token)
+
+@contextmanager
+def upstream_priority(priority: str) -> Iterator[None]:
+    """Make CheapShark requests in the with-block with the given priority class"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+class UpstreamError(Exception):
+    """A CheapShark request was not sent"""
+
+class CircuitOpenError(UpstreamError):
+    """CheapShark is failing and requests are not being sent until it recovers"""
+
+class RateLimitedError(UpstreamError):
+    """A request waited longer than UPSTREAM_MAX_WAIT for its turn"""
+
+class TokenBucket:
+    """Token bucket refilled continuously at a (changeable) rate
+
+    Not thread-safe by itself; the governor holds a lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def available(self, now: float) -> float:
+        """Refill up to now and return the tokens available (negative while blocked)"""
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens if now >= self.updated else min(self.tokens, 0.0)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def time_until(self, tokens: float, now: float) -> float:
+        """Seconds until the given number of tokens is available"""
+        missing = tokens - self.available(now)
+        return max(0.0, self.updated - now) + max(0.0, missing) / self.rate
+
+    def block_until(self, until: float) -> None:
+        """Hand out no tokens before the given time"""
+        if until > self.updated:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = until
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through per cooldown
+
+    States: closed (requests flow), open (requests fail fast) and half-open
+    (one probe request is in flight; its outcome closes or re-opens the circuit).
+    Not thread-safe by itself; the governor holds a lock.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self, now: float) -> bool:
+        """Whether a request may be sent now"""
+        if self.state == 'closed':
+            return True
+        if now - self.opened_at < self.cooldown:
+            return False
+        # Cooldown over (or the previous probe never reported back): send one probe
+        self.state = 'half_open'
+        self.opened_at = now
+        return True
+
+    def success(self) -> bool:
+        """Record a healthy response; True if this closed the circuit"""
+        self.failures = 0
+        if self.state != 'closed':
+            self.state = 'closed'
+            return True
+        return False
+
+    def failure(self, now: float) -> bool:
+        """Record a failed request; True if this opened the circuit"""
+        self.failures += 1
+        if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+            self.state = 'open'
+            self.opened_at = now
+            return True
+        return False
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delay in seconds or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class _Waiter:
+    """A request queued for admission"""
+
+    __slots__ = ('loop', 'future', 'endpoint', 'priority', 'enqueued_at', 'abandoned')
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, endpoint: str, priority: str, now: float):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.endpoint = endpoint
+        self.priority = priority
+        self.enqueued_at = now
+        self.abandoned = False
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+class UpstreamGovernor:
+    """Shared admission control for CheapShark requests
+
+    - A global token bucket paces requests. Its rate adapts AIMD-style: every
+      successful response raises it by UPSTREAM_RATE_STEP up to UPSTREAM_MAX_RATE,
+      every 429 halves it (down to UPSTREAM_MIN_RATE) and pauses all requests
+      for the Retry-After delay.
+    - A circuit breaker stops requests after UPSTREAM_BREAKER_THRESHOLD
+      consecutive 5xx responses or network errors and probes for recovery
+      every UPSTREAM_BREAKER_COOLDOWN seconds.
+    - Endpoints with a budget (requests per minute) get a bucket of their own,
+      so e.g. bulk deals refreshes cannot use up the capacity for lookups.
+    - Requests are admitted by priority class. Interactive requests always go
+      first; background requests only get tokens beyond
+      UPSTREAM_INTERACTIVE_RESERVE, so a tap arriving mid-sweep finds a token
+      waiting. Within a class requests are served in arrival order, and a
+      background request waiting longer than UPSTREAM_STARVATION_SECONDS
+      competes with interactive ones by arrival time so it cannot starve.
+
+    Requests that can go right away never queue. Queued requests are granted
+    by a dispatcher thread that wakes each waiter on its own event loop, so the
+    bot thread, the scheduler and web requests share one governor.
+    """
+
+    def __init__(
+        self,
+        max_rate: float = UPSTREAM_MAX_RATE,
+        min_rate: float = UPSTREAM_MIN_RATE,
+        burst: float = UPSTREAM_BURST,
+        rate_step: float = UPSTREAM_RATE_STEP,
+        max_wait: float = UPSTREAM_MAX_WAIT,
+        breaker_threshold: int = UPSTREAM_BREAKER_THRESHOLD,
+        breaker_cooldown: float = UPSTREAM_BREAKER_COOLDOWN,
+        endpoint_budgets: Optional[Dict[str, float]] = None,
+        interactive_reserve: float = UPSTREAM_INTERACTIVE_RESERVE,
+        starvation_seconds: float = UPSTREAM_STARVATION_SECONDS
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate_step = rate_step
+        self.max_wait = max_wait
+        self.interactive_reserve = min(interactive_reserve, max(0.0, burst - 1))
+        self.starvation_seconds = starvation_seconds
+        self.bucket = TokenBucket(max_rate, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        budgets = UPSTREAM_ENDPOINT_BUDGETS if endpoint_budgets is None else endpoint_budgets
+        self._limits = (max_rate, min_rate, dict(budgets))
+        self.endpoint_buckets = {
+            endpoint: TokenBucket(per_minute / 60.0, max(1.0, per_minute / 6.0))
+            for endpoint, per_minute in budgets.items()
+        }
+        self._queues: Dict[str, Deque[_Waiter]] = {priority: deque() for priority in PRIORITIES}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def _tokens_needed(self, priority: str, aged: bool = False) -> float:
+        return 1.0 if priority == INTERACTIVE or aged else 1.0 + self.interactive_reserve
+
+    def _try_take(self, endpoint: str, priority: str, now: float, aged: bool = False) -> bool:
+        """Take a global and an endpoint token if both are available; caller must hold the lock"""
+        if self.bucket.available(now) < self._tokens_needed(priority, aged):
+            return False
+        endpoint_bucket = self.endpoint_buckets.get(endpoint)
+        if endpoint_bucket is not None and endpoint_bucket.available(now) < 1.0:
+            return False
+        self.bucket.take()
+        if endpoint_bucket is not None:
+            endpoint_bucket.take()
+        return True
+
+    def _has_waiters_ahead(self, priority: str) -> bool:
+        """Whether requests of this or a higher class are already queued; caller must hold the lock"""
+        for queued_priority in PRIORITIES:
+            if self._queues[queued_priority]:
+                return True
+            if queued_priority == priority:
+                return False
+        return False
+
+    async def acquire(self, endpoint: str, priority: Optional[str] = None) -> None:
+        """
+        Wait for permission to send one request
+
+        Args:
+            endpoint: Endpoint name from upstream_endpoint
+            priority: Priority class; defaults to the current task's (see upstream_priority)
+
+        Raises:
+            CircuitOpenError: The circuit breaker is open
+            RateLimitedError: The request waited longer than max_wait
+        """
+        priority = priority or current_priority()
+        now = time.monotonic()
+        with self._lock:
+            if not self.breaker.allow(now):
+                UPSTREAM_REJECTED.inc(endpoint=endpoint, reason='circuit_open')
+                raise CircuitOpenError(f"CheapShark circuit open, not calling {endpoint}")
+
+            if not self._has_waiters_ahead(priority) and self._try_take(endpoint, priority, now):
+                UPSTREAM_WAIT_SECONDS.observe(0.0, priority=priority, endpoint=endpoint)
+                return
+
+            waiter = _Waiter(asyncio.get_running_loop(), endpoint, priority, now)
+            self._queues[priority].append(waiter)
+            UPSTREAM_QUEUE_DEPTH.set(len(self._queues[priority]), priority=priority)
+            self._ensure_dispatcher()
+            self._wakeup.notify()
+
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except asyncio.TimeoutError:
+            UPSTREAM_REJECTED.inc(endpoint=endpoint, reason='rate_limited')
+            raise RateLimitedError(f"{endpoint} waited over {self.max_wait:.0f}s for a CheapShark request slot")
+        finally:
+            if not waiter.future.done() or waiter.future.cancelled():
+                with self._lock:
+                    waiter.abandoned = True
+            UPSTREAM_WAIT_SECONDS.observe(time.monotonic() - now, priority=priority, endpoint=endpoint)
+
+    def _ensure_dispatcher(self) -> None:
+        """Start the dispatcher thread on first use; caller must hold the lock"""
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name='upstream-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _candidates(self, now: float) -> List[_Waiter]:
+        """Queued requests in admission order; caller must hold the lock"""
+        aged_before = now - self.starvation_seconds
+        background = self._queues[BACKGROUND]
+        aged = [waiter for waiter in background if waiter.enqueued_at <= aged_before]
+        # Background requests are queued in arrival order, so the aged ones are a prefix
+        rest = list(background)[len(aged):]
+        first = sorted(list(self._queues[INTERACTIVE]) + aged, key=lambda waiter: waiter.enqueued_at)
+        return first + rest
+
+    def _grant_ready(self, now: float) -> Optional[float]:
+        """
+        Admit every queued request that can go now; caller must hold the lock
+
+        Returns:
+            Seconds until the next request could be admitted, or None if none are queued
+        """
+        aged_before = now - self.starvation_seconds
+        next_wait = None
+        for waiter in self._candidates(now):
+            queue = self._queues[waiter.priority]
+            if waiter.abandoned:
+                queue.remove(waiter)
+                continue
+
+            aged = waiter.priority == BACKGROUND and waiter.enqueued_at <= aged_before
+            if self._try_take(waiter.endpoint, waiter.priority, now, aged):
+                queue.remove(waiter)
+                try:
+                    waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+                except RuntimeError:
+                    # The waiter's loop is closed; nobody is waiting any more
+                    pass
+                continue
+
+            needed = self._tokens_needed(waiter.priority, aged)
+            wait = self.bucket.time_until(needed, now)
+            endpoint_bucket = self.endpoint_buckets.get(waiter.endpoint)
+            if endpoint_bucket is not None:
+                wait = max(wait, endpoint_bucket.time_until(1.0, now))
+            next_wait = wait if next_wait is None else min(next_wait, wait)
+
+            if self.bucket.available(now) < 1.0:
+                # Nobody can go until the global bucket refills
+                break
+
+        for priority in PRIORITIES:
+            UPSTREAM_QUEUE_DEPTH.set(len(self._queues[priority]), priority=priority)
+        if next_wait is None and any(self._queues.values()):
+            next_wait = 0.0
+        return next_wait
+
+    def _dispatch(self) -> None:
+        """Dispatcher thread: admit queued requests as tokens become available"""
+        with self._wakeup:
+            while True:
+                wait = self._grant_ready(time.monotonic())
+                # Sleep until the next token, or until a new request is queued
+                self._wakeup.wait(timeout=None if wait is None else max(wait, 0.001))
+
+    def set_share(self, share: float) -> None:
+        """
+        Scale the rate limits to a share of the configured ones
+
+        For processes splitting one CheapShark budget, e.g. sweep workers each
+        taking 1/N of it.
+        """
+        max_rate, min_rate, budgets = self._limits
+        with self._lock:
+            self.max_rate = max_rate * share
+            self.min_rate = min(min_rate, self.max_rate)
+            self.bucket.rate = min(self.bucket.rate, self.max_rate)
+            for endpoint, bucket in self.endpoint_buckets.items():
+                bucket.rate = budgets[endpoint] / 60.0 * share
+            self._wakeup.notify()
+
+    def queue_lengths(self) -> Dict[str, int]:
+        """Number of queued requests per priority class"""
+        with self._lock:
+            return {priority: len(queue) for priority, queue in self._queues.items()}
+
+    def record_response(self, endpoint: str, status: int, retry_after: Optional[str] = None) -> None:
+        """Adapt to a response: slow down on 429, count 5xx as failures"""
+        now = time.monotonic()
+        with self._lock:
+            if status == 429:
+                self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+                delay = parse_retry_after(retry_after)
+                self.bucket.block_until(now + (delay if delay is not None else 1.0 / self.bucket.rate))
+                logger.warning(f"CheapShark throttled {endpoint}; rate lowered to {self.bucket.rate:.2f}/s"
+                               + (f", pausing {delay:.1f}s" if delay else ""))
+            elif status >= 500:
+                self._failure(endpoint, now, f"HTTP {status}")
+            else:
+                if self.breaker.success():
+                    logger.info("CheapShark circuit closed, requests resumed")
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.rate_step)
+
+    def record_error(self, endpoint: str, error: BaseException) -> None:
+        """Count a network error or timeout as a failure"""
+        with self._lock:
+            self._failure(endpoint, time.monotonic(), type(error).__name__)
+
+    def _failure(self, endpoint: str, now: float, reason: str) -> None:
+        """Record a failure; caller must hold the lock"""
+        if self.breaker.failure(now):
+            logger.error(f"CheapShark circuit opened after {self.breaker.failures} failures "
+                         f"(last: {reason} on {endpoint}); probing again in {self.breaker.cooldown:.0f}s")
+
+# Shared by every CheapShark call in the process
+governor = UpstreamGovernor()
+
+@asynccontextmanager
+async def upstream_get(
+    session: aiohttp.ClientSession,
+    url: str,
+    timeout: Optional[float] = None
+) -> AsyncIterator[aiohttp.ClientResponse]:
+    """
+    Send a CheapShark GET request through the governor
+
+    Use in place of session.get; the response is released on exit.
+
+    Args:
+        session: The aiohttp session to use
+        url: Request URL
+        timeout: Seconds the request, including reading the body, may take (session default if None)
+
+    Raises:
+        CircuitOpenError, RateLimitedError: The request was not sent
+        aiohttp.ClientError, asyncio.TimeoutError: The request failed
+    """
+    endpoint = upstream_endpoint(url)
+    await governor.acquire(endpoint)
+    async with _send_get(session, url, endpoint, timeout) as response:
+        yield response
+
+@asynccontextmanager
+async def _send_get(
+    session: aiohttp.ClientSession,
+    url: str,
+    endpoint: str,
+    timeout: Optional[float]
+) -> AsyncIterator[aiohttp.ClientResponse]:
+    """Send a GET the governor has already admitted and report the outcome to it"""
+    try:
+        if timeout is None:
+            response = await session.get(url)
+        else:
+            response = await session.get(url, timeout=aiohttp.ClientTimeout(total=timeout))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        governor.record_error(endpoint, e)
+        raise
+
+    try:
+        governor.record_response(endpoint, response.status, response.headers.get('Retry-After'))
+        yield response
+    finally:
+        response.release()
+
+class LatencyTracker:
+    """Recent successful request latencies per endpoint, for picking hedge delays"""
+
+    def __init__(self, window: int = 200, min_samples: int = UPSTREAM_HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, endpoint: str, q: float) -> Optional[float]:
+        """Latency quantile for the endpoint, or None until there are min_samples samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class HedgeBudget:
+    """Caps hedged requests at a share of all lookups
+
+    Every lookup earns `ratio` of a hedge and every hedge spends one, so over
+    time hedges add at most `ratio` extra load; `burst` limits how many can be
+    saved up while CheapShark is fast.
+    """
+
+    def __init__(self, ratio: float = UPSTREAM_HEDGE_BUDGET, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.credit = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.credit = min(self.burst, self.credit + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.credit < 1.0:
+                return False
+            self.credit -= 1.0
+            return True
+
+latencies = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+async def _get_json_once(session: aiohttp.ClientSession, url: str, endpoint: str,
+                         timeout: Optional[float], admitted: Optional[asyncio.Event] = None) -> Tuple[int, Any]:
+    """
+    One GET request through the governor; returns the status and the decoded body (None unless 200)
+
+    The latency is measured from admission, so time spent queued in the
+    governor does not count. `admitted` is set once the governor lets the
+    request through.
+    """
+    await governor.acquire(endpoint)
+    if admitted is not None:
+        admitted.set()
+    started = time.perf_counter()
+    async with _send_get(session, url, endpoint, timeout) as response:
+        if response.status != 200:
+            return response.status, None
+        data = await response.json(content_type=None)
+    latencies.record(endpoint, time.perf_counter() - started)
+    return 200, data
+
+async def _get_json_hedged(session: aiohttp.ClientSession, url: str, endpoint: str,
+                           timeout: Optional[float], hedge: bool) -> Tuple[int, Any]:
+    """
+    GET with an optional hedge: if the request is slower than the endpoint's
+    p95, a second one is sent (budget permitting) and the first good answer wins
+
+    The hedge delay runs from the primary's admission by the governor: while
+    the primary is still queued, a hedge would only queue behind it.
+    """
+    hedge_budget.deposit()
+    delay = latencies.quantile(endpoint, 0.95) if hedge and hedge_budget.ratio > 0 else None
+    admitted = asyncio.Event()
+    primary = asyncio.ensure_future(_get_json_once(session, url, endpoint, timeout, admitted))
+    if delay is None:
+        return await primary
+
+    admission = asyncio.ensure_future(admitted.wait())
+    try:
+        await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+        if not primary.done():
+            await asyncio.wait({primary}, timeout=delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    finally:
+        admission.cancel()
+    if primary.done():
+        return primary.result()
+    if not hedge_budget.try_spend():
+        UPSTREAM_HEDGES.inc(endpoint=endpoint, outcome='over_budget')
+        return await primary
+
+    UPSTREAM_HEDGES.inc(endpoint=endpoint, outcome='sent')
+    backup = asyncio.ensure_future(_get_json_once(session, url, endpoint, timeout))
+    pending = {primary, backup}
+    result: Optional[Tuple[int, Any]] = None
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                result = task.result()
+                if result[0] < 500 and result[0] != 429:
+                    if task is backup:
+                        UPSTREAM_HEDGES.inc(endpoint=endpoint, outcome='won')
+                    return result
+    finally:
+        # The slower request is no longer needed
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if result is not None:
+        return result
+    raise error
+
+async def upstream_get_json(
+    session: aiohttp.ClientSession,
+    url: str,
+    timeout: Optional[float] = None,
+    attempts: int = UPSTREAM_RETRY_ATTEMPTS,
+    hedge: bool = True
+) -> Tuple[int, Any]:
+    """
+    Fetch a CheapShark JSON resource with retries and hedging
+
+    Only for idempotent GET lookups. Timeouts, network errors, 429 and 5xx
+    responses are retried with exponential backoff and full jitter, every
+    attempt going through the governor. Interactive lookups are also hedged:
+    see _get_json_hedged.
+
+    Args:
+        session: The aiohttp session to use
+        url: Request URL
+        timeout: Seconds each attempt may take
+        attempts: Maximum number of attempts
+        hedge: Allow hedging (interactive requests only)
+
+    Returns:
+        The final response status and decoded body (None unless the status is 200)
+
+    Raises:
+        CircuitOpenError, RateLimitedError: The request was not sent
+        aiohttp.ClientError, asyncio.TimeoutError: The last attempt failed
+    """
+    endpoint = upstream_endpoint(url)
+    hedge = hedge and current_priority() == INTERACTIVE
+    for attempt in range(1, attempts + 1):
+        try:
+            status, data = await _get_json_hedged(session, url, endpoint, timeout, hedge)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == attempts:
+                raise
+            reason = type(e).__name__
+        else:
+            if attempt == attempts or (status < 500 and status != 429):
+                return status, data
+            reason = f"HTTP {status}"
+
+        delay = random.uniform(0, min(UPSTREAM_RETRY_MAX_DELAY, UPSTREAM_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+        UPSTREAM_RETRIES.inc(endpoint=endpoint, reason=reason)
+        logger.warning(f"CheapShark {endpoint} attempt {attempt}/{attempts} failed ({reason}); "
+                       f"retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from services.coalescing_cache import CoalescingCache
+
+class CoalescingCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = CoalescingCache(name='test')
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return 'value'
+
+    def test_concurrent_callers_share_one_fetch(self):
+        async def main():
+            return await asyncio.gather(*(self.cache.get_or_fetch('key', self.fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['value'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_cancelled_owner_does_not_cancel_waiters(self):
+        async def main():
+            owner = asyncio.create_task(self.cache.get_or_fetch('key', self.fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(self.cache.get_or_fetch('key', self.fetch))
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await owner
+            return await waiter
+
+        self.assertEqual(asyncio.run(main()), 'value')
+        self.assertEqual(self.calls, 1)
+
+    def test_cancelled_waiter_does_not_cancel_owner(self):
+        async def main():
+            owner = asyncio.create_task(self.cache.get_or_fetch('key', self.fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(self.cache.get_or_fetch('key', self.fetch))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            return await owner
+
+        self.assertEqual(asyncio.run(main()), 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_failed_fetch_reaches_every_caller_and_is_not_cached(self):
+        async def failing():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError('upstream down')
+
+        async def main():
+            return await asyncio.gather(*(self.cache.get_or_fetch('key', failing) for _ in range(3)),
+                                        return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(self.cache.get('key'))
+
+if __name__ == '__main__':
+    unittest.main()
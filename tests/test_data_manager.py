@@ -0,0 +1,45 @@
+import json
+import unittest
+from flask import Flask
+from models import db, User
+from data import data_manager
+
+class DealAlertFiltersTest(unittest.TestCase):
+    """Users are picked for deal alerts by their flag, whatever else their settings hold"""
+
+    def setUp(self):
+        app = Flask('test')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(app)
+        context = app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+
+    def test_only_users_with_alerts_on_are_returned(self):
+        data_manager.update_user_filters(1, deal_alerts=True, max_price=10.0)
+        data_manager.update_user_filters(2, deal_alerts=False, min_discount=50)
+        data_manager.update_user_filters(3, deal_alerts=True)
+        data_manager.update_user_filters(3, deal_alerts=False)
+
+        self.assertEqual(data_manager.get_deal_alert_filters(), [(1, 10.0, None)])
+        self.assertEqual(data_manager.get_user_filters(1), {'max_price': 10.0, 'min_discount': None, 'deal_alerts': True})
+
+    def test_setting_is_moved_into_the_column(self):
+        db.session.add_all([
+            User(id=1, settings='{"deal_alerts": true, "max_price": 5.0}'),
+            # Spelled differently from json.dumps, which a text search would miss
+            User(id=2, settings='{"deal_alerts":true}'),
+            User(id=3, settings='{"deal_alerts": false}'),
+            User(id=4, settings='{}'),
+        ])
+        db.session.commit()
+
+        self.assertEqual(data_manager.move_deal_alerts_setting(), 3)
+        self.assertEqual(sorted(user_id for user_id, _, _ in data_manager.get_deal_alert_filters()), [1, 2])
+        self.assertEqual(json.loads(db.session.get(User, 1).settings), {'max_price': 5.0})
+
+if __name__ == '__main__':
+    unittest.main()
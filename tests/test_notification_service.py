@@ -0,0 +1,89 @@
+import time
+import unittest
+from unittest import mock
+from benchmarks.fake_smtp import FakeSMTP
+from services.notification_service import SMTPConnectionPool, EmailSender, build_price_drop_email
+
+class _FakeServerTest(unittest.TestCase):
+    """Sends through a FakeSMTP server started for each test"""
+
+    def start(self, server=None, rate_per_minute=0, attempts=3, **pool_options):
+        self.server = server or FakeSMTP()
+        self.server.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.address
+        pool_options.setdefault('size', 1)
+        self.pool = SMTPConnectionPool(host, port, username=None, starttls=False, timeout=5, **pool_options)
+        self.sender = EmailSender(self.pool, rate_per_minute=rate_per_minute, attempts=attempts)
+        self.addCleanup(self.sender.close)
+
+    def _message(self):
+        return build_price_drop_email('user@example.com', 'Game', {}, sender_email='bot@example.com')
+
+class RejectedMessageTest(_FakeServerTest):
+    """A message the server rejects with a 5xx is not retried and leaves the connection usable"""
+
+    def setUp(self):
+        self.start(FakeSMTP(reject_data=True))
+
+    def test_rejected_message_is_sent_once(self):
+        self.assertFalse(self.sender.send(self._message()))
+        self.assertEqual(self.server.counts['attempts'], 1)
+        self.assertEqual(self.server.counts['rejected'], 1)
+
+    def test_connection_is_reused_after_rejection(self):
+        self.assertEqual(self.sender.send_batch([self._message(), self._message()]), [False, False])
+        self.assertEqual(self.server.counts['attempts'], 2)
+        self.assertEqual(self.pool.connections_opened, 1)
+        self.assertEqual(self.server.counts['connections'], 1)
+
+class DroppedConnectionTest(_FakeServerTest):
+    """A message whose connection drops is sent again on a new connection"""
+
+    def test_message_is_retried_after_a_drop(self):
+        self.start()
+        with mock.patch.object(self.server, 'should_disconnect', side_effect=[True, False]):
+            self.assertTrue(self.sender.send(self._message()))
+        self.assertEqual(self.server.counts['dropped'], 1)
+        self.assertEqual(self.server.counts['messages'], 1)
+        self.assertEqual(self.pool.connections_opened, 2)
+
+class ConnectionReplacementTest(_FakeServerTest):
+    """Pooled connections are replaced once worn out or idle"""
+
+    def test_connection_is_replaced_after_max_messages(self):
+        self.start(max_messages=2)
+        for _ in range(5):
+            self.assertTrue(self.sender.send(self._message()))
+        self.assertEqual(self.pool.connections_opened, 3)
+        self.assertEqual(self.server.counts['connections'], 3)
+
+    def test_connection_is_replaced_after_idle_seconds(self):
+        self.start(idle_seconds=0.05)
+        self.assertTrue(self.sender.send(self._message()))
+        self.assertTrue(self.sender.send(self._message()))
+        self.assertEqual(self.pool.connections_opened, 1)
+        time.sleep(0.1)
+        self.assertTrue(self.sender.send(self._message()))
+        self.assertEqual(self.pool.connections_opened, 2)
+
+class RateLimitTest(_FakeServerTest):
+    """Messages beyond the burst of one per connection wait for the rate limit"""
+
+    def test_batch_is_paced(self):
+        # 10 messages per second with a burst of 2: the last 4 of 6 wait 0.1s each
+        self.start(rate_per_minute=600, size=2)
+        started = time.monotonic()
+        self.assertEqual(self.sender.send_batch([self._message() for _ in range(6)]), [True] * 6)
+        self.assertGreaterEqual(time.monotonic() - started, 0.38)
+
+    def test_burst_is_not_delayed(self):
+        # A third message would wait a second
+        self.start(rate_per_minute=60, size=2)
+        started = time.monotonic()
+        self.assertEqual(self.sender.send_batch([self._message() for _ in range(2)]), [True] * 2)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import asyncio
+import unittest
+from unittest import mock
+from services import price_tracker
+
+def _details(**prices):
+    return {'name': 'Game', 'prices': {
+        store: {'current': f"${price}", 'original': '$40.00', 'discount_percent': discount}
+        for store, (price, discount) in prices.items()
+    }}
+
+class HistoricalLowTest(unittest.TestCase):
+    """Which sale prices are announced as the lowest ever"""
+
+    def check(self, details, all_time_low, previous_info):
+        stats = {price_tracker.ALL_STORES: {'all_time_low': all_time_low}} if all_time_low is not None else {}
+        with mock.patch.object(price_tracker, 'get_all_subscriptions', return_value={'g1': [1]}), \
+             mock.patch.object(price_tracker, 'get_game_details', mock.AsyncMock(return_value=details)), \
+             mock.patch.object(price_tracker, 'get_price_stats', return_value=stats), \
+             mock.patch.object(price_tracker, 'update_game_price', side_effect=lambda game_id, store, *args: previous_info.get(store)), \
+             mock.patch.object(price_tracker, 'get_subscribed_users_for_game', return_value=[1]), \
+             mock.patch.object(price_tracker, 'stats_index'):
+            price_drops = asyncio.run(price_tracker.check_price_updates())
+        return {store: info['historical_low'] for store, info in price_drops['g1']['price_info'].items()}
+
+    def test_first_sale_of_an_untracked_game_is_the_lowest(self):
+        details = _details(Steam=(10.0, 75), GOG=(12.0, 70), Epic=(8.0, 5))
+        # Epic's price is not a significant sale, so the cheapest sale is Steam's
+        self.assertEqual(self.check(details, None, {}), {'Steam': True, 'GOG': False})
+
+    def test_first_record_of_a_store_is_compared_with_other_stores(self):
+        details = _details(Steam=(10.0, 75), GOG=(12.0, 70))
+        self.assertEqual(self.check(details, 11.0, {'Steam': {'price': 20.0}}), {'Steam': True, 'GOG': False})
+
+    def test_matching_the_stored_low_is_not_a_new_low(self):
+        details = _details(Steam=(10.0, 75))
+        self.assertEqual(self.check(details, 10.0, {'Steam': {'price': 20.0}}), {'Steam': False})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import math
+import random
+import unittest
+from services.recommendations import CoSubscriptionIndex
+
+class CoSubscriptionIndexTest(unittest.TestCase):
+
+    def test_build_matches_brute_force(self):
+        rng = random.Random(1)
+        subscriptions = [(user_id, f"g{rng.randrange(30)}") for user_id in range(200) for _ in range(rng.randint(1, 6))]
+        index = CoSubscriptionIndex(top_k=50)
+        index.build(subscriptions)
+
+        subscribers = {}
+        for user_id, game_id in set(subscriptions):
+            subscribers.setdefault(game_id, set()).add(user_id)
+        for game_id, users in subscribers.items():
+            expected = {other_id: len(users & others) / math.sqrt(len(users) * len(others))
+                        for other_id, others in subscribers.items() if other_id != game_id and users & others}
+            self.assertEqual(dict(index.recommend(game_id, limit=50)), expected)
+
+    def test_changes_committed_during_rebuild_are_kept(self):
+        index = CoSubscriptionIndex()
+        index.build([(1, 'a'), (1, 'b')])
+
+        def rows():
+            yield 2, 'a'
+            # Committed after the rebuild read user 2's rows, so absent from them
+            index.subscribe(2, 'c')
+            index.unsubscribe(1, 'b')
+            yield 2, 'b'
+
+        index.build(rows())
+        # Only user 2 is left, tracking a, b and c; equal scores come in no particular order
+        self.assertEqual(dict(index.recommend('a')), {'b': 1.0, 'c': 1.0})
+        self.assertEqual(dict(index.recommend('c')), {'a': 1.0, 'b': 1.0})
+
+    def test_unsubscribe_reverses_subscribe(self):
+        index = CoSubscriptionIndex()
+        index.build([(1, 'a'), (2, 'a'), (2, 'b')])
+        index.subscribe(1, 'b')
+        index.unsubscribe(1, 'b')
+        self.assertEqual(index.recommend('a'), [('b', 1 / math.sqrt(2))])
+
+if __name__ == '__main__':
+    unittest.main()
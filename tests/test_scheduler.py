@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from unittest import mock
+from flask import Flask
+from services import scheduler
+
+class _Follower:
+    """Leader elector stand-in for a replica that does not hold the lease"""
+    is_leader = False
+    term = None
+
+    def holds(self, term):
+        return False
+
+class FollowerPriceCheckTest(unittest.TestCase):
+    """A follower replica neither sweeps nor notifies, however the price check is started"""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(scheduler, 'flask_app', Flask('test')),
+            mock.patch.object(scheduler, 'leader_elector', _Follower()),
+            mock.patch.object(scheduler, 'check_prices_sharded', mock.AsyncMock(return_value={})),
+            mock.patch.object(scheduler, 'send_price_drop_notifications', mock.AsyncMock()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def assert_nothing_ran(self):
+        scheduler.check_prices_sharded.assert_not_called()
+        scheduler.send_price_drop_notifications.assert_not_called()
+
+    def test_scheduled_price_check_is_skipped(self):
+        asyncio.run(scheduler.scheduled_price_check())
+        self.assert_nothing_ran()
+
+    def test_manual_price_check_is_skipped(self):
+        with mock.patch.object(scheduler.scheduler, 'add_job') as add_job:
+            scheduler.trigger_price_check()
+        job = add_job.call_args.args[0]
+        job()
+        self.assert_nothing_ran()
+
+if __name__ == '__main__':
+    unittest.main()
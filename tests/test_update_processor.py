@@ -0,0 +1,57 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime, timezone
+from telegram import Chat, Message, Update, User
+from bot.update_processor import PerChatUpdateProcessor
+
+def _update(update_id: int, chat_id: int) -> Update:
+    user = User(id=chat_id, first_name='Test', is_bot=False)
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=datetime.now(timezone.utc), chat=chat, from_user=user)
+    return Update(update_id=update_id, message=message)
+
+class PerChatUpdateProcessorTest(unittest.TestCase):
+
+    def test_updates_from_one_chat_run_in_order(self):
+        finished = []
+
+        async def handle(index: int, delay: float):
+            await asyncio.sleep(delay)
+            finished.append(index)
+
+        async def main():
+            processor = PerChatUpdateProcessor(4)
+            async with processor:
+                # Later updates are quicker, so they would overtake earlier ones without the chat lock
+                await asyncio.gather(*(processor.process_update(_update(i, 1), handle(i, 0.05 - i * 0.01))
+                                       for i in range(5)))
+
+        asyncio.run(main())
+        self.assertEqual(finished, [0, 1, 2, 3, 4])
+
+    def test_busy_chat_does_not_hold_every_slot(self):
+        in_flight = []
+        finished_at = {}
+
+        async def handle(name: str, processor: PerChatUpdateProcessor):
+            in_flight.append(processor.current_concurrent_updates)
+            await asyncio.sleep(0.05)
+            finished_at[name] = time.perf_counter()
+
+        async def main():
+            processor = PerChatUpdateProcessor(2)
+            async with processor:
+                started = time.perf_counter()
+                burst = [processor.process_update(_update(i, 1), handle(f"busy{i}", processor)) for i in range(10)]
+                other = processor.process_update(_update(100, 2), handle('other', processor))
+                await asyncio.gather(*burst, other)
+            return started
+
+        started = asyncio.run(main())
+        # The other chat runs alongside the first update of the burst instead of after all ten
+        self.assertLess(finished_at['other'] - started, 0.2)
+        self.assertLessEqual(max(in_flight), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+import signal
+import threading
+from services.logging_setup import configure_logging
+
+configure_logging()
+
+from app import app, init_database
+from services.sweep_sharding import run_worker
+
+if __name__ == "__main__":
+    # Sweep worker: checks the share of subscribed games the scheduler assigns to it.
+    # Start as many as needed, on this host or others sharing DATABASE_URL.
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    init_database()
+    run_worker(app, stop=stop)